@@ -15,6 +15,7 @@ from app.core.database import Base
 from app.models.user import User, ProductAnalysis, SkinProfile
 from app.models.skin_memory import UserAllergen, SkinIssue, SkinMemoryEntry, AllergenReaction
 from app.models.chat import ChatSession, ChatMessage
+from app.models.analysis_cache import AnalysisCacheEntry
 
 # this is the Alembic Config object
 config = context.config
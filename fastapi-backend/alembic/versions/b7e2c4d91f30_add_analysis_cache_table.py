@@ -0,0 +1,35 @@
+"""Add analysis cache table
+
+Revision ID: b7e2c4d91f30
+Revises: 01dd049ec6a8
+Create Date: 2026-10-17 09:12:40.118203
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7e2c4d91f30'
+down_revision: Union[str, None] = '01dd049ec6a8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('analysis_cache',
+    sa.Column('cache_key', sa.String(length=64), nullable=False),
+    sa.Column('result', sa.JSON(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), server_default=sa.text('now()'), nullable=True),
+    sa.Column('last_accessed_at', sa.DateTime(), server_default=sa.text('now()'), nullable=True),
+    sa.Column('hit_count', sa.Integer(), nullable=True),
+    sa.PrimaryKeyConstraint('cache_key')
+    )
+    op.create_index(op.f('ix_analysis_cache_last_accessed_at'), 'analysis_cache', ['last_accessed_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_analysis_cache_last_accessed_at'), table_name='analysis_cache')
+    op.drop_table('analysis_cache')
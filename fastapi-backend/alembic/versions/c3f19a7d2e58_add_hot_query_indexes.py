@@ -0,0 +1,54 @@
+"""Add composite and partial indexes for hot queries
+
+Revision ID: c3f19a7d2e58
+Revises: b7e2c4d91f30
+Create Date: 2026-10-17 14:03:27.540912
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3f19a7d2e58'
+down_revision: Union[str, None] = 'b7e2c4d91f30'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+ACTIVE_ONLY = {
+    "postgresql_where": sa.text("is_active = true"),
+    "sqlite_where": sa.text("is_active = 1"),
+}
+
+# (name, table, columns, partial on is_active)
+INDEXES = [
+    ('ix_skin_memory_entries_user_type_active_created', 'skin_memory_entries', ['user_id', 'entry_type', 'created_at'], True),
+    ('ix_skin_memory_entries_user_active_created', 'skin_memory_entries', ['user_id', 'created_at'], True),
+    ('ix_chat_messages_session_created', 'chat_messages', ['session_id', 'created_at'], False),
+    ('ix_chat_sessions_user_active_updated', 'chat_sessions', ['user_id', 'updated_at'], True),
+    ('ix_user_allergens_user_active_detected', 'user_allergens', ['user_id', 'first_detected'], True),
+    ('ix_skin_issues_user_updated', 'skin_issues', ['user_id', 'last_updated'], False),
+]
+
+
+def upgrade() -> None:
+    if op.get_bind().dialect.name == 'postgresql':
+        # Build concurrently so large tables stay writable during the migration
+        with op.get_context().autocommit_block():
+            for name, table, columns, partial in INDEXES:
+                op.create_index(
+                    name, table, columns, unique=False,
+                    postgresql_concurrently=True,
+                    **(ACTIVE_ONLY if partial else {})
+                )
+    else:
+        for name, table, columns, partial in INDEXES:
+            op.create_index(name, table, columns, unique=False, **(ACTIVE_ONLY if partial else {}))
+
+
+def downgrade() -> None:
+    for name, table, columns, partial in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
@@ -0,0 +1,49 @@
+"""Add denormalized message counters to chat sessions
+
+Revision ID: d5a8e1f4b3c6
+Revises: c3f19a7d2e58
+Create Date: 2026-10-17 15:21:09.337418
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd5a8e1f4b3c6'
+down_revision: Union[str, None] = 'c3f19a7d2e58'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('chat_sessions', sa.Column('message_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('chat_sessions', sa.Column('last_message_preview', sa.String(length=200), nullable=True))
+    op.add_column('chat_sessions', sa.Column('last_message_at', sa.DateTime(timezone=True), nullable=True))
+
+    # Backfill from existing messages; ix_chat_messages_session_created serves each lookup
+    op.execute("""
+        UPDATE chat_sessions SET
+            message_count = (
+                SELECT count(*) FROM chat_messages m
+                WHERE m.session_id = chat_sessions.id
+            ),
+            last_message_at = (
+                SELECT max(m.created_at) FROM chat_messages m
+                WHERE m.session_id = chat_sessions.id
+            ),
+            last_message_preview = (
+                SELECT substr(m.message, 1, 200) FROM chat_messages m
+                WHERE m.session_id = chat_sessions.id
+                ORDER BY m.created_at DESC
+                LIMIT 1
+            )
+    """)
+
+
+def downgrade() -> None:
+    op.drop_column('chat_sessions', 'last_message_at')
+    op.drop_column('chat_sessions', 'last_message_preview')
+    op.drop_column('chat_sessions', 'message_count')
@@ -0,0 +1,30 @@
+"""Add rolling conversation summaries to chat sessions
+
+Revision ID: e8b2c6f1a4d7
+Revises: d5a8e1f4b3c6
+Create Date: 2026-10-17 18:02:44.118203
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e8b2c6f1a4d7'
+down_revision: Union[str, None] = 'd5a8e1f4b3c6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Existing sessions start unsummarized; the first turn that overflows the
+    # history budget schedules their summary
+    op.add_column('chat_sessions', sa.Column('summary', sa.Text(), nullable=True))
+    op.add_column('chat_sessions', sa.Column('summarized_until', sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('chat_sessions', 'summarized_until')
+    op.drop_column('chat_sessions', 'summary')
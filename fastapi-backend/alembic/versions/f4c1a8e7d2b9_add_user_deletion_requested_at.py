@@ -0,0 +1,28 @@
+"""Record pending background account deletions on users
+
+Revision ID: f4c1a8e7d2b9
+Revises: e8b2c6f1a4d7
+Create Date: 2026-10-17 21:14:05.527614
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f4c1a8e7d2b9'
+down_revision: Union[str, None] = 'e8b2c6f1a4d7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('users', sa.Column('deletion_requested_at', sa.DateTime(), nullable=True))
+    op.create_index(op.f('ix_users_deletion_requested_at'), 'users', ['deletion_requested_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_users_deletion_requested_at'), table_name='users')
+    op.drop_column('users', 'deletion_requested_at')
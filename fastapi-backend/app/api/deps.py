@@ -1,17 +1,17 @@
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
-from app.core.database import get_db
-from app.core.security import verify_token
-from app.crud.user import get_user_by_email
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.database import get_async_db
+from app.core.auth_cache import auth_cache
 from app.models.user import User
 from app.core.dbconnection import db_manager
+from app.services.llm_admission import llm_user
 
 security = HTTPBearer()
 
 async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ) -> User:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -19,14 +19,16 @@ async def get_current_user(
         headers={"WWW-Authenticate": "Bearer"},
     )
     
-    email = verify_token(credentials.credentials)
+    email = auth_cache.get_token_subject(credentials.credentials)
     if email is None:
         raise credentials_exception
     
-    user = get_user_by_email(db, email=email)
+    user = await auth_cache.get_user(db, email)
     if user is None:
         raise credentials_exception
     
+    # Gemini calls made for this request count against the user's LLM budget
+    llm_user.set(user.id)
     return user
 
 async def get_current_active_user(current_user: User = Depends(get_current_user)):
@@ -0,0 +1,6 @@
+import json
+
+
+def sse_event(event: str, data: dict) -> str:
+    """Format a single server-sent event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
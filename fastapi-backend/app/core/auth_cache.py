@@ -0,0 +1,205 @@
+import asyncio
+import copy
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.session import make_transient_to_detached
+
+from .cache import LRUCache
+from .config import settings
+from .security import decode_access_token
+from app.models.user import User
+
+logger = logging.getLogger(__name__)
+
+
+class AuthCache:
+    """Fast path for ``get_current_user``.
+
+    Decoded tokens are memoized until their ``exp`` claim, and a short-lived
+    snapshot of the user's columns (without the password hash) is kept per
+    email. A snapshot is merged back into the request's session without a
+    query, so handlers still get an attached ``User`` they can modify and
+    commit. Any write to a user row must call ``invalidate_user``, which is
+    recorded in a small SQLite file shared by every uvicorn worker on the
+    host; a snapshot taken before the user's last invalidation is not used.
+    Each worker reads that file into memory at most once per ``refresh``
+    seconds, so a hit costs no query and another worker's invalidation is
+    seen within that interval.
+    """
+
+    # Never cached, so a snapshot can't leak it; code that checks passwords loads the user itself
+    EXCLUDED_COLUMNS = ("hashed_password",)
+
+    def __init__(
+        self, token_cache_size: int, user_cache_size: int, user_ttl: float, path: str, refresh: float
+    ):
+        self.tokens = LRUCache(maxsize=token_cache_size)
+        self.users = LRUCache(maxsize=user_cache_size, ttl=user_ttl)
+        self.user_ttl = user_ttl
+        self.path = path
+        self.refresh = refresh
+        self._conn: Optional[sqlite3.Connection] = None
+        self._invalidations: Dict[str, float] = {}
+        self._refreshed_at = 0.0
+        self._refresh_seconds = 0.0
+        self._refreshes = 0
+        self._lock = threading.Lock()
+        self._decode_seconds = 0.0
+        self._decodes = 0
+        self._lookup_seconds = 0.0
+        self._lookups = 0
+        self._stale = 0
+        self._errors = 0
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(
+                self.path, timeout=1.0, isolation_level=None, check_same_thread=False
+            )
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS invalidations "
+                "(email TEXT PRIMARY KEY, invalidated_at REAL NOT NULL)"
+            )
+            self._conn = conn
+        return self._conn
+
+    def _load_invalidations(self) -> Dict[str, float]:
+        # Pruned to the snapshot TTL on every write, so the table stays small
+        with self._lock:
+            rows = self._connection().execute(
+                "SELECT email, invalidated_at FROM invalidations"
+            ).fetchall()
+        return dict(rows)
+
+    def _record_invalidation(self, email: str):
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO invalidations (email, invalidated_at) VALUES (?, ?)",
+                (email, now)
+            )
+            # Snapshots never outlive the TTL, so older invalidations can't matter
+            conn.execute("DELETE FROM invalidations WHERE invalidated_at < ?", (now - self.user_ttl,))
+
+    async def _is_current(self, email: str, cached_at: float) -> bool:
+        now = time.monotonic()
+        if now - self._refreshed_at >= self.refresh:
+            # Claimed before the await so concurrent hits don't all reload
+            self._refreshed_at = now
+            started = time.perf_counter()
+            try:
+                self._invalidations = await asyncio.to_thread(self._load_invalidations)
+            except sqlite3.Error as e:
+                # Can't tell whether another worker changed the user, so ask the database
+                self._refreshed_at = 0.0
+                self._errors += 1
+                logger.warning(f"Auth invalidation state unavailable, reloading user: {e}")
+                return False
+            finally:
+                self._refresh_seconds += time.perf_counter() - started
+                self._refreshes += 1
+        return self._invalidations.get(email, 0.0) < cached_at
+
+    def get_token_subject(self, token: str) -> Optional[str]:
+        """Return the token's subject email, decoding it only on a miss."""
+        email = self.tokens.get(token)
+        if email is not None:
+            return email
+
+        started = time.perf_counter()
+        payload = decode_access_token(token)
+        self._decode_seconds += time.perf_counter() - started
+        self._decodes += 1
+
+        if payload is None or payload.get("sub") is None:
+            return None
+
+        email = payload["sub"]
+        expires_in = payload.get("exp", 0) - time.time()
+        if expires_in > 0:
+            self.tokens.set(token, email, ttl=expires_in)
+        return email
+
+    async def get_user(self, db: AsyncSession, email: str) -> Optional[User]:
+        """Return the user attached to ``db``, from the snapshot when possible."""
+        cached = self.users.get(email)
+        if cached is not None:
+            cached_at, snapshot = cached
+            if await self._is_current(email, cached_at):
+                user = User(**copy.deepcopy(snapshot))
+                make_transient_to_detached(user)
+                return await db.merge(user, load=False)
+            self._stale += 1
+            self.users.delete(email)
+
+        # Taken before the query, so a write committed meanwhile invalidates this snapshot
+        cached_at = time.time()
+        started = time.perf_counter()
+        result = await db.execute(select(User).where(User.email == email))
+        user = result.scalars().first()
+        self._lookup_seconds += time.perf_counter() - started
+        self._lookups += 1
+
+        if user is not None:
+            self.users.set(email, (cached_at, self._snapshot(user)))
+        return user
+
+    def invalidate_user(self, email: str):
+        """Drop the cached snapshot after the user row changes, in every worker."""
+        self.users.delete(email)
+        self._invalidations[email] = time.time()
+        try:
+            self._record_invalidation(email)
+        except sqlite3.Error as e:
+            self._errors += 1
+            logger.warning(f"Could not share auth invalidation for {email}: {e}")
+
+    @staticmethod
+    def _snapshot(user: User) -> Dict[str, Any]:
+        return {
+            column.key: copy.deepcopy(getattr(user, column.key))
+            for column in User.__table__.columns
+            if column.key not in AuthCache.EXCLUDED_COLUMNS
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        """Get hit ratios and the estimated time saved by cache hits, net of invalidation refreshes."""
+        avg_decode = self._decode_seconds / self._decodes if self._decodes else 0.0
+        avg_lookup = self._lookup_seconds / self._lookups if self._lookups else 0.0
+        avg_refresh = self._refresh_seconds / self._refreshes if self._refreshes else 0.0
+        saved = (
+            self.tokens.hits * avg_decode + self.users.hits * avg_lookup - self._refresh_seconds
+        )
+        return {
+            "tokens": self.tokens.stats(),
+            "users": self.users.stats(),
+            "avg_decode_ms": round(avg_decode * 1000, 3),
+            "avg_user_lookup_ms": round(avg_lookup * 1000, 3),
+            "invalidation_refreshes": self._refreshes,
+            "avg_invalidation_refresh_ms": round(avg_refresh * 1000, 3),
+            "estimated_ms_saved": round(saved * 1000, 1),
+            "stale_snapshots": self._stale,
+            "state_errors": self._errors,
+        }
+
+
+# Create global auth cache instance
+auth_cache = AuthCache(
+    token_cache_size=settings.AUTH_TOKEN_CACHE_SIZE,
+    user_cache_size=settings.AUTH_USER_CACHE_SIZE,
+    user_ttl=settings.AUTH_USER_CACHE_TTL_SECONDS,
+    path=settings.AUTH_INVALIDATION_STATE_PATH
+    or os.path.join(tempfile.gettempdir(), "skinsense_auth_invalidations.db"),
+    refresh=settings.AUTH_INVALIDATION_REFRESH_MS / 1000,
+)
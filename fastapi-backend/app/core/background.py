@@ -0,0 +1,93 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from .config import settings
+from .database import AsyncSessionLocal
+
+logger = logging.getLogger(__name__)
+
+
+class BackgroundJobQueue:
+    """Bounded in-process queue for work that runs after the response is sent.
+
+    Every job is an async callable that receives its own database session as
+    the first argument, so it never shares state with the request that queued it.
+    """
+
+    def __init__(self, maxsize: int, workers: int):
+        self.maxsize = maxsize
+        self.workers = workers
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self._tasks: List[asyncio.Task] = []
+        self._processed = 0
+        self._failed = 0
+        self._dropped = 0
+
+    def start(self):
+        """Start worker tasks on the running event loop."""
+        if self._tasks:
+            return
+        for index in range(self.workers):
+            self._tasks.append(
+                asyncio.create_task(self._worker(), name=f"background-job-{index}")
+            )
+        logger.info(f"Started {self.workers} background job workers")
+
+    def submit(
+        self, name: str, func: Callable[..., Awaitable[Any]], *args, **kwargs
+    ) -> bool:
+        """Queue a job without waiting. Returns False if the queue is full."""
+        try:
+            self._queue.put_nowait((name, func, args, kwargs))
+            return True
+        except asyncio.QueueFull:
+            self._dropped += 1
+            logger.warning(f"Background queue full, dropping job: {name}")
+            return False
+
+    async def _worker(self):
+        while True:
+            name, func, args, kwargs = await self._queue.get()
+            try:
+                async with AsyncSessionLocal() as db:
+                    await func(db, *args, **kwargs)
+                self._processed += 1
+            except Exception as e:
+                self._failed += 1
+                logger.error(f"Background job {name} failed: {e}")
+            finally:
+                self._queue.task_done()
+
+    async def drain(self, timeout: Optional[float] = None):
+        """Wait for queued jobs to finish, then stop the workers."""
+        timeout = timeout if timeout is not None else settings.BACKGROUND_DRAIN_TIMEOUT_SECONDS
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.warning(
+                f"Background queue drain timed out with {self._queue.qsize()} jobs pending"
+            )
+
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def stats(self) -> Dict[str, Any]:
+        """Get queue usage counters."""
+        return {
+            "workers": len(self._tasks),
+            "queued": self._queue.qsize(),
+            "maxsize": self.maxsize,
+            "processed": self._processed,
+            "failed": self._failed,
+            "dropped": self._dropped,
+        }
+
+
+# Create global background queue instance
+background_jobs = BackgroundJobQueue(
+    maxsize=settings.BACKGROUND_QUEUE_SIZE,
+    workers=settings.BACKGROUND_WORKERS,
+)
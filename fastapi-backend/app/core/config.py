@@ -2,6 +2,14 @@ from decouple import config
 import secrets
 
 
+def endpoint_map(value: str) -> dict:
+    """Parse "name=number,name=number" into a dict of floats per endpoint."""
+    return {
+        name.strip(): float(number)
+        for name, number in (item.split("=") for item in value.split(",") if item.strip())
+    }
+
+
 class Settings:
     # Database Configuration
     DATABASE_URL: str = config("DATABASE_URL", default="sqlite:///./skinai.db")
@@ -13,6 +21,10 @@ class Settings:
         "ACCESS_TOKEN_EXPIRE_MINUTES", default=30, cast=int
     )
 
+    # Password Hashing Configuration
+    BCRYPT_ROUNDS: int = config("BCRYPT_ROUNDS", default=12, cast=int)
+    PASSWORD_HASH_WORKERS: int = config("PASSWORD_HASH_WORKERS", default=4, cast=int)
+
     # Database Pool Configuration
     DB_POOL_SIZE: int = config("DB_POOL_SIZE", default=10, cast=int)
     DB_MAX_OVERFLOW: int = config("DB_MAX_OVERFLOW", default=20, cast=int)
@@ -30,5 +42,146 @@ class Settings:
     )
     GEMINI_API_KEY: str = config("GEMINI_API_KEY", default="")
 
+    # Gemini Model Configuration
+    GEMINI_CHAT_MODEL: str = config("GEMINI_CHAT_MODEL", default="gemini-2.5-flash")
+    GEMINI_VISION_MODEL: str = config("GEMINI_VISION_MODEL", default="gemini-2.5-flash")
+    GEMINI_EXTRACTION_MODEL: str = config("GEMINI_EXTRACTION_MODEL", default="gemini-2.5-flash")
+    # "grpc" or "rest"; empty uses the SDK default
+    GEMINI_TRANSPORT: str = config("GEMINI_TRANSPORT", default="")
+
+    # LLM Backend Configuration
+    # "gemini" calls the API; "fake" answers locally for offline load tests
+    LLM_BACKEND: str = config("LLM_BACKEND", default="gemini")
+    # Fake backend latency per use case: "fixed", "uniform" or "lognormal"
+    # around the median, spread by the jitter (relative, or log-space sigma)
+    FAKE_LLM_LATENCY_DISTRIBUTION: str = config("FAKE_LLM_LATENCY_DISTRIBUTION", default="lognormal")
+    FAKE_LLM_LATENCY_MS: dict = config(
+        "FAKE_LLM_LATENCY_MS", default="chat=800,vision=2500,extraction=600", cast=endpoint_map
+    )
+    FAKE_LLM_LATENCY_JITTER: float = config("FAKE_LLM_LATENCY_JITTER", default=0.4, cast=float)
+    # Share of calls that fail with a 503, for exercising retries and the circuit breaker
+    FAKE_LLM_ERROR_RATE: float = config("FAKE_LLM_ERROR_RATE", default=0.0, cast=float)
+    FAKE_LLM_STREAM_CHUNK_CHARS: int = config("FAKE_LLM_STREAM_CHUNK_CHARS", default=40, cast=int)
+    FAKE_LLM_STREAM_CHUNK_DELAY_MS: float = config(
+        "FAKE_LLM_STREAM_CHUNK_DELAY_MS", default=30.0, cast=float
+    )
+    FAKE_LLM_SEED: int = config("FAKE_LLM_SEED", default=0, cast=int)
+
+    # Gemini Execution Configuration
+    GEMINI_MAX_WORKERS: int = config("GEMINI_MAX_WORKERS", default=32, cast=int)
+    GEMINI_TIMEOUT_SECONDS: float = config(
+        "GEMINI_TIMEOUT_SECONDS", default=60.0, cast=float
+    )
+    # Deadline per use case covering all attempts; others use GEMINI_TIMEOUT_SECONDS
+    GEMINI_ENDPOINT_TIMEOUT_SECONDS: dict = config(
+        "GEMINI_ENDPOINT_TIMEOUT_SECONDS",
+        default="chat=20,product_analysis=45,chat_extraction=30,chat_insights=30,chat_summary=60",
+        cast=endpoint_map,
+    )
+    GEMINI_MAX_RETRIES: int = config("GEMINI_MAX_RETRIES", default=2, cast=int)
+    GEMINI_RETRY_BASE_SECONDS: float = config("GEMINI_RETRY_BASE_SECONDS", default=0.5, cast=float)
+    GEMINI_RETRY_MAX_SECONDS: float = config("GEMINI_RETRY_MAX_SECONDS", default=4.0, cast=float)
+    # Consecutive transient failures that open the circuit, and how long it stays open
+    GEMINI_BREAKER_FAILURE_THRESHOLD: int = config(
+        "GEMINI_BREAKER_FAILURE_THRESHOLD", default=5, cast=int
+    )
+    GEMINI_BREAKER_RESET_SECONDS: float = config(
+        "GEMINI_BREAKER_RESET_SECONDS", default=30.0, cast=float
+    )
+    # Send a duplicate chat request when the first is slower than this (0 disables)
+    GEMINI_CHAT_HEDGE_AFTER_SECONDS: float = config(
+        "GEMINI_CHAT_HEDGE_AFTER_SECONDS", default=0.0, cast=float
+    )
+
+    # LLM Admission Configuration
+    # Request rates per minute and concurrent calls (0 disables a limit),
+    # shared by every worker on the host through a SQLite state file
+    LLM_GLOBAL_RATE_PER_MINUTE: float = config("LLM_GLOBAL_RATE_PER_MINUTE", default=600.0, cast=float)
+    LLM_GLOBAL_MAX_CONCURRENCY: int = config("LLM_GLOBAL_MAX_CONCURRENCY", default=32, cast=int)
+    LLM_USER_RATE_PER_MINUTE: float = config("LLM_USER_RATE_PER_MINUTE", default=20.0, cast=float)
+    LLM_USER_MAX_CONCURRENCY: int = config("LLM_USER_MAX_CONCURRENCY", default=4, cast=int)
+    LLM_ENDPOINT_RATE_PER_MINUTE: dict = config(
+        "LLM_ENDPOINT_RATE_PER_MINUTE",
+        default="chat=300,product_analysis=120,chat_extraction=300,chat_insights=120,chat_summary=60",
+        cast=endpoint_map,
+    )
+    # Bucket size: how many seconds' worth of requests may arrive at once
+    LLM_BURST_SECONDS: float = config("LLM_BURST_SECONDS", default=60.0, cast=float)
+    # Empty uses a file in the system temp directory
+    LLM_ADMISSION_STATE_PATH: str = config("LLM_ADMISSION_STATE_PATH", default="")
+
+    # Chat Turn Configuration
+    # "two_call": reply, then a separate memory-extraction call in the background
+    # "single_call": one structured call returns both the reply and the extraction
+    CHAT_TURN_MODE: str = config("CHAT_TURN_MODE", default="two_call")
+
+    # Chat History Configuration
+    # Recent messages go into prompts verbatim up to this many estimated tokens;
+    # older ones are folded into a rolling per-session summary in the background
+    CHAT_HISTORY_TOKEN_BUDGET: int = config("CHAT_HISTORY_TOKEN_BUDGET", default=1200, cast=int)
+    CHAT_CONTEXT_FETCH_LIMIT: int = config("CHAT_CONTEXT_FETCH_LIMIT", default=40, cast=int)
+    CHAT_SUMMARY_BATCH_SIZE: int = config("CHAT_SUMMARY_BATCH_SIZE", default=100, cast=int)
+    CHAT_SUMMARY_MAX_CHARS: int = config("CHAT_SUMMARY_MAX_CHARS", default=2000, cast=int)
+
+    # Prompt Budget Configuration (estimated input tokens per prompt)
+    PROMPT_BUDGET_CHAT: int = config("PROMPT_BUDGET_CHAT", default=4000, cast=int)
+    PROMPT_BUDGET_ANALYSIS: int = config("PROMPT_BUDGET_ANALYSIS", default=3000, cast=int)
+    PROMPT_BUDGET_EXTRACTION: int = config("PROMPT_BUDGET_EXTRACTION", default=2000, cast=int)
+    PROMPT_BUDGET_SUMMARY: int = config("PROMPT_BUDGET_SUMMARY", default=6000, cast=int)
+
+    # Analysis Cache Configuration
+    ANALYSIS_CACHE_MEMORY_SIZE: int = config(
+        "ANALYSIS_CACHE_MEMORY_SIZE", default=512, cast=int
+    )
+    ANALYSIS_CACHE_TTL_DAYS: int = config("ANALYSIS_CACHE_TTL_DAYS", default=30, cast=int)
+    ANALYSIS_CACHE_MAX_ENTRIES: int = config(
+        "ANALYSIS_CACHE_MAX_ENTRIES", default=50000, cast=int
+    )
+
+    # Skin Context Cache Configuration
+    SKIN_CONTEXT_CACHE_SIZE: int = config("SKIN_CONTEXT_CACHE_SIZE", default=10000, cast=int)
+    SKIN_CONTEXT_TTL_SECONDS: float = config(
+        "SKIN_CONTEXT_TTL_SECONDS", default=300.0, cast=float
+    )
+
+    # Auth Cache Configuration
+    AUTH_TOKEN_CACHE_SIZE: int = config("AUTH_TOKEN_CACHE_SIZE", default=10000, cast=int)
+    AUTH_USER_CACHE_SIZE: int = config("AUTH_USER_CACHE_SIZE", default=10000, cast=int)
+    AUTH_USER_CACHE_TTL_SECONDS: float = config(
+        "AUTH_USER_CACHE_TTL_SECONDS", default=60.0, cast=float
+    )
+    # Shared by the workers on a host; empty uses a file in the system temp directory
+    AUTH_INVALIDATION_STATE_PATH: str = config("AUTH_INVALIDATION_STATE_PATH", default="")
+    # How stale another worker's invalidations may be seen on a snapshot hit
+    AUTH_INVALIDATION_REFRESH_MS: float = config(
+        "AUTH_INVALIDATION_REFRESH_MS", default=250.0, cast=float
+    )
+
+    # Pagination Configuration
+    PAGINATION_COUNT_CACHE_SIZE: int = config("PAGINATION_COUNT_CACHE_SIZE", default=10000, cast=int)
+    PAGINATION_COUNT_TTL_SECONDS: float = config(
+        "PAGINATION_COUNT_TTL_SECONDS", default=30.0, cast=float
+    )
+    CHAT_MESSAGE_WINDOW: int = config("CHAT_MESSAGE_WINDOW", default=50, cast=int)
+
+    # Bulk Delete Configuration
+    BULK_DELETE_BATCH_SIZE: int = config("BULK_DELETE_BATCH_SIZE", default=1000, cast=int)
+
+    # Batch Analysis Configuration
+    BATCH_ANALYSIS_MAX_ITEMS: int = config("BATCH_ANALYSIS_MAX_ITEMS", default=10, cast=int)
+    BATCH_ANALYSIS_CONCURRENCY: int = config("BATCH_ANALYSIS_CONCURRENCY", default=4, cast=int)
+
+    # Image Preprocessing Configuration
+    IMAGE_MAX_EDGE: int = config("IMAGE_MAX_EDGE", default=1536, cast=int)
+    IMAGE_JPEG_QUALITY: int = config("IMAGE_JPEG_QUALITY", default=85, cast=int)
+    IMAGE_PROCESS_WORKERS: int = config("IMAGE_PROCESS_WORKERS", default=2, cast=int)
+
+    # Background Job Configuration
+    BACKGROUND_QUEUE_SIZE: int = config("BACKGROUND_QUEUE_SIZE", default=1000, cast=int)
+    BACKGROUND_WORKERS: int = config("BACKGROUND_WORKERS", default=4, cast=int)
+    BACKGROUND_DRAIN_TIMEOUT_SECONDS: float = config(
+        "BACKGROUND_DRAIN_TIMEOUT_SECONDS", default=10.0, cast=float
+    )
+
 
 settings = Settings()
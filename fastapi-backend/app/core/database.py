@@ -1,8 +1,13 @@
 from sqlalchemy import create_engine
+from sqlalchemy.engine import URL, make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import StaticPool
+from functools import lru_cache
+from typing import Any, Dict, Tuple
 import logging
+import shlex
 from .config import settings
 
 # Configure logging for database operations
@@ -39,6 +44,99 @@ else:
 # Create session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+def _libpq_options(options: str) -> Dict[str, str]:
+    """Parse libpq's ``options`` ("-c key=value --key=value") into server settings."""
+    server_settings = {}
+    tokens = shlex.split(options)
+    for index, token in enumerate(tokens):
+        if token == "-c" and index + 1 < len(tokens):
+            token = tokens[index + 1]
+        elif token.startswith("-c"):
+            token = token[2:]
+        elif token.startswith("--"):
+            token = token[2:].replace("-", "_")
+        else:
+            continue
+        key, sep, value = token.partition("=")
+        if sep:
+            server_settings[key] = value
+    return server_settings
+
+@lru_cache(maxsize=None)
+def _asyncpg_url(url: str) -> Tuple[URL, Dict[str, Any]]:
+    """Split a libpq URL's query into what asyncpg takes in the URL and as connect args.
+
+    SQLAlchemy passes every query parameter to ``asyncpg.connect`` as a
+    keyword, so libpq-only ones would fail every connection attempt.
+    """
+    parsed = make_url(url)
+    query, connect_args, server_settings = {}, {}, {}
+    for name, value in parsed.query.items():
+        if isinstance(value, tuple):
+            value = value[-1]
+        if name in ("sslmode", "ssl"):
+            # asyncpg accepts libpq's sslmode values under "ssl"
+            query["ssl"] = value
+        elif name == "target_session_attrs":
+            query[name] = value
+        elif name == "connect_timeout":
+            # 0 means wait forever in libpq; asyncpg keeps its default then
+            if float(value) > 0:
+                connect_args["timeout"] = float(value)
+        elif name == "application_name":
+            server_settings[name] = value
+        elif name == "options":
+            server_settings.update(_libpq_options(value))
+        else:
+            logging.warning(f"Ignoring database URL parameter {name} not supported by asyncpg")
+    if server_settings:
+        connect_args["server_settings"] = server_settings
+    return parsed.set(drivername="postgresql+asyncpg", query=query), connect_args
+
+def get_async_database_url(url: str) -> str:
+    """Map the configured sync URL onto its async driver."""
+    if url.startswith("postgresql://"):
+        return _asyncpg_url(url)[0].render_as_string(hide_password=False)
+    if url.startswith("sqlite://"):
+        return url.replace("sqlite://", "sqlite+aiosqlite://", 1)
+    return url
+
+def get_async_connect_args(url: str) -> Dict[str, Any]:
+    """Driver arguments for libpq URL parameters asyncpg can't take in the URL."""
+    if url.startswith("postgresql://"):
+        return _asyncpg_url(url)[1]
+    return {}
+
+# Create async database engine used by the request path
+if settings.DATABASE_URL.startswith("postgresql://"):
+    async_engine = create_async_engine(
+        get_async_database_url(settings.DATABASE_URL),
+        connect_args=get_async_connect_args(settings.DATABASE_URL),
+        pool_pre_ping=True,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        echo=False
+    )
+elif settings.DATABASE_URL.startswith("sqlite://"):
+    async_engine = create_async_engine(
+        get_async_database_url(settings.DATABASE_URL),
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+        echo=False
+    )
+else:
+    async_engine = create_async_engine(
+        get_async_database_url(settings.DATABASE_URL),
+        pool_pre_ping=True,
+        echo=False
+    )
+
+# Objects stay usable after commit; lazy loads are not available in async code
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+)
+
 # Create declarative base
 Base = declarative_base()
 
@@ -57,6 +155,19 @@ def get_db():
     finally:
         db.close()
 
+# Async database dependency
+async def get_async_db():
+    """
+    Async database dependency for FastAPI routes.
+    Queries await the driver instead of blocking the event loop.
+    """
+    async with AsyncSessionLocal() as db:
+        try:
+            yield db
+        except Exception as e:
+            await db.rollback()
+            raise e
+
 # Database connection test function
 async def test_db_connection():
     """Test database connection."""
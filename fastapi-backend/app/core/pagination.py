@@ -0,0 +1,99 @@
+import base64
+import json
+from datetime import datetime
+from typing import Any, Callable, Dict, Hashable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import and_, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import Select
+
+from app.core.cache import LRUCache
+from app.core.config import settings
+
+
+class InvalidCursor(ValueError):
+    """Raised when a client sends a cursor we did not issue."""
+
+
+def encode_cursor(sort_value: datetime, row_id: Any) -> str:
+    """Build an opaque cursor pointing just past ``(sort_value, row_id)``."""
+    payload = json.dumps([sort_value.isoformat(), str(row_id)], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, id_type: Callable[[str], Any] = int) -> Tuple[datetime, Any]:
+    """Parse a cursor from ``encode_cursor`` back into ``(sort_value, row_id)``."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        sort_value, row_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(sort_value), id_type(row_id)
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor("Invalid pagination cursor") from e
+
+
+def keyset_page(
+    query: Select,
+    sort_column,
+    id_column,
+    limit: int,
+    cursor: Optional[str] = None,
+    id_type: Callable[[str], Any] = int
+) -> Select:
+    """Restrict a query to the page after ``cursor``, newest first.
+
+    Fetches one extra row so ``split_page`` can tell whether another page
+    exists. ``sort_column`` must lead an index (after the equality filters)
+    for this to stay a range scan at any depth.
+    """
+    if cursor:
+        sort_value, row_id = decode_cursor(cursor, id_type)
+        # The redundant <= bound lets the planner use a (.., sort_column) index range
+        query = query.where(and_(
+            sort_column <= sort_value,
+            or_(sort_column < sort_value, id_column < row_id)
+        ))
+    return query.order_by(sort_column.desc(), id_column.desc()).limit(limit + 1)
+
+
+def split_page(rows: Sequence[Any], limit: int, sort_attr: str) -> Tuple[List[Any], Optional[str]]:
+    """Trim the look-ahead row and return ``(page, next_cursor)``."""
+    page = list(rows[:limit])
+    if len(rows) <= limit or not page:
+        return page, None
+    last = page[-1]
+    return page, encode_cursor(getattr(last, sort_attr), last.id)
+
+
+class TotalCountCache:
+    """Short-lived per-user cache of list totals.
+
+    Counting a long history on every page request costs as much as the
+    offset scans cursors replace, so totals are cached per user and list.
+    Writes that change a list should call ``invalidate``; the TTL bounds
+    staleness for the paths that don't and across worker processes.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self._cache = LRUCache(maxsize=maxsize, ttl=ttl)
+
+    async def get(self, db: AsyncSession, user_id: int, key: Hashable, count_query: Select) -> int:
+        """Return the cached total for ``key``, running ``count_query`` on a miss."""
+        totals: Dict[Hashable, int] = self._cache.get(user_id) or {}
+        if key not in totals:
+            totals = {**totals, key: (await db.execute(count_query)).scalar_one()}
+            self._cache.set(user_id, totals)
+        return totals[key]
+
+    def invalidate(self, user_id: int):
+        """Drop every cached total for the user."""
+        self._cache.delete(user_id)
+
+    def stats(self) -> Dict[str, Any]:
+        """Get hit/miss counters."""
+        return self._cache.stats()
+
+
+total_counts = TotalCountCache(
+    maxsize=settings.PAGINATION_COUNT_CACHE_SIZE,
+    ttl=settings.PAGINATION_COUNT_TTL_SECONDS
+)
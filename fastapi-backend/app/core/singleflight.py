@@ -0,0 +1,44 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class SingleFlight:
+    """Coalesce concurrent calls that share a key into one in-flight task.
+
+    The first caller for a key starts the work; callers that arrive while it is
+    still running await the same task and receive the same result (or
+    exception). The task is shielded, so a disconnecting caller does not cancel
+    the work for everyone else. Because the work can outlive its first
+    caller, it must not use anything that caller owns, such as a request's
+    database session; open a fresh ``AsyncSessionLocal()`` instead.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Task] = {}
+        self.leaders = 0
+        self.followers = 0
+
+    async def do(
+        self, key: Hashable, func: Callable[..., Awaitable[Any]], *args, **kwargs
+    ) -> Any:
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(func(*args, **kwargs))
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+            self.leaders += 1
+        else:
+            self.followers += 1
+        return await asyncio.shield(task)
+
+    def _forget(self, key: Hashable, task: asyncio.Task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+
+    def stats(self) -> Dict[str, Any]:
+        """Get coalescing counters."""
+        return {
+            "in_flight": len(self._calls),
+            "leaders": self.leaders,
+            "coalesced": self.followers,
+        }
@@ -0,0 +1,84 @@
+from sqlalchemy import delete, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import func
+from typing import Dict, List, Tuple
+import logging
+
+from app.crud.bulk import delete_in_batches
+from app.models.chat import ChatSession, ChatMessage
+from app.models.skin_memory import UserAllergen, SkinIssue, SkinMemoryEntry, AllergenReaction
+from app.models.user import User, ProductAnalysis, SkinProfile
+
+logger = logging.getLogger(__name__)
+
+def _deletion_plan(user_id: int) -> List[Tuple[type, list]]:
+    """Every table holding user data with its filter, children before parents."""
+    return [
+        (ChatMessage, [ChatMessage.session_id.in_(
+            select(ChatSession.id).where(ChatSession.user_id == user_id)
+        )]),
+        (ChatSession, [ChatSession.user_id == user_id]),
+        (SkinMemoryEntry, [SkinMemoryEntry.user_id == user_id]),
+        (AllergenReaction, [AllergenReaction.user_id == user_id]),
+        (UserAllergen, [UserAllergen.user_id == user_id]),
+        (SkinIssue, [SkinIssue.user_id == user_id]),
+        (ProductAnalysis, [ProductAnalysis.user_id == user_id]),
+        (SkinProfile, [SkinProfile.user_id == user_id]),
+        (User, [User.id == user_id]),
+    ]
+
+async def delete_user_account(db: AsyncSession, user_id: int) -> Dict[str, int]:
+    """Delete a user and everything they own in one transaction.
+
+    Issues one set-based DELETE per table in foreign-key order instead of
+    loading the ORM cascade. Returns the number of rows removed per table.
+    """
+    counts = {}
+    try:
+        for model, criteria in _deletion_plan(user_id):
+            result = await db.execute(
+                delete(model).where(*criteria).execution_options(synchronize_session=False)
+            )
+            counts[model.__tablename__] = result.rowcount
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+
+    logger.info(f"Deleted account {user_id}: {counts}")
+    return counts
+
+async def deactivate_user(db: AsyncSession, user_id: int) -> None:
+    """Lock the account out immediately ahead of a background purge.
+
+    The deletion request is recorded on the user row, so a purge lost to a
+    restart is picked up again by ``pending_account_purges``.
+    """
+    await db.execute(
+        update(User).where(User.id == user_id).values(
+            is_active=False, deletion_requested_at=func.now()
+        )
+    )
+    await db.commit()
+
+async def pending_account_purges(db: AsyncSession) -> List[int]:
+    """Ids of users whose requested background deletion has not finished."""
+    result = await db.execute(
+        select(User.id).where(User.deletion_requested_at.isnot(None)).order_by(User.id)
+    )
+    return list(result.scalars().all())
+
+async def purge_user_account(db: AsyncSession, user_id: int) -> Dict[str, int]:
+    """Delete a (deactivated) user's data in committed batches.
+
+    Background mode for very large accounts: the same deletion order as
+    ``delete_user_account``, but each table is drained in short batches so
+    no single transaction holds locks for long. Safe to re-run if
+    interrupted; the user row goes last.
+    """
+    counts = {}
+    for model, criteria in _deletion_plan(user_id):
+        counts[model.__tablename__] = await delete_in_batches(db, model, *criteria)
+
+    logger.info(f"Purged account {user_id}: {counts}")
+    return counts
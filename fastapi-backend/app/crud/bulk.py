@@ -0,0 +1,28 @@
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
+
+from app.core.config import settings
+
+async def delete_in_batches(db: AsyncSession, model, *criteria, batch_size: Optional[int] = None) -> int:
+    """Delete every row of ``model`` matching ``criteria`` with set-based DELETEs.
+
+    Rows go in primary-key batches of ``batch_size``, each committed on its
+    own, so a heavy user's purge never holds row locks for one long
+    transaction. Returns the number of rows deleted.
+    """
+    batch_size = batch_size or settings.BULK_DELETE_BATCH_SIZE
+    batch_ids = select(model.id).where(*criteria).limit(batch_size).scalar_subquery()
+    statement = (
+        delete(model)
+        .where(model.id.in_(batch_ids))
+        .execution_options(synchronize_session=False)
+    )
+
+    deleted = 0
+    while True:
+        result = await db.execute(statement)
+        await db.commit()
+        deleted += result.rowcount
+        if result.rowcount < batch_size:
+            return deleted
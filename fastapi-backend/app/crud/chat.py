@@ -1,55 +1,74 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import desc, func
-from typing import List, Optional
+from sqlalchemy import desc, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional, Tuple
 from uuid import UUID
 
+from app.core.config import settings
+from app.core.pagination import keyset_page, split_page, total_counts
 from app.models.chat import ChatSession, ChatMessage
 from app.models.user import User
 
-def create_chat_session(db: Session, user_id: int, title: Optional[str] = None) -> ChatSession:
+LAST_MESSAGE_PREVIEW_LENGTH = 200
+
+async def create_chat_session(db: AsyncSession, user_id: int, title: Optional[str] = None) -> ChatSession:
     """Create a new chat session."""
     session = ChatSession(
         user_id=user_id,
         title=title or "New Chat"
     )
     db.add(session)
-    db.commit()
-    db.refresh(session)
+    await db.commit()
+    await db.refresh(session)
+    total_counts.invalidate(user_id)
     return session
 
-def get_user_chat_sessions(db: Session, user_id: int, skip: int = 0, limit: int = 20) -> List[ChatSession]:
-    """Get user's chat sessions with message count and last message."""
-    return (
-        db.query(ChatSession)
-        .filter(ChatSession.user_id == user_id, ChatSession.is_active == True)
-        .order_by(desc(ChatSession.updated_at))
-        .offset(skip)
-        .limit(limit)
-        .all()
+async def get_user_chat_sessions(
+    db: AsyncSession, user_id: int, skip: int = 0, limit: int = 20, cursor: Optional[str] = None
+) -> Tuple[List[ChatSession], Optional[str]]:
+    """Get a page of user's chat sessions, most recently active first, and the next page cursor."""
+    query = keyset_page(
+        select(ChatSession).where(ChatSession.user_id == user_id, ChatSession.is_active == True),
+        ChatSession.updated_at,
+        ChatSession.id,
+        limit,
+        cursor,
+        id_type=UUID
+    )
+    if skip and not cursor:
+        # Offset paging for clients that predate cursors
+        query = query.offset(skip)
+    result = await db.execute(query)
+    return split_page(result.scalars().all(), limit, "updated_at")
+
+async def count_user_chat_sessions(db: AsyncSession, user_id: int) -> int:
+    """Get the total number of active chat sessions (cached briefly)."""
+    query = select(func.count()).select_from(ChatSession).where(
+        ChatSession.user_id == user_id,
+        ChatSession.is_active == True
     )
+    return await total_counts.get(db, user_id, "chat_sessions", query)
 
-def get_chat_session(db: Session, session_id: UUID, user_id: int) -> Optional[ChatSession]:
-    """Get a specific chat session with messages."""
-    return (
-        db.query(ChatSession)
-        .filter(
+async def get_chat_session(db: AsyncSession, session_id: UUID, user_id: int) -> Optional[ChatSession]:
+    """Get a specific chat session."""
+    result = await db.execute(
+        select(ChatSession).where(
             ChatSession.id == session_id,
             ChatSession.user_id == user_id,
             ChatSession.is_active == True
         )
-        .first()
     )
+    return result.scalars().first()
 
-def add_message_to_session(
-    db: Session, 
-    session_id: UUID, 
-    message: str, 
+async def add_message_to_session(
+    db: AsyncSession,
+    session_id: UUID,
+    message: str,
     is_user: bool,
     user_id: int
 ) -> ChatMessage:
     """Add a message to a chat session."""
     # Verify session belongs to user
-    session = get_chat_session(db, session_id, user_id)
+    session = await get_chat_session(db, session_id, user_id)
     if not session:
         raise ValueError("Chat session not found")
     
@@ -60,8 +79,8 @@ def add_message_to_session(
     )
     db.add(chat_message)
     
-    # Update session's updated_at timestamp
-    session.updated_at = func.now()
+    # Update session's updated_at timestamp and denormalized counters
+    record_session_messages(session, message)
     
     # Auto-generate title from first user message if title is "New Chat"
     if session.title == "New Chat" and is_user:
@@ -69,44 +88,58 @@ def add_message_to_session(
         words = message.split()[:5]
         session.title = " ".join(words) + ("..." if len(words) == 5 else "")
     
-    db.commit()
-    db.refresh(chat_message)
+    await db.commit()
+    await db.refresh(chat_message)
     return chat_message
 
-def get_session_messages(db: Session, session_id: UUID, user_id: int) -> List[ChatMessage]:
-    """Get all messages for a session."""
-    session = get_chat_session(db, session_id, user_id)
-    if not session:
-        return []
-    
-    return (
-        db.query(ChatMessage)
-        .filter(ChatMessage.session_id == session_id)
-        .order_by(ChatMessage.created_at)
-        .all()
+def record_session_messages(session: ChatSession, last_message: str, added: int = 1) -> None:
+    """Bump the session's message counters for messages added in this transaction."""
+    # Increment in SQL so concurrent turns on the same session don't lose counts
+    session.message_count = ChatSession.message_count + added
+    session.last_message_preview = last_message[:LAST_MESSAGE_PREVIEW_LENGTH]
+    session.last_message_at = func.now()
+    session.updated_at = func.now()
+
+async def get_session_messages(
+    db: AsyncSession, session_id: UUID, limit: int, cursor: Optional[str] = None
+) -> Tuple[List[ChatMessage], Optional[str]]:
+    """Get a window of a session's messages in chronological order.
+
+    The window ends just before ``cursor`` (or at the latest message); the
+    returned cursor fetches the window of older messages before it.
+    """
+    result = await db.execute(
+        keyset_page(
+            select(ChatMessage).where(ChatMessage.session_id == session_id),
+            ChatMessage.created_at,
+            ChatMessage.id,
+            limit,
+            cursor,
+            id_type=UUID
+        )
     )
+    messages, next_cursor = split_page(result.scalars().all(), limit, "created_at")
+    return list(reversed(messages)), next_cursor
 
-def delete_chat_session(db: Session, session_id: UUID, user_id: int) -> bool:
+async def delete_chat_session(db: AsyncSession, session_id: UUID, user_id: int) -> bool:
     """Delete a chat session (soft delete)."""
-    session = get_chat_session(db, session_id, user_id)
+    session = await get_chat_session(db, session_id, user_id)
     if not session:
         return False
     
     session.is_active = False
-    db.commit()
+    await db.commit()
+    total_counts.invalidate(user_id)
     return True
 
-def get_recent_context(db: Session, session_id: UUID, user_id: int, limit: int = 10) -> List[ChatMessage]:
-    """Get recent messages for context."""
-    return (
-        db.query(ChatMessage)
-        .join(ChatSession)
-        .filter(
-            ChatSession.id == session_id,
-            ChatSession.user_id == user_id,
-            ChatSession.is_active == True
-        )
-        .order_by(desc(ChatMessage.created_at))
-        .limit(limit)
-        .all()
-    )
\ No newline at end of file
+async def get_conversation_context(
+    db: AsyncSession, session: ChatSession, limit: Optional[int] = None
+) -> List[ChatMessage]:
+    """Get the session's newest messages not yet folded into its summary, newest first."""
+    query = select(ChatMessage).where(ChatMessage.session_id == session.id)
+    if session.summarized_until is not None:
+        query = query.where(ChatMessage.created_at > session.summarized_until)
+    result = await db.execute(
+        query.order_by(desc(ChatMessage.created_at)).limit(limit or settings.CHAT_CONTEXT_FETCH_LIMIT)
+    )
+    return result.scalars().all()
\ No newline at end of file
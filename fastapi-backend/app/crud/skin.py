@@ -1,6 +1,9 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.models.user import User, ProductAnalysis
 from app.schemas.skin import SkinAssessmentCreate, ProductAnalysisCreate
+from app.core.auth_cache import auth_cache
+from app.services.skin_context import skin_context_cache
 from typing import Dict, Any
 
 
@@ -54,10 +57,11 @@ def determine_skin_type(answers: Dict[int, str]) -> str:
         return "normal"
 
 
-def update_user_skin_assessment(
-    db: Session, user_id: int, assessment: SkinAssessmentCreate
+async def update_user_skin_assessment(
+    db: AsyncSession, user_id: int, assessment: SkinAssessmentCreate
 ):
-    user = db.query(User).filter(User.id == user_id).first()
+    result = await db.execute(select(User).where(User.id == user_id))
+    user = result.scalars().first()
     if not user:
         return None
 
@@ -67,12 +71,14 @@ def update_user_skin_assessment(
     user.skin_assessment_answers = assessment.answers
     user.skin_concerns = assessment.additional_concerns
 
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await db.refresh(user)
+    skin_context_cache.invalidate(user_id)
+    auth_cache.invalidate_user(user.email)
     return user
 
 
-def create_product_analysis(db: Session, user_id: int, analysis_data: Dict[str, Any]):
+async def create_product_analysis(db: AsyncSession, user_id: int, analysis_data: Dict[str, Any]):
     analysis = ProductAnalysis(
         user_id=user_id,
         product_name=analysis_data.get("product_name"),
@@ -84,18 +90,18 @@ def create_product_analysis(db: Session, user_id: int, analysis_data: Dict[str,
     )
 
     db.add(analysis)
-    db.commit()
-    db.refresh(analysis)
+    await db.commit()
+    await db.refresh(analysis)
     return analysis
 
 
 # sort it by created_at descending
-def get_user_analyses(db: Session, user_id: int, skip: int = 0, limit: int = 10):
-    return (
-        db.query(ProductAnalysis)
-        .filter(ProductAnalysis.user_id == user_id)
+async def get_user_analyses(db: AsyncSession, user_id: int, skip: int = 0, limit: int = 10):
+    result = await db.execute(
+        select(ProductAnalysis)
+        .where(ProductAnalysis.user_id == user_id)
         .order_by(ProductAnalysis.created_at.desc())
         .offset(skip)
         .limit(limit)
-        .all()
     )
+    return result.scalars().all()
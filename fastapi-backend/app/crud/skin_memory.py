@@ -1,9 +1,12 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_
-from typing import List, Optional, Dict, Any
+from sqlalchemy import and_, func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional, Dict, Any, Tuple
 from datetime import datetime, timedelta
 
 from app.models.skin_memory import UserAllergen, SkinIssue, SkinMemoryEntry, AllergenReaction
+from app.core.pagination import keyset_page, split_page, total_counts
+from app.crud.bulk import delete_in_batches
+from app.services.skin_context import skin_context_cache
 from app.schemas.skin_memory import (
     UserAllergenCreate, UserAllergenUpdate,
     SkinIssueCreate, SkinIssueUpdate,
@@ -14,27 +17,29 @@ class SkinMemoryCRUD:
     
     # ============= ALLERGEN METHODS =============
     
-    def get_user_allergens(self, db: Session, user_id: int) -> List[UserAllergen]:
+    async def get_user_allergens(self, db: AsyncSession, user_id: int) -> List[UserAllergen]:
         """Get all active allergens for a user"""
-        return db.query(UserAllergen).filter(
+        result = await db.execute(select(UserAllergen).where(
             and_(
                 UserAllergen.user_id == user_id,
                 UserAllergen.is_active == True
             )
-        ).order_by(UserAllergen.first_detected.desc()).all()
+        ).order_by(UserAllergen.first_detected.desc()))
+        return result.scalars().all()
     
-    def get_allergen_by_id(self, db: Session, allergen_id: int, user_id: int) -> Optional[UserAllergen]:
+    async def get_allergen_by_id(self, db: AsyncSession, allergen_id: int, user_id: int) -> Optional[UserAllergen]:
         """Get a specific allergen by ID for a user"""
-        return db.query(UserAllergen).filter(
+        result = await db.execute(select(UserAllergen).where(
             and_(
                 UserAllergen.id == allergen_id,
                 UserAllergen.user_id == user_id
             )
-        ).first()
+        ))
+        return result.scalars().first()
     
     async def add_user_allergen(
         self, 
-        db: Session, 
+        db: AsyncSession, 
         user_id: int, 
         ingredient_name: str,
         severity: str = "mild",
@@ -44,13 +49,14 @@ class SkinMemoryCRUD:
         """Add a new allergen for a user"""
         try:
             # Check if allergen already exists
-            existing = db.query(UserAllergen).filter(
+            result = await db.execute(select(UserAllergen).where(
                 and_(
                     UserAllergen.user_id == user_id,
                     UserAllergen.ingredient_name.ilike(ingredient_name),
                     UserAllergen.is_active == True
                 )
-            ).first()
+            ))
+            existing = result.scalars().first()
             
             if existing:
                 # Update existing allergen
@@ -58,8 +64,9 @@ class SkinMemoryCRUD:
                 existing.notes = notes
                 existing.confirmed = confirmed
                 existing.updated_at = datetime.utcnow()
-                db.commit()
-                db.refresh(existing)
+                await db.commit()
+                await db.refresh(existing)
+                skin_context_cache.invalidate(user_id)
                 return existing
             else:
                 # Create new allergen
@@ -71,24 +78,25 @@ class SkinMemoryCRUD:
                     confirmed=confirmed
                 )
                 db.add(allergen)
-                db.commit()
-                db.refresh(allergen)
+                await db.commit()
+                await db.refresh(allergen)
+                skin_context_cache.invalidate(user_id)
                 return allergen
                 
         except Exception as e:
-            db.rollback()
+            await db.rollback()
             raise Exception(f"Failed to add allergen: {str(e)}")
     
-    def update_allergen(
+    async def update_allergen(
         self, 
-        db: Session, 
+        db: AsyncSession, 
         allergen_id: int, 
         user_id: int, 
         update_data: UserAllergenUpdate
     ) -> Optional[UserAllergen]:
         """Update an existing allergen"""
         try:
-            allergen = self.get_allergen_by_id(db, allergen_id, user_id)
+            allergen = await self.get_allergen_by_id(db, allergen_id, user_id)
             if not allergen:
                 return None
             
@@ -97,49 +105,53 @@ class SkinMemoryCRUD:
                 setattr(allergen, field, value)
             
             allergen.updated_at = datetime.utcnow()
-            db.commit()
-            db.refresh(allergen)
+            await db.commit()
+            await db.refresh(allergen)
+            skin_context_cache.invalidate(user_id)
             return allergen
             
         except Exception as e:
-            db.rollback()
+            await db.rollback()
             raise Exception(f"Failed to update allergen: {str(e)}")
     
-    def delete_allergen(self, db: Session, allergen_id: int, user_id: int) -> bool:
+    async def delete_allergen(self, db: AsyncSession, allergen_id: int, user_id: int) -> bool:
         """Hard delete an allergen"""
         try:
-            allergen = self.get_allergen_by_id(db, allergen_id, user_id)
+            allergen = await self.get_allergen_by_id(db, allergen_id, user_id)
             if not allergen:
                 return False
             
-            db.delete(allergen)
-            db.commit()
+            await db.delete(allergen)
+            await db.commit()
+            skin_context_cache.invalidate(user_id)
             return True
             
         except Exception as e:
-            db.rollback()
+            await db.rollback()
             raise Exception(f"Failed to delete allergen: {str(e)}")
     
     # ============= SKIN ISSUES METHODS =============
     
-    def get_user_skin_issues(self, db: Session, user_id: int) -> List[SkinIssue]:
+    async def get_user_skin_issues(self, db: AsyncSession, user_id: int) -> List[SkinIssue]:
         """Get all active skin issues for a user"""
-        return db.query(SkinIssue).filter(
+        result = await db.execute(select(SkinIssue).where(
             SkinIssue.user_id == user_id
-        ).order_by(SkinIssue.last_updated.desc()).all()
+        ).order_by(SkinIssue.last_updated.desc()))
+        return result.scalars().all()
     
-    def get_skin_issue_by_id(self, db: Session, issue_id: int, user_id: int) -> Optional[SkinIssue]:
+    async def get_skin_issue_by_id(self, db: AsyncSession, issue_id: int, user_id: int) -> Optional[SkinIssue]:
         """Get a specific skin issue by ID for a user"""
-        return db.query(SkinIssue).filter(
+        result = await db.execute(select(SkinIssue).where(
             and_(
                 SkinIssue.id == issue_id,
                 SkinIssue.user_id == user_id
             )
-        ).first()
+        ))
+        return result.scalars().first()
     
     async def add_skin_issue(
         self,
-        db: Session,
+        db: AsyncSession,
         user_id: int,
         issue_type: str,
         description: str = None,
@@ -150,13 +162,14 @@ class SkinMemoryCRUD:
         """Add a new skin issue for a user"""
         try:
             # Check if similar issue already exists
-            existing = db.query(SkinIssue).filter(
+            result = await db.execute(select(SkinIssue).where(
                 and_(
                     SkinIssue.user_id == user_id,
                     SkinIssue.issue_type.ilike(issue_type),
                     SkinIssue.status.in_(["active", "improving"])
                 )
-            ).first()
+            ))
+            existing = result.scalars().first()
             
             if existing:
                 # Update existing issue
@@ -165,8 +178,9 @@ class SkinMemoryCRUD:
                 existing.triggers = triggers or existing.triggers
                 existing.status = status
                 existing.last_updated = datetime.utcnow()
-                db.commit()
-                db.refresh(existing)
+                await db.commit()
+                await db.refresh(existing)
+                skin_context_cache.invalidate(user_id)
                 return existing
             else:
                 # Create new issue
@@ -179,24 +193,25 @@ class SkinMemoryCRUD:
                     status=status
                 )
                 db.add(issue)
-                db.commit()
-                db.refresh(issue)
+                await db.commit()
+                await db.refresh(issue)
+                skin_context_cache.invalidate(user_id)
                 return issue
                 
         except Exception as e:
-            db.rollback()
+            await db.rollback()
             raise Exception(f"Failed to add skin issue: {str(e)}")
     
-    def update_skin_issue(
+    async def update_skin_issue(
         self,
-        db: Session,
+        db: AsyncSession,
         issue_id: int,
         user_id: int,
         update_data: SkinIssueUpdate
     ) -> Optional[SkinIssue]:
         """Update an existing skin issue"""
         try:
-            issue = self.get_skin_issue_by_id(db, issue_id, user_id)
+            issue = await self.get_skin_issue_by_id(db, issue_id, user_id)
             if not issue:
                 return None
             
@@ -210,34 +225,36 @@ class SkinMemoryCRUD:
             if update_dict.get("status") == "resolved" and not issue.resolved_date:
                 issue.resolved_date = datetime.utcnow()
             
-            db.commit()
-            db.refresh(issue)
+            await db.commit()
+            await db.refresh(issue)
+            skin_context_cache.invalidate(user_id)
             return issue
             
         except Exception as e:
-            db.rollback()
+            await db.rollback()
             raise Exception(f"Failed to update skin issue: {str(e)}")
     
-    def delete_skin_issue(self, db: Session, issue_id: int, user_id: int) -> bool:
+    async def delete_skin_issue(self, db: AsyncSession, issue_id: int, user_id: int) -> bool:
         """Delete a skin issue (hard delete)"""
         try:
-            issue = self.get_skin_issue_by_id(db, issue_id, user_id)
+            issue = await self.get_skin_issue_by_id(db, issue_id, user_id)
             if not issue:
                 return False
             
-            db.delete(issue)
-            db.commit()
+            await db.delete(issue)
+            await db.commit()
+            skin_context_cache.invalidate(user_id)
             return True
             
         except Exception as e:
-            db.rollback()
+            await db.rollback()
             raise Exception(f"Failed to delete skin issue: {str(e)}")
     
     # ============= MEMORY ENTRY METHODS =============
     
-    def add_memory_entry(
+    async def add_memory_entry(
         self,
-        db: Session,
+        db: AsyncSession,
         user_id: int,
         entry_type: str,
         content: str,
@@ -256,83 +273,122 @@ class SkinMemoryCRUD:
                 importance=importance
             )
             db.add(entry)
-            db.commit()
-            db.refresh(entry)
+            await db.commit()
+            await db.refresh(entry)
+            total_counts.invalidate(user_id)
             return entry
             
         except Exception as e:
-            db.rollback()
+            await db.rollback()
             raise Exception(f"Failed to add memory entry: {str(e)}")
     
-    def get_user_memory_entries(
+    async def add_memory_entries(self, db: AsyncSession, user_id: int, entries: List[Dict[str, Any]]) -> int:
+        """Add several memory entries in a single transaction"""
+        if not entries:
+            return 0
+        
+        try:
+            db.add_all([SkinMemoryEntry(user_id=user_id, **entry) for entry in entries])
+            await db.commit()
+            total_counts.invalidate(user_id)
+            return len(entries)
+            
+        except Exception as e:
+            await db.rollback()
+            raise Exception(f"Failed to add memory entries: {str(e)}")
+    
+    async def get_user_memory_entries(
         self,
-        db: Session, 
+        db: AsyncSession, 
         user_id: int, 
         entry_type: str = None, 
         limit: int = 50,
-        skip: int = 0
-    ) -> List[SkinMemoryEntry]:
-        """Get user's memory entries with optional filtering"""
-        query = db.query(SkinMemoryEntry).filter(
+        skip: int = 0,
+        cursor: Optional[str] = None
+    ) -> Tuple[List[SkinMemoryEntry], Optional[str]]:
+        """Get a page of user's memory entries, newest first, and the next page cursor"""
+        query = select(SkinMemoryEntry).where(
+            SkinMemoryEntry.user_id == user_id,
+            SkinMemoryEntry.is_active == True
+        )
+        
+        if entry_type:
+            query = query.where(SkinMemoryEntry.entry_type == entry_type)
+        
+        query = keyset_page(query, SkinMemoryEntry.created_at, SkinMemoryEntry.id, limit, cursor)
+        if skip and not cursor:
+            # Offset paging for clients that predate cursors
+            query = query.offset(skip)
+        
+        result = await db.execute(query)
+        return split_page(result.scalars().all(), limit, "created_at")
+    
+    async def count_user_memory_entries(self, db: AsyncSession, user_id: int, entry_type: str = None) -> int:
+        """Get the total number of active memory entries (cached briefly)"""
+        query = select(func.count()).select_from(SkinMemoryEntry).where(
             SkinMemoryEntry.user_id == user_id,
             SkinMemoryEntry.is_active == True
         )
         
         if entry_type:
-            query = query.filter(SkinMemoryEntry.entry_type == entry_type)
+            query = query.where(SkinMemoryEntry.entry_type == entry_type)
         
-        return query.order_by(SkinMemoryEntry.created_at.desc()).offset(skip).limit(limit).all()
+        return await total_counts.get(db, user_id, ("memory_entries", entry_type), query)
     
-    def delete_memory_entry(self, db: Session, memory_id: int, user_id: int) -> bool:
-        """Delete a specific memory entry (hard delete)"""
+    async def delete_memory_entry(
+        self, db: AsyncSession, memory_id: int, user_id: int, entry_type: Optional[str] = None
+    ) -> bool:
+        """Delete a specific memory entry, optionally only if it has the given type (hard delete)"""
+        criteria = [
+            SkinMemoryEntry.id == memory_id,
+            SkinMemoryEntry.user_id == user_id,
+            SkinMemoryEntry.is_active == True
+        ]
+        
+        if entry_type:
+            criteria.append(SkinMemoryEntry.entry_type == entry_type)
+        
         try:
-            memory = db.query(SkinMemoryEntry).filter(
-                SkinMemoryEntry.id == memory_id,
-                SkinMemoryEntry.user_id == user_id,
-                SkinMemoryEntry.is_active == True
-            ).first()
+            result = await db.execute(select(SkinMemoryEntry).where(*criteria))
+            memory = result.scalars().first()
             
             if not memory:
                 return False
             
-            db.delete(memory)
-            db.commit()
+            await db.delete(memory)
+            await db.commit()
+            total_counts.invalidate(user_id)
             return True
         except Exception as e:
-            db.rollback()
+            await db.rollback()
             raise e
 
-    def delete_all_user_memories(self, db: Session, user_id: int, entry_type: Optional[str] = None) -> int:
+    async def delete_all_user_memories(self, db: AsyncSession, user_id: int, entry_type: Optional[str] = None) -> int:
         """Delete all memory entries for a user, optionally filtered by type (hard delete)"""
+        criteria = [
+            SkinMemoryEntry.user_id == user_id,
+            SkinMemoryEntry.is_active == True
+        ]
+        
+        if entry_type:
+            criteria.append(SkinMemoryEntry.entry_type == entry_type)
+        
         try:
-            query = db.query(SkinMemoryEntry).filter(
-                SkinMemoryEntry.user_id == user_id,
-                SkinMemoryEntry.is_active == True
-            )
-            
-            if entry_type:
-                query = query.filter(SkinMemoryEntry.entry_type == entry_type)
-            
-            # Get all entries to delete
-            entries_to_delete = query.all()
-            count = len(entries_to_delete)
-            
-            # Delete each entry
-            for entry in entries_to_delete:
-                db.delete(entry)
-            
-            db.commit()
-            return count
+            count = await delete_in_batches(db, SkinMemoryEntry, *criteria)
         except Exception as e:
-            db.rollback()
+            await db.rollback()
             raise e
+        finally:
+            # Earlier batches may have committed even if a later one failed
+            total_counts.invalidate(user_id)
+        return count
     
     # ============= ANALYTICS METHODS =============
     
-    def get_user_skin_summary(self, db: Session, user_id: int) -> Dict[str, Any]:
+    async def get_user_skin_summary(self, db: AsyncSession, user_id: int) -> Dict[str, Any]:
         """Get comprehensive skin summary for a user"""
-        allergens = self.get_user_allergens(db, user_id)
-        issues = self.get_user_skin_issues(db, user_id)
+        allergens = await self.get_user_allergens(db, user_id)
+        issues = await self.get_user_skin_issues(db, user_id)
         
         # Active issues
         active_issues = [i for i in issues if i.status == "active"]
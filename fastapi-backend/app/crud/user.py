@@ -1,25 +1,34 @@
 from datetime import datetime, timezone
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import IntegrityError
 from app.models.user import User
 from app.schemas.user import UserCreate, UserUpdate
-from app.core.security import get_password_hash, verify_password
+from app.core.security import (
+    get_password_hash_async,
+    verify_and_update_password,
+    verify_password_async,
+)
+from app.core.auth_cache import auth_cache
 from typing import Optional
 import logging
 
 logger = logging.getLogger(__name__)
 
-def get_user_by_email(db: Session, email: str):
-    return db.query(User).filter(User.email == email).first()
+async def get_user_by_email(db: AsyncSession, email: str):
+    result = await db.execute(select(User).where(User.email == email))
+    return result.scalars().first()
 
-def get_user_by_username(db: Session, username: str):
-    return db.query(User).filter(User.username == username).first()
+async def get_user_by_username(db: AsyncSession, username: str):
+    result = await db.execute(select(User).where(User.username == username))
+    return result.scalars().first()
 
-def get_user_by_google_id(db: Session, google_id: str):
-    return db.query(User).filter(User.google_id == google_id).first()
+async def get_user_by_google_id(db: AsyncSession, google_id: str):
+    result = await db.execute(select(User).where(User.google_id == google_id))
+    return result.scalars().first()
 
-def create_user(db: Session, user: UserCreate):
-    hashed_password = get_password_hash(user.password)
+async def create_user(db: AsyncSession, user: UserCreate):
+    hashed_password = await get_password_hash_async(user.password)
     db_user = User(
         email=user.email,
         username=user.username,
@@ -30,15 +39,15 @@ def create_user(db: Session, user: UserCreate):
     )
     try:
         db.add(db_user)
-        db.commit()
-        db.refresh(db_user)
+        await db.commit()
+        await db.refresh(db_user)
         return db_user
     except IntegrityError as e:
-        db.rollback()
+        await db.rollback()
         logger.error(f"Error creating user: {e}")
         raise ValueError("User with this email or username already exists")
 
-def create_google_user(db: Session, email: str, google_id: str, full_name: str, profile_picture: str = None):
+async def create_google_user(db: AsyncSession, email: str, google_id: str, full_name: str, profile_picture: str = None):
     """Create a new user from Google OAuth"""
     try:
         # Generate username from email
@@ -47,7 +56,7 @@ def create_google_user(db: Session, email: str, google_id: str, full_name: str,
         # Ensure username is unique
         counter = 1
         original_username = username
-        while get_user_by_username(db, username):
+        while await get_user_by_username(db, username):
             username = f"{original_username}_{counter}"
             counter += 1
         
@@ -66,47 +75,58 @@ def create_google_user(db: Session, email: str, google_id: str, full_name: str,
         )
         
         db.add(db_user)
-        db.commit()
-        db.refresh(db_user)
+        await db.commit()
+        await db.refresh(db_user)
         logger.info(f"Successfully created Google user: {email}")
         return db_user
         
     except IntegrityError as e:
-        db.rollback()
+        await db.rollback()
         logger.error(f"Error creating Google user: {e}")
         # Try to get existing user by email
-        existing_user = get_user_by_email(db, email)
+        existing_user = await get_user_by_email(db, email)
         if existing_user:
             logger.info(f"User already exists, returning existing user: {email}")
             return existing_user
         raise ValueError("Failed to create user due to database constraint")
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         logger.error(f"Unexpected error creating Google user: {e}")
         raise
 
-def authenticate_user(db: Session, email: str, password: str):
-    user = get_user_by_email(db, email)
+async def authenticate_user(db: AsyncSession, email: str, password: str):
+    user = await get_user_by_email(db, email)
     if not user:
         return False
     if not user.hashed_password:  # OAuth user trying to login with password
         return False
-    if not verify_password(password, user.hashed_password):
+    valid, new_hash = await verify_and_update_password(password, user.hashed_password)
+    if not valid:
         return False
+    
+    # Transparently upgrade hashes made with an older work factor
+    if new_hash:
+        user.hashed_password = new_hash
+        await db.commit()
+        await db.refresh(user)
+        auth_cache.invalidate_user(user.email)
+        logger.info(f"Rehashed password for user {user.id}")
     return user
 
-def update_user_profile(db: Session, user_id: int, user_update: UserUpdate):
+async def update_user_profile(db: AsyncSession, user_id: int, user_update: UserUpdate):
     """Update user profile (excluding email and password)."""
-    user = db.query(User).filter(User.id == user_id).first()
+    result = await db.execute(select(User).where(User.id == user_id))
+    user = result.scalars().first()
     if not user:
         return None
     
     # Check if username is already taken by another user
     if user_update.username and user_update.username != user.username:
-        existing_user = db.query(User).filter(
+        result = await db.execute(select(User).where(
             User.username == user_update.username,
             User.id != user_id
-        ).first()
+        ))
+        existing_user = result.scalars().first()
         if existing_user:
             raise ValueError("Username already taken")
     
@@ -115,22 +135,25 @@ def update_user_profile(db: Session, user_id: int, user_update: UserUpdate):
     for field, value in update_data.items():
         setattr(user, field, value)
     
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await db.refresh(user)
+    auth_cache.invalidate_user(user.email)
     return user
 
-def change_user_password(db: Session, user_id: int, current_password: str, new_password: str):
+async def change_user_password(db: AsyncSession, user_id: int, current_password: str, new_password: str):
     """Change user password after verifying current password."""
-    user = db.query(User).filter(User.id == user_id).first()
+    result = await db.execute(select(User).where(User.id == user_id))
+    user = result.scalars().first()
     if not user:
         return None
     
     # Verify current password
-    if not verify_password(current_password, user.hashed_password):
+    if not await verify_password_async(current_password, user.hashed_password):
         raise ValueError("Current password is incorrect")
     
     # Update password
-    user.hashed_password = get_password_hash(new_password)
-    db.commit()
-    db.refresh(user)
+    user.hashed_password = await get_password_hash_async(new_password)
+    await db.commit()
+    await db.refresh(user)
+    auth_cache.invalidate_user(user.email)
     return user
\ No newline at end of file
@@ -2,6 +2,7 @@
 from app.models.user import User, ProductAnalysis, SkinProfile
 from app.models.skin_memory import UserAllergen, SkinIssue, SkinMemoryEntry, AllergenReaction
 from app.models.chat import ChatSession, ChatMessage
+from app.models.analysis_cache import AnalysisCacheEntry
 
 # Export all models
 __all__ = [
@@ -13,5 +14,6 @@ __all__ = [
     "SkinMemoryEntry",
     "AllergenReaction",
     "ChatSession",
-    "ChatMessage"
+    "ChatMessage",
+    "AnalysisCacheEntry"
 ]
\ No newline at end of file
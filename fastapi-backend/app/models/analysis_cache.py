@@ -0,0 +1,12 @@
+from sqlalchemy import Column, Integer, String, DateTime, JSON
+from sqlalchemy.sql import func
+from app.core.database import Base
+
+class AnalysisCacheEntry(Base):
+    __tablename__ = "analysis_cache"
+
+    cache_key = Column(String(64), primary_key=True)  # sha256 of image bytes + skin profile fingerprint
+    result = Column(JSON, nullable=False)
+    created_at = Column(DateTime, server_default=func.now())
+    last_accessed_at = Column(DateTime, server_default=func.now(), index=True)
+    hit_count = Column(Integer, default=0)
@@ -1,10 +1,19 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, JSON, ForeignKey, Float
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, JSON, ForeignKey, Float, Index, text
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.core.database import Base
 
+# Partial index predicate for "active rows only"; each dialect spells true differently
+ACTIVE_ONLY = {
+    "postgresql_where": text("is_active = true"),
+    "sqlite_where": text("is_active = 1"),
+}
+
 class UserAllergen(Base):
     __tablename__ = "user_allergens"
+    __table_args__ = (
+        Index("ix_user_allergens_user_active_detected", "user_id", "first_detected", **ACTIVE_ONLY),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -21,6 +30,9 @@ class UserAllergen(Base):
 
 class SkinIssue(Base):
     __tablename__ = "skin_issues"
+    __table_args__ = (
+        Index("ix_skin_issues_user_updated", "user_id", "last_updated"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -38,6 +50,10 @@ class SkinIssue(Base):
 
 class SkinMemoryEntry(Base):
     __tablename__ = "skin_memory_entries"
+    __table_args__ = (
+        Index("ix_skin_memory_entries_user_type_active_created", "user_id", "entry_type", "created_at", **ACTIVE_ONLY),
+        Index("ix_skin_memory_entries_user_active_created", "user_id", "created_at", **ACTIVE_ONLY),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -28,6 +28,8 @@ class User(Base):
     is_verified = Column(Boolean, default=False)
     created_at = Column(DateTime, server_default=func.now())
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+    # Set when a background account deletion is requested; the purge resumes on startup
+    deletion_requested_at = Column(DateTime, nullable=True, index=True)
     # Google OAuth fields
     google_id = Column(String, nullable=True, unique=True)
     auth_provider = Column(String, default="local")  # "local" or "google"
@@ -1,13 +1,13 @@
 from datetime import timedelta, datetime
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel
 import logging
 
-from app.core.database import get_db
+from app.core.database import get_async_db
 from app.core.config import settings
-from app.core.security import create_access_token, verify_password
+from app.core.security import create_access_token
 from app.schemas.user import (
     UserCreate,
     UserResponse,
@@ -27,6 +27,11 @@ from app.crud.user import (
 )
 from app.api.deps import get_current_active_user
 from app.models.user import User
+from app.core.auth_cache import auth_cache
+from app.core.background import background_jobs
+from app.core.pagination import total_counts
+from app.crud.account import deactivate_user, delete_user_account, purge_user_account
+from app.services.skin_context import skin_context_cache
 from firebase_admin import auth as firebase_auth
 
 
@@ -51,18 +56,18 @@ class GoogleAuthResponse(BaseModel):
 
 
 @router.post("/register", response_model=Token)
-async def register(user: UserCreate, db: Session = Depends(get_db)):
+async def register(user: UserCreate, db: AsyncSession = Depends(get_async_db)):
     # Check if user already exists
-    db_user = get_user_by_email(db, email=user.email)
+    db_user = await get_user_by_email(db, email=user.email)
     if db_user:
         raise HTTPException(status_code=400, detail="Email already registered")
 
-    db_username = get_user_by_username(db, username=user.username)
+    db_username = await get_user_by_username(db, username=user.username)
     if db_username:
         raise HTTPException(status_code=400, detail="Username already taken")
 
     # Create user
-    new_user = create_user(db=db, user=user)
+    new_user = await create_user(db=db, user=user)
 
     # Generate access token for the new user
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -73,8 +78,8 @@ async def register(user: UserCreate, db: Session = Depends(get_db)):
 
 
 @router.post("/login", response_model=Token)
-async def login(user_credentials: UserLogin, db: Session = Depends(get_db)):
-    user = authenticate_user(db, user_credentials.email, user_credentials.password)
+async def login(user_credentials: UserLogin, db: AsyncSession = Depends(get_async_db)):
+    user = await authenticate_user(db, user_credentials.email, user_credentials.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -94,7 +99,7 @@ class TokenIn(BaseModel):
 
 @router.post("/google", response_model=GoogleAuthResponse)
 async def login_with_google(
-    google_data: GoogleTokenRequest, db: Session = Depends(get_db)
+    google_data: GoogleTokenRequest, db: AsyncSession = Depends(get_async_db)
 ):
     try:
         # Step 1: Verify Firebase ID token
@@ -120,13 +125,13 @@ async def login_with_google(
         logging.info(f"Firebase token verified for user: {email}")
 
         # Step 3: Check if user exists in our database
-        user = get_user_by_email(db, email)
+        user = await get_user_by_email(db, email)
         is_new_user = False
 
         if not user:
             # Step 4: Create new user if doesn't exist
             try:
-                user = create_google_user(
+                user = await create_google_user(
                     db=db,
                     email=email,
                     google_id=firebase_uid,
@@ -150,12 +155,13 @@ async def login_with_google(
                 if not user.is_verified:
                     user.is_verified = True
 
-                db.commit()
-                db.refresh(user)
+                await db.commit()
+                await db.refresh(user)
+                auth_cache.invalidate_user(user.email)
                 logging.info(f"Updated existing user: {email}")
             except Exception as update_error:
                 logging.error(f"Error updating user: {update_error}")
-                db.rollback()
+                await db.rollback()
                 raise HTTPException(
                     status_code=500, detail="Failed to update user account"
                 )
@@ -201,9 +207,9 @@ async def login_with_google(
 
 @router.post("/token", response_model=Token)
 async def login_for_access_token(
-    form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)
+    form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_async_db)
 ):
-    user = authenticate_user(db, form_data.username, form_data.password)
+    user = await authenticate_user(db, form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -223,25 +229,36 @@ async def read_users_me(current_user: User = Depends(get_current_active_user)):
 
 
 @router.delete("/delete-account", status_code=204)
-async def delete_user_account(
-    current_user: User = Depends(get_current_active_user), db: Session = Depends(get_db)
+async def delete_user_account_endpoint(
+    background: bool = False,
+    current_user: User = Depends(get_current_active_user), db: AsyncSession = Depends(get_async_db)
 ):
-    """Delete the current user's account permanently."""
-    try:
-        # Delete user's product analyses first (due to foreign key constraints)
-        from app.models.user import ProductAnalysis
-
-        db.query(ProductAnalysis).filter(
-            ProductAnalysis.user_id == current_user.id
-        ).delete()
+    """Delete the current user's account permanently.
 
-        # Delete the user
-        db.delete(current_user)
-        db.commit()
+    With ``background=true`` the account is deactivated right away and its
+    data is purged in batches after the response (202), for huge accounts.
+    """
+    user_id = current_user.id
+    email = current_user.email
+    try:
+        if background:
+            await deactivate_user(db, user_id)
+            auth_cache.invalidate_user(email)
+            skin_context_cache.invalidate(user_id)
+            total_counts.invalidate(user_id)
+            if background_jobs.submit("account_purge", purge_user_account, user_id):
+                return Response(status_code=202)
+            # Queue full: fall through and delete inline
+
+        await delete_user_account(db, user_id)
+        skin_context_cache.invalidate(user_id)
+        auth_cache.invalidate_user(email)
+        total_counts.invalidate(user_id)
 
         return {"message": "Account deleted successfully"}
     except Exception as e:
-        db.rollback()
+        logging.error(f"Account deletion failed for user {user_id}: {e}")
+        await db.rollback()
         raise HTTPException(
             status_code=500, detail="Failed to delete account. Please try again."
         )
@@ -257,11 +274,11 @@ async def logout(current_user: User = Depends(get_current_active_user)):
 async def update_profile(
     user_update: UserUpdate,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """Update user profile information (excluding email)."""
     try:
-        updated_user = update_user_profile(db, current_user.id, user_update)
+        updated_user = await update_user_profile(db, current_user.id, user_update)
         if not updated_user:
             raise HTTPException(status_code=404, detail="User not found")
         return updated_user
@@ -273,7 +290,7 @@ async def update_profile(
 async def change_password(
     password_data: PasswordChange,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """Change user password."""
     try:
@@ -283,7 +300,7 @@ async def change_password(
                 status_code=400, detail="Cannot change password for OAuth users"
             )
 
-        updated_user = change_user_password(
+        updated_user = await change_user_password(
             db,
             current_user.id,
             password_data.current_password,
@@ -1,9 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 from uuid import UUID
 
-from app.core.database import get_db
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal, get_async_db
+from app.core.background import background_jobs
+from app.core.pagination import InvalidCursor
 from app.schemas.chat import (
     ChatSessionCreate, 
     ChatSessionResponse, 
@@ -12,17 +16,23 @@ from app.schemas.chat import (
     ChatMessageResponse
 )
 from app.api.deps import get_current_active_user
+from app.api.streaming import sse_event
 from app.models.user import User
-from app.models.skin_memory import UserAllergen, SkinIssue
 from app.crud.chat import (
     create_chat_session,
     get_user_chat_sessions,
+    count_user_chat_sessions,
     get_chat_session,
+    get_session_messages,
     add_message_to_session,
     delete_chat_session,
-    get_recent_context
+    get_conversation_context
 )
-from app.services.gemini_chat import GeminiChatService
+from app.services.chat_summary import chat_summarizer
+from app.services.gemini_chat import chat_flights, gemini_chat_service
+from app.services.llm_admission import LLMRateLimited, llm_admission
+from app.services.llm_resilience import LLMTimeoutError, LLMUnavailableError
+from app.services.skin_context import skin_context_cache
 
 router = APIRouter(prefix="/chat", tags=["Skincare Chat"])
 
@@ -30,11 +40,11 @@ router = APIRouter(prefix="/chat", tags=["Skincare Chat"])
 async def create_new_chat_session(
     session_data: ChatSessionCreate,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Create a new chat session."""
     
-    session = create_chat_session(
+    session = await create_chat_session(
         db=db,
         user_id=current_user.id,
         title=session_data.title
@@ -51,29 +61,39 @@ async def create_new_chat_session(
 
 @router.get("/sessions", response_model=List[ChatSessionListResponse])
 async def get_chat_sessions(
+    response: Response,
     skip: int = 0,
     limit: int = 20,
+    cursor: Optional[str] = None,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Get user's chat sessions."""
+    """Get user's chat sessions.
+
+    Pass the ``X-Next-Cursor`` response header back as ``cursor`` to fetch
+    the next page; ``X-Total-Count`` carries the total number of sessions.
+    """
     
-    sessions = get_user_chat_sessions(db, current_user.id, skip, limit)
+    try:
+        sessions, next_cursor = await get_user_chat_sessions(db, current_user.id, skip, limit, cursor)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    response.headers["X-Total-Count"] = str(await count_user_chat_sessions(db, current_user.id))
     
     session_list = []
     for session in sessions:
-        # Get message count and last message
-        message_count = len(session.messages)
-        last_message = session.messages[-1].message if session.messages else None
-        
         session_list.append(ChatSessionListResponse(
             id=session.id,
             title=session.title,
             created_at=session.created_at,
             updated_at=session.updated_at,
             is_active=session.is_active,
-            message_count=message_count,
-            last_message=last_message
+            message_count=session.message_count,
+            last_message=session.last_message_preview,
+            last_message_at=session.last_message_at
         ))
     
     return session_list
@@ -81,15 +101,28 @@ async def get_chat_sessions(
 @router.get("/sessions/{session_id}", response_model=ChatSessionResponse)
 async def get_chat_session_detail(
     session_id: UUID,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Get a specific chat session with all messages."""
+    """Get a specific chat session with a window of its messages.
+
+    Returns the latest ``limit`` messages in chronological order; pass
+    ``next_cursor`` back as ``cursor`` to load the window before them.
+    """
     
-    session = get_chat_session(db, session_id, current_user.id)
+    session = await get_chat_session(db, session_id, current_user.id)
     if not session:
         raise HTTPException(status_code=404, detail="Chat session not found")
     
+    try:
+        window, next_cursor = await get_session_messages(
+            db, session_id, limit or settings.CHAT_MESSAGE_WINDOW, cursor
+        )
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
     messages = [
         ChatMessageResponse(
             id=msg.id,
@@ -97,7 +130,7 @@ async def get_chat_session_detail(
             is_user=msg.is_user,
             created_at=msg.created_at
         )
-        for msg in session.messages
+        for msg in window
     ]
     
     return ChatSessionResponse(
@@ -106,7 +139,9 @@ async def get_chat_session_detail(
         created_at=session.created_at,
         updated_at=session.updated_at,
         is_active=session.is_active,
-        messages=messages
+        messages=messages,
+        message_count=session.message_count,
+        next_cursor=next_cursor
     )
 
 @router.post("/sessions/{session_id}/messages", response_model=ChatMessageResponse)
@@ -114,73 +149,23 @@ async def send_message(
     session_id: UUID,
     message_data: ChatMessageCreate,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Send a message and get AI response."""
     
     try:
         # Verify session exists
-        session = get_chat_session(db, session_id, current_user.id)
+        session = await get_chat_session(db, session_id, current_user.id)
         if not session:
             raise HTTPException(status_code=404, detail="Chat session not found")
         
-        # Add user message
-        user_message = add_message_to_session(
-            db=db,
-            session_id=session_id,
-            message=message_data.message,
-            is_user=True,
-            user_id=current_user.id
-        )
-        
-        # Get conversation context
-        recent_messages = get_recent_context(db, session_id, current_user.id, limit=8)
-        
-        # Get user's skin memory for enhanced context
-        user_allergens = db.query(UserAllergen).filter(
-            UserAllergen.user_id == current_user.id,
-            UserAllergen.is_active == True
-        ).all()
-        
-        user_issues = db.query(SkinIssue).filter(
-            SkinIssue.user_id == current_user.id
-        ).all()
-        
-        # Build enhanced context
-        allergen_context = ""
-        if user_allergens:
-            allergen_list = [f"{a.ingredient_name} ({a.severity})" for a in user_allergens]
-            allergen_context = f"Known Allergens: {', '.join(allergen_list)}"
-        
-        issue_context = ""
-        if user_issues:
-            issue_list = [f"{i.issue_type} (severity: {i.severity}/10)" for i in user_issues]
-            issue_context = f"Current Issues: {', '.join(issue_list)}"
-        
-        enhanced_skin_concerns = f"{current_user.skin_concerns or ''}\n{allergen_context}\n{issue_context}".strip()
-        
-        # Generate AI response using Gemini with enhanced context
-        gemini_service = GeminiChatService()
-        ai_response = gemini_service.generate_chat_response(
-            user_message=message_data.message,
-            skin_type=current_user.skin_type,
-            skin_concerns=enhanced_skin_concerns,
-            conversation_history=recent_messages
-        )
-        
-        # Add AI response
-        ai_message = add_message_to_session(
-            db=db,
-            session_id=session_id,
-            message=ai_response,
-            is_user=False,
-            user_id=current_user.id
-        )
-        
-        # Extract insights and update skin memory
-        gemini_service = GeminiChatService()
-        await gemini_service._extract_and_update_memory(
-            db, current_user.id, message_data.message, ai_response
+        # Concurrent duplicates (retries, double taps) share one chat turn
+        ai_message = await chat_flights.do(
+            (current_user.id, str(session_id), message_data.message),
+            run_chat_turn,
+            session_id,
+            current_user,
+            message_data.message
         )
         
         return ChatMessageResponse(
@@ -192,20 +177,197 @@ async def send_message(
         
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
+    except (LLMRateLimited, LLMTimeoutError, LLMUnavailableError):
+        raise
     except Exception as e:
         print(f"Chat error: {e}")
         raise HTTPException(status_code=500, detail="Failed to process message")
 
+@router.post("/sessions/{session_id}/messages/stream")
+async def send_message_stream(
+    session_id: UUID,
+    message_data: ChatMessageCreate,
+    current_user: User = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Send a message and stream the AI response as server-sent events.
+
+    Emits ``chunk`` events with partial text while Gemini generates, then a
+    single ``done`` event carrying the persisted assistant message.
+    """
+    
+    # Verify session exists
+    session = await get_chat_session(db, session_id, current_user.id)
+    if not session:
+        raise HTTPException(status_code=404, detail="Chat session not found")
+    
+    # Turn the request away with a 429 while headers can still be sent
+    await llm_admission.check("chat")
+    
+    recent_messages = await get_conversation_context(db, session)
+    skin_context = await skin_context_cache.get(db, current_user.id)
+    enhanced_skin_concerns = skin_context["enhanced_skin_concerns"]
+    
+    user_id = current_user.id
+    skin_type = current_user.skin_type
+    
+    async def event_stream():
+        chunks = []
+        try:
+            async for chunk in gemini_chat_service.stream_chat_response(
+                user_message=message_data.message,
+                skin_type=skin_type,
+                skin_concerns=enhanced_skin_concerns,
+                conversation_history=recent_messages,
+                conversation_summary=session.summary
+            ):
+                chunks.append(chunk)
+                yield sse_event("chunk", {"text": chunk})
+        except LLMRateLimited as e:
+            # Nothing is stored yet, so the client can simply retry
+            yield sse_event("error", {"detail": "Too many AI requests", "retry_after": e.retry_after})
+            return
+        except (LLMTimeoutError, LLMUnavailableError) as e:
+            retry_after = getattr(e, "retry_after", settings.GEMINI_BREAKER_RESET_SECONDS)
+            yield sse_event("error", {"detail": "AI service temporarily unavailable", "retry_after": retry_after})
+            return
+        
+        ai_response = "".join(chunks)
+        try:
+            # Persist the turn once the stream has finished; the check above
+            # only inspects admission state, the call itself can still be refused
+            user_message = await add_message_to_session(
+                db=db,
+                session_id=session_id,
+                message=message_data.message,
+                is_user=True,
+                user_id=user_id
+            )
+            ai_message = await add_message_to_session(
+                db=db,
+                session_id=session_id,
+                message=ai_response,
+                is_user=False,
+                user_id=user_id
+            )
+        except Exception as e:
+            print(f"Chat stream persistence error: {e}")
+            await db.rollback()
+            yield sse_event("error", {"detail": "Failed to save message"})
+            return
+        
+        background_jobs.submit(
+            "chat_memory_extraction",
+            gemini_chat_service._extract_and_update_memory,
+            user_id,
+            message_data.message,
+            ai_response
+        )
+        if chat_summarizer.needs_update([ai_message, user_message, *recent_messages]):
+            background_jobs.submit("chat_summary", chat_summarizer.update, session_id)
+        
+        message = ChatMessageResponse(
+            id=ai_message.id,
+            message=ai_message.message,
+            is_user=ai_message.is_user,
+            created_at=ai_message.created_at
+        )
+        yield sse_event("done", message.model_dump(mode="json"))
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @router.delete("/sessions/{session_id}")
 async def delete_chat_session_endpoint(
     session_id: UUID,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Delete a chat session."""
     
-    success = delete_chat_session(db, session_id, current_user.id)
+    success = await delete_chat_session(db, session_id, current_user.id)
     if not success:
         raise HTTPException(status_code=404, detail="Chat session not found")
     
-    return {"message": "Chat session deleted successfully"}
\ No newline at end of file
+    return {"message": "Chat session deleted successfully"}
+
+async def run_chat_turn(session_id: UUID, user: User, message: str):
+    """Run ``process_chat_turn`` in a session of its own.
+    
+    Coalesced duplicates share the turn, so it must not use the leader's
+    request session, which is closed if that client disconnects.
+    """
+    async with AsyncSessionLocal() as db:
+        return await process_chat_turn(db, session_id, user, message)
+
+async def process_chat_turn(db: AsyncSession, session_id: UUID, user: User, message: str):
+    """Generate the AI reply, then store the user message and the reply."""
+    # Refuse before doing any work; the call itself can still be refused below
+    await llm_admission.check("chat")
+    
+    # Get the rolling summary and the messages it doesn't cover yet
+    session = await get_chat_session(db, session_id, user.id)
+    if not session:
+        raise ValueError("Chat session not found")
+    recent_messages = await get_conversation_context(db, session)
+    
+    # Get user's skin memory for enhanced context
+    skin_context = await skin_context_cache.get(db, user.id)
+    enhanced_skin_concerns = skin_context["enhanced_skin_concerns"]
+    
+    # Generate AI response using Gemini with enhanced context
+    ai_response, extraction = await gemini_chat_service.generate_chat_turn(
+        user_message=message,
+        skin_type=user.skin_type,
+        skin_concerns=enhanced_skin_concerns,
+        conversation_history=recent_messages,
+        conversation_summary=session.summary
+    )
+    
+    # Store the user message only once the call was admitted and answered,
+    # so a refused turn (429) leaves nothing behind for the retry to duplicate
+    user_message = await add_message_to_session(
+        db=db,
+        session_id=session_id,
+        message=message,
+        is_user=True,
+        user_id=user.id
+    )
+    
+    # Add AI response
+    ai_message = await add_message_to_session(
+        db=db,
+        session_id=session_id,
+        message=ai_response,
+        is_user=False,
+        user_id=user.id
+    )
+    
+    # Update skin memory after the response is sent; single-call turns
+    # already carry the extraction, two-call turns make a second LLM call
+    if extraction is not None:
+        background_jobs.submit(
+            "chat_memory_apply",
+            gemini_chat_service._apply_extraction,
+            user.id,
+            message,
+            extraction
+        )
+    else:
+        background_jobs.submit(
+            "chat_memory_extraction",
+            gemini_chat_service._extract_and_update_memory,
+            user.id,
+            message,
+            ai_response,
+            gemini_chat_service.turn_mode
+        )
+    
+    # Fold older messages into the session summary once they overflow the prompt budget
+    if chat_summarizer.needs_update([ai_message, user_message, *recent_messages]):
+        background_jobs.submit("chat_summary", chat_summarizer.update, session_id)
+    
+    return ai_message
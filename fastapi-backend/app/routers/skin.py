@@ -1,11 +1,21 @@
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
-from sqlalchemy.orm import Session
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional, List, Dict, Any
 import io
 from app.services.gemini import gemini_analyzer
+from app.services.llm_admission import LLMRateLimited, llm_admission
 from app.crud.skin_memory import skin_memory_crud
-from app.core.database import get_db
+from app.core.auth_cache import auth_cache
+from app.core.pagination import InvalidCursor
+from app.services.skin_context import skin_context_cache
+from app.services.allergen_matcher import AllergenMatcher, expand_synonyms, irritant_matcher, normalize_inci
+from app.services.ingredient_index import ingredient_index
+from app.core.database import get_async_db
 from app.api.deps import get_current_active_user
+from app.api.streaming import sse_event
+from app.core.config import settings
 from app.models.user import User
 from app.models.skin_memory import UserAllergen, SkinIssue
 from app.schemas.skin import (
@@ -21,7 +31,7 @@ router = APIRouter(prefix="/skin", tags=["Skin Analysis"])
 async def submit_skin_assessment(
     assessment: SkinAssessmentRequest,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Submit comprehensive skin type assessment questionnaire."""
     
@@ -52,8 +62,10 @@ async def submit_skin_assessment(
         current_user.skin_assessment_answers = assessment_data
         current_user.skin_concerns = assessment.additional_concerns
         
-        db.commit()
-        db.refresh(current_user)
+        await db.commit()
+        await db.refresh(current_user)
+        skin_context_cache.invalidate(current_user.id)
+        auth_cache.invalidate_user(current_user.email)
         
         # Generate enhanced recommendations
         recommendations = generate_enhanced_skin_recommendations(
@@ -71,25 +83,27 @@ async def submit_skin_assessment(
         )
         
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Assessment failed: {str(e)}")
 
 @router.get("/profile", response_model=SkinProfileResponse)
 async def get_skin_profile(
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get user's skin profile with dynamic recommendations."""
     
     # Get user's allergens and skin issues
-    allergens = db.query(UserAllergen).filter(
+    result = await db.execute(select(UserAllergen).where(
         UserAllergen.user_id == current_user.id,
         UserAllergen.is_active == True
-    ).all()
+    ))
+    allergens = result.scalars().all()
     
-    skin_issues = db.query(SkinIssue).filter(
+    result = await db.execute(select(SkinIssue).where(
         SkinIssue.user_id == current_user.id
-    ).all()
+    ))
+    skin_issues = result.scalars().all()
     
     # Generate dynamic recommendations based on profile
     recommendations = generate_dynamic_recommendations(
@@ -242,7 +256,7 @@ async def analyze_product(
     product_name: Optional[str] = Form(None),
     ingredients: Optional[str] = Form(None),
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Analyze a skincare product for compatibility with user's skin."""
     
@@ -254,37 +268,22 @@ async def analyze_product(
                 detail="Please provide either a product image, product name, or ingredients list"
             )
         
-        # Get user's skin memory data using CRUD methods
-        user_allergens = skin_memory_crud.get_user_allergens(db, current_user.id)
-        user_issues = skin_memory_crud.get_user_skin_issues(db, current_user.id)
-        
-        # Convert to dict format for the analyzer
-        allergen_data = [{
-            "ingredient_name": a.ingredient_name,
-            "severity": a.severity,
-            "confirmed": a.confirmed,
-            "notes": a.notes
-        } for a in user_allergens]
-        
-        issue_data = [{
-            "issue_type": i.issue_type,
-            "description": i.description,
-            "severity": i.severity,
-            "status": i.status,
-            "triggers": i.triggers or []
-        } for i in user_issues]
+        # Get user's skin memory data in dict format for the analyzer
+        skin_context = await skin_context_cache.get(db, current_user.id)
+        allergen_data = skin_context["allergens"]
+        issue_data = skin_context["issues"]
         
         if product_image:
             # Image-based analysis
+            await llm_admission.check("product_analysis")
             image_data = await product_image.read()
             
             # Use the correct method name with skin memory integration
-            analysis_result = gemini_analyzer.analyze_product_with_memory(
+            analysis_result = await gemini_analyzer.analyze_product_with_memory(
                 image_data=image_data,
                 skin_type=current_user.skin_type or "unknown",
                 user_allergens=allergen_data,
                 user_issues=issue_data,
-                db=db,
                 user_id=current_user.id
             )
         else:
@@ -294,39 +293,140 @@ async def analyze_product(
                 ingredients=ingredients,
                 skin_type=current_user.skin_type or "unknown",
                 user_allergens=allergen_data,
-                user_issues=issue_data
+                user_issues=issue_data,
+                allergen_matcher=skin_context["allergen_matcher"]
             )
         
-        return ProductAnalysisResponse(
-            product_name=analysis_result.get("product_name", product_name or "Unknown"),
-            suitability_score=analysis_result.get("suitability_score", 5),
-            analysis=analysis_result.get("personalized_recommendation", "Analysis completed"),
-            allergen_warnings=analysis_result.get("allergen_warnings", []),
-            beneficial_ingredients=analysis_result.get("beneficial_ingredients", []),
-            usage_recommendations=analysis_result.get("usage_instructions", "Follow product instructions")
-        )
+        return product_analysis_response(analysis_result, product_name)
         
+    except LLMRateLimited:
+        raise
     except Exception as e:
         print(f"Product analysis error: {e}")
         raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
 
+@router.post("/analyze-products/batch")
+async def analyze_products_batch(
+    product_images: List[UploadFile] = File(None),
+    ingredients: List[str] = Form(None),
+    current_user: User = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Analyze several products at once, streaming results as server-sent events.
+
+    Items are numbered images first, then ingredient lists. Each finished
+    item emits a ``result`` event with its ``index``; a final ``done`` event
+    follows once the analyses have been saved to skin memory together.
+    """
+    
+    images = product_images or []
+    ingredient_lists = [text for text in (ingredients or []) if text.strip()]
+    item_count = len(images) + len(ingredient_lists)
+    if not item_count:
+        raise HTTPException(status_code=400, detail="Please provide product images or ingredient lists")
+    if item_count > settings.BATCH_ANALYSIS_MAX_ITEMS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {settings.BATCH_ANALYSIS_MAX_ITEMS} products can be analyzed per batch"
+        )
+    
+    if images:
+        await llm_admission.check("product_analysis")
+    
+    # Load the skin profile once for every item
+    skin_context = await skin_context_cache.get(db, current_user.id)
+    image_data = [await image.read() for image in images]
+    user_id = current_user.id
+    skin_type = current_user.skin_type or "unknown"
+    
+    async def event_stream():
+        # Ingredient lists are analyzed locally, so they go out first
+        for offset, text in enumerate(ingredient_lists):
+            analysis_result = analyze_product_text(
+                product_name=None,
+                ingredients=text,
+                skin_type=skin_type,
+                user_allergens=skin_context["allergens"],
+                user_issues=skin_context["issues"],
+                allergen_matcher=skin_context["allergen_matcher"]
+            )
+            yield sse_event("result", {
+                "index": len(image_data) + offset,
+                "analysis": product_analysis_response(analysis_result).model_dump()
+            })
+        
+        memory_entries = []
+        async for index, analysis_result in gemini_analyzer.analyze_products_batch(
+            images=image_data,
+            skin_type=skin_type,
+            user_allergens=skin_context["allergens"],
+            user_issues=skin_context["issues"],
+            user_id=user_id,
+            concurrency=settings.BATCH_ANALYSIS_CONCURRENCY
+        ):
+            if "error" in analysis_result and not analysis_result.get("product_name"):
+                error = {"index": index, "error": analysis_result["error"]}
+                if "retry_after" in analysis_result:
+                    error["retry_after"] = analysis_result["retry_after"]
+                yield sse_event("result", error)
+                continue
+            memory_entries.extend(gemini_analyzer._memory_entries(analysis_result))
+            yield sse_event("result", {
+                "index": index,
+                "analysis": product_analysis_response(analysis_result).model_dump()
+            })
+        
+        try:
+            # Every analysis lands in skin memory in one transaction
+            stored = await skin_memory_crud.add_memory_entries(db, user_id, memory_entries)
+        except Exception as e:
+            print(f"Batch analysis memory error: {e}")
+            yield sse_event("error", {"detail": "Failed to save analyses"})
+            return
+        
+        yield sse_event("done", {"count": item_count, "stored_entries": stored})
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def product_analysis_response(analysis_result: dict, product_name: Optional[str] = None) -> ProductAnalysisResponse:
+    """Map an analyzer result onto the public response schema."""
+    return ProductAnalysisResponse(
+        product_name=analysis_result.get("product_name", product_name or "Unknown"),
+        suitability_score=analysis_result.get("suitability_score", 5),
+        analysis=analysis_result.get("personalized_recommendation", "Analysis completed"),
+        allergen_warnings=analysis_result.get("allergen_warnings", []),
+        beneficial_ingredients=analysis_result.get("beneficial_ingredients", []),
+        usage_recommendations=analysis_result.get("usage_instructions", "Follow product instructions")
+    )
+
 @router.get("/analyses")
 async def get_my_analyses(
     skip: int = 0,
     limit: int = 10,
+    cursor: Optional[str] = None,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Get user's product analysis history."""
+    """Get user's product analysis history.
+
+    Pass ``next_cursor`` back as ``cursor`` to fetch the next page.
+    """
     
     try:
-        # Use the CRUD instance method
-        analyses = skin_memory_crud.get_user_memory_entries(
+        analyses, next_cursor = await skin_memory_crud.get_user_memory_entries(
             db=db,
             user_id=current_user.id,
             entry_type="analysis_finding",
             limit=limit,
-            skip=skip
+            skip=skip,
+            cursor=cursor
+        )
+        total = await skin_memory_crud.count_user_memory_entries(
+            db, current_user.id, entry_type="analysis_finding"
         )
         
         return {
@@ -339,39 +439,12 @@ async def get_my_analyses(
                 "source": analysis.source,
                 "entry_type": analysis.entry_type
             } for analysis in analyses],
-            "total": len(analyses)
+            "total": total,
+            "next_cursor": next_cursor
         }
         
-    except AttributeError as e:
-        print(f"AttributeError in analyses: {e}")
-        # Fallback: try direct database query
-        try:
-            from app.models.skin_memory import SkinMemoryEntry
-            analyses = db.query(SkinMemoryEntry).filter(
-                SkinMemoryEntry.user_id == current_user.id,
-                SkinMemoryEntry.entry_type == "analysis_finding",
-                SkinMemoryEntry.is_active == True
-            ).order_by(SkinMemoryEntry.created_at.desc()).limit(limit).offset(skip).all()
-            
-            return {
-                "analyses": [{
-                    "id": analysis.id,
-                    "content": analysis.content,
-                    "metadata": analysis.entry_metadata,
-                    "created_at": analysis.created_at.isoformat(),
-                    "importance": analysis.importance,
-                    "source": analysis.source,
-                    "entry_type": analysis.entry_type
-                } for analysis in analyses],
-                "total": len(analyses)
-            }
-        except Exception as fallback_error:
-            print(f"Fallback query also failed: {fallback_error}")
-            return {
-                "analyses": [],
-                "total": 0
-            }
-        
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         print(f"Get analyses error: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to get analyses: {str(e)}")
@@ -380,30 +453,22 @@ async def get_my_analyses(
 async def delete_analysis(
     analysis_id: int,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Permanently delete a specific product analysis."""
     
     try:
-        # Check if analysis exists and belongs to current user
-        from app.models.skin_memory import SkinMemoryEntry
-        analysis = db.query(SkinMemoryEntry).filter(
-            SkinMemoryEntry.id == analysis_id,
-            SkinMemoryEntry.user_id == current_user.id,
-            SkinMemoryEntry.entry_type == "analysis_finding",
-            SkinMemoryEntry.is_active == True
-        ).first()
+        # Only the current user's analysis findings can be deleted here
+        deleted = await skin_memory_crud.delete_memory_entry(
+            db, analysis_id, current_user.id, entry_type="analysis_finding"
+        )
         
-        if not analysis:
+        if not deleted:
             raise HTTPException(
                 status_code=404, 
                 detail="Analysis not found or you don't have permission to delete it"
             )
         
-        # Hard delete
-        db.delete(analysis)
-        db.commit()
-        
         return {
             "message": "Analysis permanently deleted",
             "deleted_analysis_id": analysis_id
@@ -413,39 +478,27 @@ async def delete_analysis(
         raise
     except Exception as e:
         print(f"Delete analysis error: {e}")
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Failed to delete analysis: {str(e)}")
 
 @router.delete("/analyses")
 async def delete_all_analyses(
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Permanently delete all product analyses for the current user."""
     
     try:
-        from app.models.skin_memory import SkinMemoryEntry
-        
-        # Get all analyses to be deleted
-        analyses_to_delete = db.query(SkinMemoryEntry).filter(
-            SkinMemoryEntry.user_id == current_user.id,
-            SkinMemoryEntry.entry_type == "analysis_finding",
-            SkinMemoryEntry.is_active == True
-        ).all()
+        count = await skin_memory_crud.delete_all_user_memories(
+            db, current_user.id, entry_type="analysis_finding"
+        )
         
-        if not analyses_to_delete:
+        if not count:
             return {
                 "message": "No analyses found to delete",
                 "deleted_count": 0
             }
         
-        # Hard delete all analyses
-        for analysis in analyses_to_delete:
-            db.delete(analysis)
-        
-        count = len(analyses_to_delete)
-        db.commit()
-        
         return {
             "message": f"Permanently deleted {count} analyses",
             "deleted_count": count
@@ -453,7 +506,6 @@ async def delete_all_analyses(
         
     except Exception as e:
         print(f"Delete all analyses error: {e}")
-        db.rollback()
         raise HTTPException(status_code=500, detail=f"Failed to delete analyses: {str(e)}")
 
 def determine_skin_type(answers: List[str]) -> str:
@@ -524,7 +576,8 @@ def analyze_product_text(
     ingredients: str,
     skin_type: str,
     user_allergens: List[dict],
-    user_issues: List[dict]
+    user_issues: List[dict],
+    allergen_matcher: Optional[AllergenMatcher] = None
 ) -> dict:
     """Fallback text-based analysis when no image is provided."""
     
@@ -532,22 +585,59 @@ def analyze_product_text(
     allergen_warnings = []
     suitability_score = 7  # Default score
     
+    matched_allergens = []
     if ingredients and user_allergens:
-        ingredients_lower = ingredients.lower()
-        for allergen in user_allergens:
-            if allergen["ingredient_name"].lower() in ingredients_lower:
-                allergen_warnings.append(f"Contains {allergen['ingredient_name']} ({allergen['severity']} severity)")
-                if allergen["severity"] == "severe":
-                    suitability_score -= 3
-                elif allergen["severity"] == "moderate":
-                    suitability_score -= 2
-                else:
-                    suitability_score -= 1
+        # One pass over the ingredient list for all allergens and their synonyms
+        matcher = allergen_matcher or AllergenMatcher(user_allergens)
+        matched_allergens = matcher.match(ingredients)
+        for allergen in matched_allergens:
+            allergen_warnings.append(f"Contains {allergen['ingredient_name']} ({allergen['severity']} severity)")
+            if allergen["severity"] == "severe":
+                suitability_score -= 3
+            elif allergen["severity"] == "moderate":
+                suitability_score -= 2
+            else:
+                suitability_score -= 1
+    
+    # Known ingredients from the bundled INCI dictionary (no LLM call)
+    known_ingredients = ingredient_index.analyze(ingredients) if ingredients else []
+    beneficial_ingredients = [
+        f"{item['name']} ({item['benefits'][0]})" for item in known_ingredients if item["benefits"]
+    ]
+    
+    # Allergen groups catch relatives of recorded allergens (e.g. parabens)
+    for allergen in user_allergens or []:
+        if allergen in matched_allergens:
+            continue
+        terms = set(expand_synonyms(allergen["ingredient_name"]))
+        for item in known_ingredients:
+            groups = [group for group in item["allergen_groups"] if normalize_inci(group) in terms]
+            if groups:
+                allergen_warnings.append(
+                    f"Contains {item['name']}, part of the {groups[0]} group you react to "
+                    f"({allergen['severity']} severity)"
+                )
+                suitability_score -= 1
+                break
+    
+    # Pore-clogging ingredients matter for oily and acne-prone skin
+    acne_prone = skin_type in ("oily", "combination") or any(
+        "acne" in (issue.get("issue_type") or "").lower() for issue in user_issues or []
+    )
+    if acne_prone:
+        comedogenic = [item for item in known_ingredients if (item["comedogenic"] or 0) >= 4]
+        for item in comedogenic:
+            allergen_warnings.append(f"{item['name']} is highly comedogenic ({item['comedogenic']}/5)")
+        suitability_score -= min(2, len(comedogenic))
     
     # Adjust score based on skin type
-    if skin_type == "sensitive" and any(word in (ingredients or "").lower() for word in ["fragrance", "alcohol", "sulfate"]):
+    irritants = [item["name"] for item in known_ingredients if item["irritant"]]
+    if skin_type == "sensitive" and (irritants or (ingredients and irritant_matcher.match(ingredients))):
         suitability_score -= 2
-        allergen_warnings.append("May contain ingredients that could irritate sensitive skin")
+        if irritants:
+            allergen_warnings.append(f"May irritate sensitive skin: {', '.join(irritants)}")
+        else:
+            allergen_warnings.append("May contain ingredients that could irritate sensitive skin")
     
     suitability_score = max(1, min(10, suitability_score))
     
@@ -556,7 +646,7 @@ def analyze_product_text(
         "suitability_score": suitability_score,
         "personalized_recommendation": f"Based on your {skin_type} skin type and known sensitivities, this product has a compatibility score of {suitability_score}/10.",
         "allergen_warnings": allergen_warnings,
-        "beneficial_ingredients": [],
+        "beneficial_ingredients": beneficial_ingredients,
         "usage_instructions": "Follow the product's recommended usage instructions."
     }
 
@@ -1,8 +1,9 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Response, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
 
-from app.core.database import get_db
+from app.core.database import get_async_db
+from app.core.pagination import InvalidCursor
 from app.api.deps import get_current_user
 from app.models.user import User
 from app.crud.skin_memory import skin_memory_crud
@@ -20,11 +21,11 @@ router = APIRouter(prefix="/skin-memory", tags=["skin-memory"])
 @router.get("/allergens", response_model=List[UserAllergen])
 async def get_user_allergens(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get all allergens for the current user"""
     try:
-        allergens = skin_memory_crud.get_user_allergens(db, current_user.id)
+        allergens = await skin_memory_crud.get_user_allergens(db, current_user.id)
         return allergens
     except Exception as e:
         raise HTTPException(
@@ -36,7 +37,7 @@ async def get_user_allergens(
 async def add_allergen(
     allergen_data: UserAllergenCreate,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Add a new allergen for the current user"""
     try:
@@ -60,11 +61,11 @@ async def update_allergen(
     allergen_id: int,
     update_data: UserAllergenUpdate,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Update an existing allergen"""
     try:
-        allergen = skin_memory_crud.update_allergen(
+        allergen = await skin_memory_crud.update_allergen(
             db, allergen_id, current_user.id, update_data
         )
         if not allergen:
@@ -85,11 +86,11 @@ async def update_allergen(
 async def delete_allergen(
     allergen_id: int,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Permanently delete a specific allergen"""
     try:
-        success = skin_memory_crud.delete_allergen(db, allergen_id, current_user.id)
+        success = await skin_memory_crud.delete_allergen(db, allergen_id, current_user.id)
         if not success:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -112,11 +113,11 @@ async def delete_allergen(
 @router.get("/issues", response_model=List[SkinIssue])
 async def get_skin_issues(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get all skin issues for the current user"""
     try:
-        issues = skin_memory_crud.get_user_skin_issues(db, current_user.id)
+        issues = await skin_memory_crud.get_user_skin_issues(db, current_user.id)
         return issues
     except Exception as e:
         raise HTTPException(
@@ -128,7 +129,7 @@ async def get_skin_issues(
 async def add_skin_issue(
     issue_data: SkinIssueCreate,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Add a new skin issue for the current user"""
     try:
@@ -153,11 +154,11 @@ async def update_skin_issue(
     issue_id: int,
     update_data: SkinIssueUpdate,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Update an existing skin issue"""
     try:
-        issue = skin_memory_crud.update_skin_issue(
+        issue = await skin_memory_crud.update_skin_issue(
             db, issue_id, current_user.id, update_data
         )
         if not issue:
@@ -178,11 +179,11 @@ async def update_skin_issue(
 async def delete_skin_issue(
     issue_id: int,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Permanently delete a specific skin issue"""
     try:
-        success = skin_memory_crud.delete_skin_issue(db, issue_id, current_user.id)
+        success = await skin_memory_crud.delete_skin_issue(db, issue_id, current_user.id)
         if not success:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -205,11 +206,11 @@ async def delete_skin_issue(
 @router.get("/summary", response_model=SkinSummaryResponse)
 async def get_skin_memory_summary(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get comprehensive skin memory summary"""
     try:
-        summary = skin_memory_crud.get_user_skin_summary(db, current_user.id)
+        summary = await skin_memory_crud.get_user_skin_summary(db, current_user.id)
         return summary
     except Exception as e:
         raise HTTPException(
@@ -223,7 +224,7 @@ async def get_skin_memory_summary(
 async def report_allergic_reaction(
     reaction_data: AllergenReactionReport,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Report a new allergic reaction"""
     try:
@@ -238,7 +239,7 @@ async def report_allergic_reaction(
         )
         
         # Add memory entry
-        skin_memory_crud.add_memory_entry(
+        await skin_memory_crud.add_memory_entry(
             db=db,
             user_id=current_user.id,
             entry_type="reaction_report",
@@ -262,7 +263,7 @@ async def report_allergic_reaction(
 async def report_skin_issue(
     issue_data: SkinIssueReport,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Report a new skin issue"""
     try:
@@ -276,7 +277,7 @@ async def report_skin_issue(
         )
         
         # Add memory entry
-        skin_memory_crud.add_memory_entry(
+        await skin_memory_crud.add_memory_entry(
             db=db,
             user_id=current_user.id,
             entry_type="issue_report",
@@ -300,19 +301,31 @@ async def report_skin_issue(
 
 @router.get("/memories")
 async def get_user_memories(
+    response: Response,
     entry_type: str = None,
     limit: int = 50,
+    cursor: Optional[str] = None,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Get user's memory entries"""
+    """Get user's memory entries
+
+    Pass the X-Next-Cursor response header back as cursor to fetch the next page;
+    X-Total-Count carries the total number of entries.
+    """
     try:
-        memories = skin_memory_crud.get_user_memory_entries(
+        memories, next_cursor = await skin_memory_crud.get_user_memory_entries(
             db=db,
             user_id=current_user.id,
             entry_type=entry_type,
-            limit=limit
+            limit=limit,
+            cursor=cursor
         )
+        total = await skin_memory_crud.count_user_memory_entries(db, current_user.id, entry_type)
+        
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
+        response.headers["X-Total-Count"] = str(total)
         return [
             {
                 "id": memory.id,
@@ -326,6 +339,8 @@ async def get_user_memories(
             }
             for memory in memories
         ]
+    except InvalidCursor as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -338,11 +353,11 @@ async def get_user_memories(
 async def delete_memory_entry(
     memory_id: int,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Permanently delete a specific memory entry"""
     try:
-        success = skin_memory_crud.delete_memory_entry(db, memory_id, current_user.id)
+        success = await skin_memory_crud.delete_memory_entry(db, memory_id, current_user.id)
         if not success:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -364,11 +379,11 @@ async def delete_memory_entry(
 async def delete_all_memories(
     entry_type: str = None,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Permanently delete all memory entries for the current user"""
     try:
-        deleted_count = skin_memory_crud.delete_all_user_memories(
+        deleted_count = await skin_memory_crud.delete_all_user_memories(
             db, current_user.id, entry_type
         )
         
@@ -388,7 +403,7 @@ async def update_issue_status(
     issue_id: int,
     status_data: dict,  # {"status": "active|improving|resolved"}
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Update the status of a skin issue"""
     try:
@@ -399,7 +414,7 @@ async def update_issue_status(
                 detail="Invalid status. Must be 'active', 'improving', or 'resolved'"
             )
         
-        issue = skin_memory_crud.update_skin_issue(
+        issue = await skin_memory_crud.update_skin_issue(
             db, issue_id, current_user.id, {"status": new_status}
         )
         if not issue:
@@ -409,7 +424,7 @@ async def update_issue_status(
             )
         
         # Add memory entry for status change
-        skin_memory_crud.add_memory_entry(
+        await skin_memory_crud.add_memory_entry(
             db=db,
             user_id=current_user.id,
             entry_type="user_report",
@@ -25,6 +25,8 @@ class ChatSessionResponse(BaseModel):
     updated_at: datetime
     is_active: bool
     messages: List[ChatMessageResponse] = []
+    message_count: Optional[int] = None
+    next_cursor: Optional[str] = None
 
     class Config:
         from_attributes = True
@@ -37,6 +39,7 @@ class ChatSessionListResponse(BaseModel):
     is_active: bool
     message_count: int
     last_message: Optional[str]
+    last_message_at: Optional[datetime] = None
 
     class Config:
         from_attributes = True
\ No newline at end of file
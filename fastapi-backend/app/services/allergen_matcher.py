@@ -0,0 +1,174 @@
+import re
+import unicodedata
+from collections import deque
+from typing import Any, Dict, Iterator, List, Tuple
+
+# Umbrella allergen terms and the INCI / label names of their members.
+# Recording an umbrella term ("paraben") matches every member, but recording
+# a member ("methylparaben") matches only itself, never its siblings.
+# Keys and members are matched after normalize_inci, so punctuation and
+# case don't matter ("PEG-40" == "peg 40"). Abbreviations of two or three
+# letters ("mi", "bha") are left out: as whole words they still collide
+# with unrelated label text.
+ALLERGEN_SYNONYMS: Dict[str, List[str]] = {
+    "fragrance": ["aroma", "fragrance mix"],
+    "alcohol": ["alcohol denat", "sd alcohol", "denatured alcohol"],
+    "sulfate": [
+        "sodium lauryl sulfate", "sodium laureth sulfate",
+        "ammonium lauryl sulfate", "ammonium laureth sulfate", "sles",
+    ],
+    "paraben": [
+        "methylparaben", "ethylparaben", "propylparaben",
+        "butylparaben", "isobutylparaben",
+    ],
+    "formaldehyde": [
+        "dmdm hydantoin", "imidazolidinyl urea", "diazolidinyl urea",
+        "quaternium 15", "bronopol", "2 bromo 2 nitropropane 1 3 diol",
+    ],
+    "lanolin": ["wool alcohol", "lanolin alcohol"],
+    "vitamin e": ["tocopherol", "tocopheryl acetate"],
+    "vitamin c": ["ascorbic acid", "sodium ascorbyl phosphate", "ascorbyl glucoside"],
+    "retinoids": ["retinol", "retinyl palmitate", "retinal", "retinaldehyde"],
+    "retinal": [],
+    "salicylic acid": ["beta hydroxy acid"],
+    "glycolic acid": ["alpha hydroxy acid"],
+    "niacinamide": [],
+    "methylisothiazolinone": [],
+    "methylchloroisothiazolinone": ["cmit"],
+    "propylene glycol": [],
+    "cocamidopropyl betaine": ["capb"],
+    "benzyl alcohol": [],
+    "limonene": ["d limonene"],
+    "linalool": [],
+    "essential oils": ["tea tree oil", "melaleuca alternifolia leaf oil", "lavender oil"],
+    "coconut oil": [],
+    "shea butter": [],
+    "nut oils": ["almond oil", "prunus amygdalus dulcis oil", "argan oil", "argania spinosa kernel oil"],
+}
+
+# Other names for an umbrella term itself; they expand like the term does.
+ALLERGEN_ALIASES: Dict[str, str] = {
+    "parfum": "fragrance",
+    "perfume": "fragrance",
+    "ethanol": "alcohol",
+    "sulfates": "sulfate",
+    "parabens": "paraben",
+    "formalin": "formaldehyde",
+    "wool wax": "lanolin",
+    "adeps lanae": "lanolin",
+    "retinaldehyde": "retinal",
+    "nicotinamide": "niacinamide",
+    "vitamin b3": "niacinamide",
+    "1 2 propanediol": "propylene glycol",
+    "essential oil": "essential oils",
+    "cocos nucifera oil": "coconut oil",
+    "butyrospermum parkii butter": "shea butter",
+}
+
+# Ingredients that warrant a warning for sensitive skin even when the user
+# hasn't recorded them as allergens.
+SENSITIVE_SKIN_IRRITANTS = ["fragrance", "alcohol", "sulfate"]
+
+_NON_ALNUM = re.compile(r"[^0-9a-z]+")
+
+
+def normalize_inci(text: str) -> str:
+    """Lowercase, strip accents and collapse INCI punctuation to single spaces."""
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return _NON_ALNUM.sub(" ", text.lower()).strip()
+
+
+_SYNONYM_GROUPS: Dict[str, List[str]] = {
+    normalize_inci(term): [normalize_inci(member) for member in members]
+    for term, members in ALLERGEN_SYNONYMS.items()
+}
+_CANONICAL = {term: term for term in _SYNONYM_GROUPS}
+for _alias, _term in ALLERGEN_ALIASES.items():
+    _CANONICAL[normalize_inci(_alias)] = normalize_inci(_term)
+    _SYNONYM_GROUPS[normalize_inci(_term)].append(normalize_inci(_alias))
+
+
+def expand_synonyms(name: str) -> List[str]:
+    """Normalized name plus, for an umbrella term or its alias, every name it covers."""
+    key = normalize_inci(name)
+    terms = [key] if key else []
+    canonical = _CANONICAL.get(key)
+    if canonical is not None:
+        terms.append(canonical)
+        terms.extend(_SYNONYM_GROUPS[canonical])
+    return list(dict.fromkeys(terms))
+
+
+class AhoCorasick:
+    """Multi-pattern automaton matching every pattern in one pass over the text."""
+
+    def __init__(self, patterns: Dict[str, Any]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[Tuple[int, Any]]] = [[]]
+
+        for pattern, payload in patterns.items():
+            state = 0
+            for ch in pattern:
+                nxt = self._goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[state][ch] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                state = nxt
+            self._out[state].append((len(pattern), payload))
+
+        # Breadth-first so every failure link points at an already-built state
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fallback = self._fail[state]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[nxt] = self._goto[fallback].get(ch, 0)
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def find(self, text: str) -> Iterator[Tuple[int, int, Any]]:
+        """Yield ``(start, end, payload)`` for every pattern occurrence."""
+        state = 0
+        for index, ch in enumerate(text):
+            while state and ch not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(ch, 0)
+            for length, payload in self._out[state]:
+                yield index + 1 - length, index + 1, payload
+
+
+class AllergenMatcher:
+    """Compiled matcher for one user's allergens and their synonyms.
+
+    Built once per allergen set (it lives in the cached skin context) and
+    run as a single linear pass over the normalized ingredient list. Only
+    whole-word matches count, so "peg" doesn't fire inside "pegylated".
+    """
+
+    def __init__(self, allergens: List[Dict[str, Any]]):
+        self.allergens = allergens
+        patterns: Dict[str, List[int]] = {}
+        for index, allergen in enumerate(allergens):
+            for term in expand_synonyms(allergen["ingredient_name"]):
+                patterns.setdefault(term, []).append(index)
+        self._automaton = AhoCorasick(patterns)
+
+    def match(self, ingredients: str) -> List[Dict[str, Any]]:
+        """Return the allergens found in ``ingredients``, in order of first appearance."""
+        text = normalize_inci(ingredients or "")
+        found: Dict[int, None] = {}
+        for start, end, indexes in self._automaton.find(text):
+            if (start == 0 or text[start - 1] == " ") and (end == len(text) or text[end] == " "):
+                found.update(dict.fromkeys(indexes))
+        return [self.allergens[index] for index in found]
+
+
+# Shared matcher for the sensitive-skin irritant check
+irritant_matcher = AllergenMatcher([{"ingredient_name": name} for name in SENSITIVE_SKIN_IRRITANTS])
@@ -0,0 +1,168 @@
+import copy
+import hashlib
+import json
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.cache import LRUCache
+from app.core.config import settings
+from app.models.analysis_cache import AnalysisCacheEntry
+
+logger = logging.getLogger(__name__)
+
+
+class AnalysisCache:
+    """Content-addressed cache for product image analyses.
+
+    Entries are keyed by the image bytes plus a fingerprint of the skin profile
+    that was sent with them, so any change to skin type, allergens or issues
+    naturally produces a new key. Lookups go to an in-memory LRU first and then
+    to the ``analysis_cache`` table, which survives restarts and is shared by
+    every worker. Both tiers expire an entry ``ttl_days`` after it was created.
+    """
+
+    def __init__(self, memory_size: int, ttl_days: int, max_entries: int):
+        self.ttl = timedelta(days=ttl_days)
+        self.memory = LRUCache(maxsize=memory_size, ttl=self.ttl.total_seconds())
+        self.max_entries = max_entries
+        self.persistent_hits = 0
+        self.persistent_evictions = 0
+        self._writes = 0
+
+    @staticmethod
+    def profile_fingerprint(
+        skin_type: str, allergens: List[Dict], issues: List[Dict]
+    ) -> str:
+        """Stable digest of the parts of the skin profile that reach the prompt."""
+        profile = {
+            "skin_type": (skin_type or "").lower(),
+            "allergens": sorted(
+                [a["ingredient_name"].lower(), a.get("severity")] for a in allergens
+            ),
+            "issues": sorted(
+                [i["issue_type"].lower(), i.get("severity"), i.get("description") or ""]
+                for i in issues
+            ),
+        }
+        return hashlib.sha256(
+            json.dumps(profile, sort_keys=True).encode("utf-8")
+        ).hexdigest()
+
+    def make_key(
+        self,
+        image_data: bytes,
+        skin_type: str,
+        allergens: List[Dict],
+        issues: List[Dict],
+    ) -> str:
+        """Build the cache key for an image analysed against a skin profile."""
+        image_hash = hashlib.sha256(image_data).hexdigest()
+        fingerprint = self.profile_fingerprint(skin_type, allergens, issues)
+        return hashlib.sha256(f"{image_hash}:{fingerprint}".encode("utf-8")).hexdigest()
+
+    async def get(self, db: AsyncSession, key: str) -> Optional[Dict[str, Any]]:
+        """Look up a cached analysis, promoting persistent hits into memory."""
+        result = self.memory.get(key)
+        if result is not None:
+            return copy.deepcopy(result)
+
+        try:
+            entry = await db.get(AnalysisCacheEntry, key)
+            if entry is None:
+                return None
+
+            if entry.created_at and entry.created_at < datetime.utcnow() - self.ttl:
+                await db.delete(entry)
+                await db.commit()
+                self.persistent_evictions += 1
+                return None
+
+            entry.hit_count = (entry.hit_count or 0) + 1
+            entry.last_accessed_at = datetime.utcnow()
+            await db.commit()
+        except Exception as e:
+            await db.rollback()
+            logger.error(f"Analysis cache lookup failed: {e}")
+            return None
+
+        self.persistent_hits += 1
+        # Promoted entries keep their original expiry, not a fresh TTL
+        remaining = self.ttl.total_seconds()
+        if entry.created_at:
+            remaining -= (datetime.utcnow() - entry.created_at).total_seconds()
+        self.memory.set(key, entry.result, ttl=remaining)
+        return copy.deepcopy(entry.result)
+
+    async def set(self, db: AsyncSession, key: str, result: Dict[str, Any]):
+        """Store an analysis in both tiers."""
+        self.memory.set(key, copy.deepcopy(result))
+
+        try:
+            await db.merge(AnalysisCacheEntry(
+                cache_key=key,
+                result=result,
+                created_at=datetime.utcnow(),
+                last_accessed_at=datetime.utcnow(),
+                hit_count=0
+            ))
+            await db.commit()
+        except Exception as e:
+            await db.rollback()
+            logger.error(f"Analysis cache write failed: {e}")
+            return
+
+        self._writes += 1
+        if self._writes % 50 == 0:
+            await self.evict_persistent(db)
+
+    async def evict_persistent(self, db: AsyncSession) -> int:
+        """Drop expired rows and trim the table to the least recently used limit."""
+        try:
+            result = await db.execute(delete(AnalysisCacheEntry).where(
+                AnalysisCacheEntry.created_at < datetime.utcnow() - self.ttl
+            ).execution_options(synchronize_session=False))
+            expired = result.rowcount
+
+            overflow = 0
+            total = await db.scalar(select(func.count()).select_from(AnalysisCacheEntry))
+            if total > self.max_entries:
+                stale_keys = select(AnalysisCacheEntry.cache_key).order_by(
+                    AnalysisCacheEntry.last_accessed_at.asc()
+                ).limit(total - self.max_entries)
+                result = await db.execute(delete(AnalysisCacheEntry).where(
+                    AnalysisCacheEntry.cache_key.in_(stale_keys)
+                ).execution_options(synchronize_session=False))
+                overflow = result.rowcount
+
+            await db.commit()
+            self.persistent_evictions += expired + overflow
+            return expired + overflow
+        except Exception as e:
+            await db.rollback()
+            logger.error(f"Analysis cache eviction failed: {e}")
+            return 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Get hit/miss counters for both tiers."""
+        memory = self.memory.stats()
+        misses = memory["misses"] - self.persistent_hits
+        lookups = memory["hits"] + memory["misses"]
+        return {
+            "memory": memory,
+            "persistent_hits": self.persistent_hits,
+            "persistent_evictions": self.persistent_evictions,
+            "misses": misses,
+            "hit_ratio": round((lookups - misses) / lookups, 4) if lookups else 0.0,
+        }
+
+
+# Create global analysis cache instance
+analysis_cache = AnalysisCache(
+    memory_size=settings.ANALYSIS_CACHE_MEMORY_SIZE,
+    ttl_days=settings.ANALYSIS_CACHE_TTL_DAYS,
+    max_entries=settings.ANALYSIS_CACHE_MAX_ENTRIES,
+)
@@ -0,0 +1,132 @@
+from typing import Any, Dict, List, Optional
+from uuid import UUID
+
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.crud.chat import get_conversation_context
+from app.models.chat import ChatSession, ChatMessage
+from app.services.llm_gateway import llm_gateway
+from app.services.model_registry import gemini_models
+from app.services.prompt_budget import PromptSection, estimate_tokens, prompt_budget
+
+SUMMARY_INSTRUCTIONS = """You maintain the running summary of a skincare chat between a user and an AI assistant.
+Merge the new messages into the current summary. Keep what matters for future advice:
+the user's skin concerns, reactions and suspected allergens, products and routines tried
+or recommended, and any open questions. Drop greetings and repetition.
+Write plain third-person prose of at most {max_words} words."""
+
+
+def history_tail(messages: List[ChatMessage], budget: Optional[int] = None) -> List[ChatMessage]:
+    """Newest messages that fit in ``budget`` estimated tokens, oldest first.
+
+    ``messages`` is newest first, as returned by ``get_conversation_context``.
+    The newest message is always kept.
+    """
+    budget = budget if budget is not None else settings.CHAT_HISTORY_TOKEN_BUDGET
+    tail, used = [], 0
+    for message in messages:
+        used += estimate_tokens(message.message)
+        if tail and used > budget:
+            break
+        tail.append(message)
+    return list(reversed(tail))
+
+
+class ChatSummarizer:
+    """Folds older chat messages into a rolling per-session summary.
+
+    Chat prompts carry the summary plus the unsummarized messages that fit
+    the history token budget. Once those overflow the budget the router
+    schedules ``update`` as a background job, which summarizes everything
+    but the newest half-budget of messages, so the next turns fit again
+    without another summary call.
+    """
+
+    def __init__(self):
+        self.model = gemini_models.get("extraction")
+        self._updates = 0
+        self._folded = 0
+        self._failed = 0
+
+    def needs_update(self, messages: List[ChatMessage]) -> bool:
+        """Whether unsummarized ``messages`` (newest first) no longer fit the prompt."""
+        return (
+            len(messages) >= settings.CHAT_CONTEXT_FETCH_LIMIT
+            or len(history_tail(messages)) < len(messages)
+        )
+
+    async def update(self, db: AsyncSession, session_id: UUID):
+        """Fold the session's older unsummarized messages into its summary.
+
+        Sessions with more than ``CHAT_SUMMARY_BATCH_SIZE`` unsummarized
+        messages (from before summaries existed) start from the newest batch.
+        """
+        session = await db.get(ChatSession, session_id)
+        if session is None or not session.is_active:
+            return
+
+        messages = await get_conversation_context(db, session, limit=settings.CHAT_SUMMARY_BATCH_SIZE)
+        keep = history_tail(messages, settings.CHAT_HISTORY_TOKEN_BUDGET // 2)
+        fold = list(reversed(messages[len(keep):]))
+        # Never split messages sharing a timestamp; the tail query is strictly after
+        fold = [message for message in fold if message.created_at < keep[0].created_at]
+        if not fold:
+            return
+
+        transcript = "\n".join(
+            f"{'User' if message.is_user else 'Assistant'}: {message.message}" for message in fold
+        )
+        prompt = prompt_budget.build("chat_summary", [
+            PromptSection(
+                "instructions",
+                SUMMARY_INSTRUCTIONS.format(max_words=settings.CHAT_SUMMARY_MAX_CHARS // 6)
+            ),
+            PromptSection("summary", session.summary or "(none yet)", header="Current summary:\n"),
+            PromptSection(
+                "history", transcript, priority=0, keep="tail", header="New messages:\n"
+            ),
+            PromptSection("output", "Updated summary:"),
+        ])
+        try:
+            response = await llm_gateway.generate(self.model, prompt, endpoint="chat_summary")
+            summary = response.text.strip()[:settings.CHAT_SUMMARY_MAX_CHARS]
+        except Exception as e:
+            self._failed += 1
+            print(f"Error summarizing chat session {session_id}: {e}")
+            return
+
+        # Compare-and-set so overlapping jobs for one session can't roll it back
+        previous = session.summarized_until
+        result = await db.execute(
+            update(ChatSession)
+            .where(
+                ChatSession.id == session_id,
+                ChatSession.summarized_until.is_(None) if previous is None
+                else ChatSession.summarized_until == previous
+            )
+            .values(
+                summary=summary,
+                summarized_until=fold[-1].created_at,
+                # Summaries are bookkeeping, not activity; keep list ordering as is
+                updated_at=ChatSession.updated_at
+            )
+            .execution_options(synchronize_session=False)
+        )
+        await db.commit()
+        if result.rowcount:
+            self._updates += 1
+            self._folded += len(fold)
+
+    def stats(self) -> Dict[str, Any]:
+        """Get summary update counters."""
+        return {
+            "updates": self._updates,
+            "messages_folded": self._folded,
+            "failed": self._failed,
+        }
+
+
+# Create global chat summarizer instance
+chat_summarizer = ChatSummarizer()
@@ -0,0 +1,208 @@
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional
+
+from google.api_core import exceptions as google_exceptions
+
+from app.services.prompt_budget import estimate_tokens
+
+# Markers in the services' prompts that tell the fake which answer to give
+SUMMARY_MARKER = "running summary"
+EXTRACTION_MARKER = "Return a JSON response with this structure"
+INSIGHTS_MARKER = "Extract key insights as JSON"
+
+_USER_MESSAGE = re.compile(r"(?:Current message from user|User message): (.*)")
+_KNOWN_ALLERGEN = re.compile(r"^- (.+?) \((?:mild|moderate|severe) severity\)$", re.MULTILINE)
+_CONCERN_WORDS = ("itch", "rash", "burn", "red", "sting", "breakout", "dry", "flak")
+
+PRODUCTS = [
+    ("Gentle Hydrating Cleanser", "Fake Labs", "Cleanser", ["Glycerin", "Ceramide NP"]),
+    ("Daily Barrier Moisturizer", "Fake Labs", "Moisturizer", ["Niacinamide", "Squalane"]),
+    ("Clarifying Toner", "Test & Co", "Toner", ["Salicylic Acid", "Witch Hazel"]),
+    ("Mineral Sunscreen SPF 50", "Test & Co", "Sunscreen", ["Zinc Oxide", "Tocopherol"]),
+]
+
+CHAT_REPLY = (
+    "Thanks for telling me about {topic}. Based on your profile, start with a gentle, "
+    "fragrance-free routine: a mild cleanser, a barrier-supporting moisturizer with ceramides "
+    "and daily broad-spectrum sunscreen. Introduce one new product at a time and patch test it "
+    "for a few days first. If irritation persists or gets worse, please see a dermatologist."
+)
+
+
+class _Usage:
+    def __init__(self, prompt_token_count: int, candidates_token_count: int):
+        self.prompt_token_count = prompt_token_count
+        self.candidates_token_count = candidates_token_count
+
+
+class FakeResponse:
+    """Minimal stand-in for the SDK response: ``text``, ``usage_metadata`` and chunk iteration."""
+
+    def __init__(self, text: str, usage_metadata=None, chunks: Optional[Iterator["FakeResponse"]] = None):
+        self.text = text
+        self.usage_metadata = usage_metadata
+        self._chunks = chunks
+
+    def __iter__(self):
+        return self._chunks if self._chunks is not None else iter([self])
+
+
+class LatencyModel:
+    """Samples call latencies from a fixed, uniform or lognormal distribution.
+
+    ``median_ms`` is the typical latency; ``jitter`` is the relative spread
+    for "uniform" (median ± jitter) and the log-space sigma for
+    "lognormal", which gives the long tail real APIs have.
+    """
+
+    def __init__(self, distribution: str, median_ms: float, jitter: float, rng: random.Random):
+        self.distribution = distribution
+        self.median_ms = median_ms
+        self.jitter = jitter
+        self._rng = rng
+
+    def sample(self) -> float:
+        """Latency in seconds."""
+        if self.distribution == "uniform":
+            ms = self.median_ms * self._rng.uniform(1 - self.jitter, 1 + self.jitter)
+        elif self.distribution == "lognormal":
+            ms = self.median_ms * math.exp(self._rng.gauss(0, self.jitter))
+        else:
+            ms = self.median_ms
+        return max(ms, 0) / 1000
+
+
+class FakeGenerativeModel:
+    """Offline stand-in for ``genai.GenerativeModel`` for load tests.
+
+    Answers are deterministic for a given prompt and valid for what each
+    service parses: product analysis JSON for image prompts, the structured
+    chat turn for calls with a response schema, extraction and insight
+    JSON, summaries, and plain chat replies otherwise. Latency, injected
+    errors and stream pacing come from settings; the random draws use a
+    seeded generator shared by all fake models, so a run can be repeated.
+    Calls block like the SDK does and honor the request timeout.
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        latency: LatencyModel,
+        error_rate: float,
+        stream_chunk_chars: int,
+        stream_chunk_delay_ms: float,
+        rng: random.Random,
+        rng_lock: threading.Lock,
+    ):
+        self.model_name = model_name
+        self.latency = latency
+        self.error_rate = error_rate
+        self.stream_chunk_chars = stream_chunk_chars
+        self.stream_chunk_delay_ms = stream_chunk_delay_ms
+        self._rng = rng
+        self._rng_lock = rng_lock
+
+    def generate_content(
+        self,
+        contents: Any,
+        *,
+        stream: bool = False,
+        generation_config: Any = None,
+        request_options: Optional[Dict[str, Any]] = None,
+        **kwargs,
+    ) -> FakeResponse:
+        with self._rng_lock:
+            delay = self.latency.sample()
+            failed = self._rng.random() < self.error_rate
+
+        timeout = (request_options or {}).get("timeout")
+        if timeout is not None and delay > timeout:
+            time.sleep(timeout)
+            raise google_exceptions.DeadlineExceeded("Fake LLM latency exceeded the request timeout")
+        time.sleep(delay)
+        if failed:
+            raise google_exceptions.ServiceUnavailable("Fake LLM injected error")
+
+        parts = contents if isinstance(contents, list) else [contents]
+        prompt = "\n".join(part for part in parts if isinstance(part, str))
+        has_image = any(not isinstance(part, str) for part in parts)
+        structured = getattr(generation_config, "response_schema", None) is not None
+        text = self._answer(prompt, has_image, structured)
+        usage = _Usage(estimate_tokens(prompt), estimate_tokens(text))
+
+        if not stream:
+            return FakeResponse(text, usage)
+        return FakeResponse(text, usage, self._chunks(text, usage))
+
+    def _chunks(self, text: str, usage) -> Iterator[FakeResponse]:
+        size = max(self.stream_chunk_chars, 1)
+        for start in range(0, len(text), size):
+            if start:
+                time.sleep(self.stream_chunk_delay_ms / 1000)
+            last = start + size >= len(text)
+            yield FakeResponse(text[start:start + size], usage if last else None)
+
+    def _answer(self, prompt: str, has_image: bool, structured: bool) -> str:
+        digest = int(hashlib.sha256(prompt.encode()).hexdigest(), 16)
+        match = _USER_MESSAGE.search(prompt)
+        user_message = match.group(1).strip() if match else ""
+
+        if has_image:
+            return "```json\n" + json.dumps(self._analysis(prompt, digest)) + "\n```"
+        if structured:
+            return json.dumps({"reply": self._reply(user_message), **self._extraction(user_message)})
+        if EXTRACTION_MARKER in prompt:
+            return json.dumps(self._extraction(user_message))
+        if INSIGHTS_MARKER in prompt:
+            extraction = self._extraction(user_message)
+            return json.dumps({
+                "new_issues": [],
+                "improvements": [],
+                "reactions": [insight["content"] for insight in extraction["insights"]],
+                "lifestyle_factors": [],
+            })
+        if SUMMARY_MARKER in prompt:
+            return (
+                "The user is working on a gentle skincare routine and has asked about "
+                "cleansing, moisturizing and sun protection; patch testing was recommended."
+            )
+        return self._reply(user_message)
+
+    def _reply(self, user_message: str) -> str:
+        topic = " ".join(user_message.split()[:8]) or "your skin"
+        return CHAT_REPLY.format(topic=f'"{topic}"')
+
+    def _extraction(self, user_message: str) -> Dict[str, List[Dict[str, Any]]]:
+        lowered = user_message.lower()
+        insights = [
+            {"type": "concern", "content": f"User mentioned {word} skin symptoms"}
+            for word in _CONCERN_WORDS if word in lowered
+        ][:1]
+        return {"new_allergens": [], "new_issues": [], "insights": insights}
+
+    def _analysis(self, prompt: str, digest: int) -> Dict[str, Any]:
+        name, brand, product_type, ingredients = PRODUCTS[digest % len(PRODUCTS)]
+        known_allergens = _KNOWN_ALLERGEN.findall(prompt)
+        warnings = [f"May contain traces related to {allergen}" for allergen in known_allergens[:1]]
+        return {
+            "product_name": name,
+            "brand": brand,
+            "product_type": product_type,
+            "key_ingredients": [
+                {"name": ingredient, "description": f"{ingredient} is a common {product_type.lower()} ingredient"}
+                for ingredient in ingredients
+            ],
+            "suitability_score": 4 + digest % 6 - len(warnings),
+            "allergen_warnings": warnings,
+            "personalized_recommendation": f"{name} suits most skin types; patch test before daily use.",
+            "beneficial_ingredients": ingredients[:1],
+            "watch_ingredients": [],
+            "usage_instructions": "Apply once daily and follow with sunscreen in the morning.",
+            "potential_issues": [],
+        }
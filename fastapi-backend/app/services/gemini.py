@@ -1,73 +1,246 @@
-import google.generativeai as genai
 from PIL import Image
 import io
 import base64
 import json
-from typing import Dict, Any, List
-from sqlalchemy.orm import Session
+import asyncio
+from typing import Dict, Any, List, AsyncIterator, Tuple
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.database import AsyncSessionLocal
 from app.crud.skin_memory import skin_memory_crud
-import os
+from app.core.singleflight import SingleFlight
+from app.services.llm_admission import LLMRateLimited
+from app.services.llm_gateway import llm_gateway
+from app.services.model_registry import gemini_models
+from app.services.prompt_budget import PromptSection, prompt_budget
+from app.services.analysis_cache import analysis_cache
+from app.services.image_preprocessing import image_preprocessor
 from dotenv import load_dotenv
 
 
 load_dotenv()
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+
+PRODUCT_ANALYSIS_INSTRUCTIONS = """Please provide a comprehensive analysis including:
+1. Product identification (name, brand, type)
+2. Key ingredients analysis
+3. Suitability score (1-10) based on user's skin type and known allergens
+4. Specific allergen warnings for this user
+5. Recommendations considering user's current skin issues
+6. Ingredients that might help with current issues
+7. Potential new sensitivities to watch for
+8. Usage recommendations
+
+IMPORTANT: Format your response using the EXACT structure below. All lists must be arrays, even if there is only one item:
+
+```json
+{
+    "product_name": "Example Product Name",
+    "brand": "Example Brand",
+    "product_type": "Cleanser",
+    "key_ingredients": [
+        {
+            "name": "Ingredient 1",
+            "description": "Description of ingredient 1"
+        },
+        {
+            "name": "Ingredient 2", 
+            "description": "Description of ingredient 2"
+        }
+    ],
+    "suitability_score": 7,
+    "allergen_warnings": [
+        "Warning 1 about allergen X",
+        "Warning 2 about allergen Y"
+    ],
+    "personalized_recommendation": "Detailed recommendation based on user's skin profile",
+    "beneficial_ingredients": [
+        "Ingredient A",
+        "Ingredient B"
+    ],
+    "watch_ingredients": [
+        {
+            "name": "Problematic Ingredient 1",
+            "reason": "Reason why this might be problematic"
+        },
+        {
+            "name": "Problematic Ingredient 2",
+            "reason": "Reason why this might be problematic"
+        }
+    ],
+    "usage_instructions": "Instructions on how to use the product",
+    "potential_issues": "[Any other issues to be aware of , issue 2, issue 3]"
+}
+```
+
+Always provide arrays for key_ingredients, allergen_warnings, beneficial_ingredients,potential_issues and watch_ingredients, even if there is only one item or no items (use empty array in that case)."""
+
+CHAT_INSIGHTS_INSTRUCTIONS = """Analyze this skincare conversation for any mentions of:
+1. New skin issues or problems
+2. Improvements in existing conditions
+3. Reactions to products or ingredients
+4. Lifestyle factors affecting skin"""
 
 
 class GeminiAnalyzer:
     def __init__(self):
-        self.model = genai.GenerativeModel("gemini-2.5-flash")
+        self.model = gemini_models.get("vision")
+        self.extraction_model = gemini_models.get("extraction")
+        self.flights = SingleFlight()
 
-    def analyze_product_with_memory(
+    async def analyze_product_with_memory(
         self,
         image_data: bytes,
         skin_type: str,
         user_allergens: List[Dict],
         user_issues: List[Dict],
-        db: Session,
         user_id: int,
     ) -> Dict[str, Any]:
         """Main method for analyzing products with user's skin memory"""
 
+        cache_key = analysis_cache.make_key(
+            image_data, skin_type, user_allergens, user_issues
+        )
+
+        # Retries and double-submits of the same image share one analysis
+        return await self.flights.do(
+            (user_id, cache_key),
+            self._analyze_product_with_memory,
+            image_data,
+            skin_type,
+            user_allergens,
+            user_issues,
+            user_id,
+            cache_key,
+        )
+
+    async def _analyze_product_with_memory(
+        self,
+        image_data: bytes,
+        skin_type: str,
+        user_allergens: List[Dict],
+        user_issues: List[Dict],
+        user_id: int,
+        cache_key: str,
+    ) -> Dict[str, Any]:
+        enhanced_analysis = await self._analyze_cached(
+            image_data, skin_type, user_allergens, user_issues, cache_key
+        )
+
+        # Store the analysis and any extracted insights in one transaction
+        try:
+            async with AsyncSessionLocal() as db:
+                await skin_memory_crud.add_memory_entries(
+                    db, user_id, self._memory_entries(enhanced_analysis)
+                )
+        except Exception as e:
+            print(f"Error storing memory entry: {e}")
+
+        return enhanced_analysis
+
+    async def _analyze_cached(
+        self,
+        image_data: bytes,
+        skin_type: str,
+        user_allergens: List[Dict],
+        user_issues: List[Dict],
+        cache_key: str,
+    ) -> Dict[str, Any]:
+        """Analyze an image, reusing a previous analysis against the same profile.
+
+        Runs inside coalesced flights that can outlive the request that
+        started them, so it opens its own short sessions instead of
+        borrowing the caller's; none is held during the Gemini call.
+        """
         # Prepare user context
         user_context = self._prepare_user_context(user_allergens, user_issues)
 
-        # Analyze product
-        enhanced_analysis = self._analyze_with_context(
-            image_data, skin_type, user_context
-        )
+        async with AsyncSessionLocal() as db:
+            enhanced_analysis = await analysis_cache.get(db, cache_key)
+
+        if enhanced_analysis is None:
+            # Analyze product
+            enhanced_analysis = await self._analyze_with_context(
+                image_data, skin_type, user_context
+            )
+            # Errors and unparsed replies are placeholders; a rescan should retry them
+            if "error" not in enhanced_analysis and not enhanced_analysis.get("fallback"):
+                async with AsyncSessionLocal() as db:
+                    await analysis_cache.set(db, cache_key, enhanced_analysis)
+
+        return enhanced_analysis
+
+    async def analyze_products_batch(
+        self,
+        images: List[bytes],
+        skin_type: str,
+        user_allergens: List[Dict],
+        user_issues: List[Dict],
+        user_id: int,
+        concurrency: int,
+    ) -> AsyncIterator[Tuple[int, Dict[str, Any]]]:
+        """Analyze several images concurrently, yielding ``(index, analysis)`` as each finishes.
 
-        # Extract insights about potential new allergens or issues
-        self._extract_and_store_insights(enhanced_analysis, db, user_id)
+        At most ``concurrency`` analyses run at once; memory entries are
+        left to the caller to write in one go.
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def analyze(index: int, image_data: bytes):
+            cache_key = analysis_cache.make_key(
+                image_data, skin_type, user_allergens, user_issues
+            )
+            try:
+                async with semaphore:
+                    # Separate key: single-item leaders also write memory entries
+                    analysis = await self.flights.do(
+                        ("batch", user_id, cache_key),
+                        self._analyze_cached,
+                        image_data,
+                        skin_type,
+                        user_allergens,
+                        user_issues,
+                        cache_key,
+                    )
+            except LLMRateLimited as e:
+                analysis = {"error": str(e), "retry_after": e.retry_after}
+            except Exception as e:
+                print(f"Batch item {index} analysis error: {e}")
+                analysis = {"error": str(e)}
+            return index, analysis
+
+        tasks = [asyncio.create_task(analyze(index, data)) for index, data in enumerate(images)]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            # Client went away mid-stream: don't leave analyses running
+            for task in tasks:
+                task.cancel()
+
+    def _memory_entries(self, analysis: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Memory entries recording an analysis and the insights extracted from it."""
+        entries = self._insight_entries(analysis)
 
         # Create memory entry for this analysis
         memory_content = (
-            f"Analyzed product: {enhanced_analysis.get('product_name', 'Unknown')}. "
+            f"Analyzed product: {analysis.get('product_name', 'Unknown')}. "
         )
         memory_content += (
-            f"Suitability score: {enhanced_analysis.get('suitability_score')}/10. "
+            f"Suitability score: {analysis.get('suitability_score')}/10. "
         )
-        if enhanced_analysis.get("allergen_warnings"):
-            memory_content += f"Allergen warnings detected: {', '.join(enhanced_analysis.get('allergen_warnings', []))}."
+        if analysis.get("allergen_warnings"):
+            memory_content += f"Allergen warnings detected: {', '.join(analysis.get('allergen_warnings', []))}."
 
-        # Store analysis in memory
-        try:
-            skin_memory_crud.add_memory_entry(
-                db=db,
-                user_id=user_id,
-                entry_type="analysis_finding",
-                content=memory_content,
-                entry_metadata={
-                    "analysis_result": enhanced_analysis,
-                    "product_name": enhanced_analysis.get("product_name")
-                },
-                source="product_analysis",
-                importance=4
-            )
-        except Exception as e:
-            print(f"Error storing memory entry: {e}")
-
-        return enhanced_analysis
+        entries.append({
+            "entry_type": "analysis_finding",
+            "content": memory_content,
+            "entry_metadata": {
+                "analysis_result": analysis,
+                "product_name": analysis.get("product_name")
+            },
+            "source": "product_analysis",
+            "importance": 4
+        })
+        return entries
 
 
     def _prepare_user_context(self, allergens: List[Dict], issues: List[Dict]) -> str:
@@ -85,76 +258,27 @@ class GeminiAnalyzer:
 
         return context
 
-    def _analyze_with_context(
+    async def _analyze_with_context(
         self, image_data: bytes, skin_type: str, user_context: str
     ) -> Dict[str, Any]:
         try:
-            # Convert image
-            image = Image.open(io.BytesIO(image_data))
-
-            prompt = f"""
-            Analyze this skincare product image with the following user context:
-            
-            Skin Type: {skin_type}
-            
-            {user_context}
-            
-            Please provide a comprehensive analysis including:
-            1. Product identification (name, brand, type)
-            2. Key ingredients analysis
-            3. Suitability score (1-10) based on user's skin type and known allergens
-            4. Specific allergen warnings for this user
-            5. Recommendations considering user's current skin issues
-            6. Ingredients that might help with current issues
-            7. Potential new sensitivities to watch for
-            8. Usage recommendations
-            
-            IMPORTANT: Format your response using the EXACT structure below. All lists must be arrays, even if there is only one item:
-            
-            ```json
-            {{
-                "product_name": "Example Product Name",
-                "brand": "Example Brand",
-                "product_type": "Cleanser",
-                "key_ingredients": [
-                    {{
-                        "name": "Ingredient 1",
-                        "description": "Description of ingredient 1"
-                    }},
-                    {{
-                        "name": "Ingredient 2", 
-                        "description": "Description of ingredient 2"
-                    }}
-                ],
-                "suitability_score": 7,
-                "allergen_warnings": [
-                    "Warning 1 about allergen X",
-                    "Warning 2 about allergen Y"
-                ],
-                "personalized_recommendation": "Detailed recommendation based on user's skin profile",
-                "beneficial_ingredients": [
-                    "Ingredient A",
-                    "Ingredient B"
-                ],
-                "watch_ingredients": [
-                    {{
-                        "name": "Problematic Ingredient 1",
-                        "reason": "Reason why this might be problematic"
-                    }},
-                    {{
-                        "name": "Problematic Ingredient 2",
-                        "reason": "Reason why this might be problematic"
-                    }}
-                ],
-                "usage_instructions": "Instructions on how to use the product",
-                "potential_issues": "[Any other issues to be aware of , issue 2, issue 3]"
-            }}
-            ```
-
-            Always provide arrays for key_ingredients, allergen_warnings, beneficial_ingredients,potential_issues and watch_ingredients, even if there is only one item or no items (use empty array in that case).
-            """
-
-            response = self.model.generate_content([prompt, image])
+            # Downscale and recompress the upload before sending it to Gemini
+            try:
+                processed_data, preprocessing = await image_preprocessor.process(image_data)
+                image = {"mime_type": preprocessing["mime_type"], "data": processed_data}
+            except Exception as e:
+                print(f"Image preprocessing failed, sending original: {e}")
+                image = Image.open(io.BytesIO(image_data))
+
+            # The profile is the only part that can grow; trim it before the instructions
+            prompt = prompt_budget.build("product_analysis", [
+                PromptSection("instructions", "Analyze this skincare product image with the following user context:"),
+                PromptSection("skin_type", f"Skin Type: {skin_type}"),
+                PromptSection("profile", user_context, priority=0),
+                PromptSection("output_format", PRODUCT_ANALYSIS_INSTRUCTIONS),
+            ])
+
+            response = await llm_gateway.generate(self.model, [prompt, image], endpoint="product_analysis")
 
             # Parse JSON response
             try:
@@ -176,6 +300,8 @@ class GeminiAnalyzer:
                 analysis = self._parse_fallback_response(response.text)
                 return analysis
 
+        except LLMRateLimited:
+            raise
         except Exception as e:
             print(f"Analysis error: {e}")
             return {
@@ -189,54 +315,39 @@ class GeminiAnalyzer:
                 "usage_instructions": "Follow product instructions"
             }
 
-    def _extract_and_store_insights(
-        self, analysis: Dict[str, Any], db: Session, user_id: int
-    ):
+    def _insight_entries(self, analysis: Dict[str, Any]) -> List[Dict[str, Any]]:
         """Extract potential new allergens or issues from analysis"""
-        try:
-            # Check for new potential allergens mentioned in warnings
-            if analysis.get("watch_ingredients"):
-                for ingredient in analysis["watch_ingredients"]:
-                    try:
-                        skin_memory_crud.add_memory_entry(
-                            db=db,
-                            user_id=user_id,
-                            entry_type="potential_allergen",
-                            content=f"Recommended to watch ingredient: {ingredient} - mentioned in product analysis",
-                            entry_metadata={
-                                "ingredient": ingredient, 
-                                "source": "product_analysis"
-                            },
-                            source="gemini_analysis",
-                            importance=3
-                        )
-                    except Exception as e:
-                        print(f"Error storing potential allergen memory: {e}")
-        except Exception as e:
-            print(f"Error extracting insights: {e}")
+        # Check for new potential allergens mentioned in warnings
+        return [
+            {
+                "entry_type": "potential_allergen",
+                "content": f"Recommended to watch ingredient: {ingredient} - mentioned in product analysis",
+                "entry_metadata": {
+                    "ingredient": ingredient,
+                    "source": "product_analysis"
+                },
+                "source": "gemini_analysis",
+                "importance": 3
+            }
+            for ingredient in analysis.get("watch_ingredients") or []
+        ]
 
-    def process_chat_for_insights(
-        self, message: str, response: str, db: Session, user_id: int
+    async def process_chat_for_insights(
+        self, message: str, response: str, db: AsyncSession, user_id: int
     ):
         """Process chat conversations to extract skin-related insights"""
 
         # Check if user mentions new issues or improvements
-        insight_prompt = f"""
-        Analyze this skincare conversation for any mentions of:
-        1. New skin issues or problems
-        2. Improvements in existing conditions
-        3. Reactions to products or ingredients
-        4. Lifestyle factors affecting skin
-        
-        User message: {message}
-        AI response: {response}
-        
-        Extract key insights as JSON with keys: new_issues, improvements, reactions, lifestyle_factors.
-        If nothing relevant, return empty arrays.
-        """
+        insight_prompt = prompt_budget.build("chat_insights", [
+            PromptSection("instructions", CHAT_INSIGHTS_INSTRUCTIONS),
+            PromptSection("user_message", message, priority=1, header="User message: "),
+            PromptSection("ai_response", response, priority=0, header="AI response: "),
+            PromptSection("output_format", """Extract key insights as JSON with keys: new_issues, improvements, reactions, lifestyle_factors.
+If nothing relevant, return empty arrays."""),
+        ])
 
         try:
-            insight_response = self.model.generate_content(insight_prompt)
+            insight_response = await llm_gateway.generate(self.extraction_model, insight_prompt, endpoint="chat_insights")
             insights = json.loads(
                 insight_response.text.strip().replace("```json", "").replace("```", "")
             )
@@ -245,7 +356,7 @@ class GeminiAnalyzer:
             if any(insights.values()):
                 content = f"Chat insights: User discussed skin concerns and experiences"
                 try:
-                    skin_memory_crud.add_memory_entry(
+                    await skin_memory_crud.add_memory_entry(
                         db=db,
                         user_id=user_id,
                         entry_type="chat_insight",
@@ -264,8 +375,9 @@ class GeminiAnalyzer:
             print(f"Chat insight extraction error: {e}")
 
     def _parse_fallback_response(self, text: str) -> Dict[str, Any]:
-        """Fallback parsing when JSON parsing fails"""
+        """Fallback parsing when JSON parsing fails; marked so it is never cached"""
         return {
+            "fallback": True,
             "product_name": "Unknown Product",
             "suitability_score": 5,
             "personalized_recommendation": (
@@ -1,20 +1,194 @@
 import google.generativeai as genai
 import json
-from typing import List, Dict, Any, Optional
-from datetime import datetime
-from sqlalchemy.orm import Session
+import threading
+import time
+from typing import List, Dict, Any, Optional, AsyncIterator, Tuple
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.config import settings
+from app.core.background import background_jobs
+from app.core.pagination import total_counts
+from app.core.singleflight import SingleFlight
+from app.crud.chat import get_conversation_context, record_session_messages
 from app.models.chat import ChatSession, ChatMessage
 from app.models.skin_memory import UserAllergen, SkinIssue, SkinMemoryEntry
-from app.models.user import User
+from app.services.chat_summary import chat_summarizer, history_tail
+from app.services.llm_admission import LLMRateLimited
+from app.services.llm_gateway import llm_gateway
+from app.services.llm_resilience import LLMTimeoutError, LLMUnavailableError, is_transient
+from app.services.model_registry import gemini_models
+from app.services.prompt_budget import PromptSection, prompt_budget
+from app.services.skin_context import skin_context_cache
+
+# Shared across service instances so duplicate chat turns coalesce process-wide
+chat_flights = SingleFlight()
+
+CHAT_FALLBACK_RESPONSE = (
+    "I apologize, but I'm having trouble processing your message right now. "
+    "Please try again or consult with a skincare professional for personalized advice."
+)
+
+CHAT_GUIDELINES = """Guidelines:
+1. Be helpful and informative about skincare
+2. Consider the user's skin type and concerns
+3. Provide specific product recommendations when appropriate
+4. Always prioritize safety and suggest consulting dermatologists for serious issues
+5. Keep responses concise but informative
+6. If you detect new skin issues or concerns, acknowledge them appropriately"""
+
+EXTRACTION_OUTPUT_FORMAT = """Return a JSON response with this structure:
+{
+    "new_allergens": [
+        {
+            "ingredient": "ingredient name",
+            "reaction": "description of reaction",
+            "severity": "mild|moderate|severe"
+        }
+    ],
+    "new_issues": [
+        {
+            "issue_type": "issue name",
+            "description": "detailed description",
+            "severity": 1-10,
+            "triggers": ["trigger1", "trigger2"]
+        }
+    ],
+    "insights": [
+        {
+            "type": "improvement|concern|observation",
+            "content": "description of insight"
+        }
+    ]
+}
+
+Only include items if they are clearly new issues or reactions. Return empty arrays if nothing new is mentioned."""
+
+# Appended to the chat prompt in single-call mode
+STRUCTURED_TURN_INSTRUCTIONS = """Also extract any NEW skin issues or allergic reactions the user mentions in their current message.
+Only extract information that seems to be new concerns or reactions, not general questions.
+Severity for allergens is mild, moderate or severe; severity for issues is 1-10.
+
+Respond with JSON only: put your reply to the user in "reply" and the extraction in
+"new_allergens", "new_issues" and "insights" (empty arrays if nothing new is mentioned)."""
+
+STRUCTURED_TURN_CONFIG = genai.GenerationConfig(
+    response_mime_type="application/json",
+    response_schema={
+        "type": "OBJECT",
+        "properties": {
+            "reply": {"type": "STRING"},
+            "new_allergens": {"type": "ARRAY", "items": {
+                "type": "OBJECT",
+                "properties": {
+                    "ingredient": {"type": "STRING"},
+                    "reaction": {"type": "STRING"},
+                    "severity": {"type": "STRING", "enum": ["mild", "moderate", "severe"]},
+                },
+                "required": ["ingredient", "reaction", "severity"],
+            }},
+            "new_issues": {"type": "ARRAY", "items": {
+                "type": "OBJECT",
+                "properties": {
+                    "issue_type": {"type": "STRING"},
+                    "description": {"type": "STRING"},
+                    "severity": {"type": "INTEGER"},
+                    "triggers": {"type": "ARRAY", "items": {"type": "STRING"}},
+                },
+                "required": ["issue_type", "description", "severity"],
+            }},
+            "insights": {"type": "ARRAY", "items": {
+                "type": "OBJECT",
+                "properties": {
+                    "type": {"type": "STRING", "enum": ["improvement", "concern", "observation"]},
+                    "content": {"type": "STRING"},
+                },
+                "required": ["type", "content"],
+            }},
+        },
+        "required": ["reply", "new_allergens", "new_issues", "insights"],
+    },
+)
+
+
+class ChatTurnMetrics:
+    """Per-mode counters for comparing the single- and two-call chat flows.
+
+    Reply latency is what the user waits for. Two-call turns also pay for a
+    memory-extraction call after the response, which is counted under the
+    same mode when it actually runs, so calls, latency and tokens per turn
+    compare like for like. Turns answered with the canned fallback reply
+    are only counted, never averaged in.
+    """
+
+    def __init__(self):
+        self._modes: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def _counters(self, mode: str) -> Dict[str, float]:
+        return self._modes.setdefault(mode, {
+            "turns": 0, "fallback_turns": 0, "llm_calls": 0, "reply_seconds": 0.0,
+            "extractions": 0, "extraction_seconds": 0.0,
+            "input_tokens": 0, "output_tokens": 0,
+        })
+
+    def _add_usage(self, counters: Dict[str, float], usage_metadata):
+        if usage_metadata is not None:
+            counters["input_tokens"] += getattr(usage_metadata, "prompt_token_count", 0) or 0
+            counters["output_tokens"] += getattr(usage_metadata, "candidates_token_count", 0) or 0
+
+    def record(self, mode: str, llm_calls: int, reply_seconds: float, usage_metadata=None):
+        """Count one answered chat turn, its reply calls, latency and tokens."""
+        with self._lock:
+            counters = self._counters(mode)
+            counters["turns"] += 1
+            counters["llm_calls"] += llm_calls
+            counters["reply_seconds"] += reply_seconds
+            self._add_usage(counters, usage_metadata)
+
+    def record_fallback(self, mode: str):
+        """Count a turn that could only be answered with the canned fallback reply."""
+        with self._lock:
+            self._counters(mode)["fallback_turns"] += 1
+
+    def record_extraction(self, mode: str, seconds: float, usage_metadata=None):
+        """Count the separate memory-extraction call a turn made after its reply."""
+        with self._lock:
+            counters = self._counters(mode)
+            counters["llm_calls"] += 1
+            counters["extractions"] += 1
+            counters["extraction_seconds"] += seconds
+            self._add_usage(counters, usage_metadata)
+
+    def stats(self) -> Dict[str, Any]:
+        """Get per-mode call counts, average latencies and tokens per turn."""
+        with self._lock:
+            stats = {}
+            for mode, counters in self._modes.items():
+                turns = counters["turns"] or 1
+                extractions = counters["extractions"] or 1
+                stats[mode] = {
+                    "turns": counters["turns"],
+                    "fallback_turns": counters["fallback_turns"],
+                    "llm_calls": counters["llm_calls"],
+                    "calls_per_turn": round(counters["llm_calls"] / turns, 2),
+                    "avg_reply_ms": round(counters["reply_seconds"] / turns * 1000, 1),
+                    "extractions": counters["extractions"],
+                    "avg_extraction_ms": round(counters["extraction_seconds"] / extractions * 1000, 1),
+                    "avg_input_tokens_per_turn": round(counters["input_tokens"] / turns),
+                    "avg_output_tokens_per_turn": round(counters["output_tokens"] / turns),
+                }
+            return stats
+
+
+chat_turn_metrics = ChatTurnMetrics()
 
 class GeminiChatService:
     def __init__(self):
-        genai.configure(api_key=settings.GEMINI_API_KEY)
-        self.model = genai.GenerativeModel('gemini-2.5-flash')
+        self.model = gemini_models.get("chat")
+        self.extraction_model = gemini_models.get("extraction")
         
-    async def create_chat_session(self, db: Session, user_id: int, title: str = None) -> ChatSession:
+    async def create_chat_session(self, db: AsyncSession, user_id: int, title: str = None) -> ChatSession:
         """Create a new chat session"""
         try:
             session = ChatSession(
@@ -23,110 +197,233 @@ class GeminiChatService:
                 is_active=True
             )
             db.add(session)
-            db.commit()
-            db.refresh(session)
+            await db.commit()
+            await db.refresh(session)
+            total_counts.invalidate(user_id)
             return session
         except Exception as e:
-            db.rollback()
+            await db.rollback()
             raise Exception(f"Failed to create chat session: {str(e)}")
     
-    async def get_user_context(self, db: Session, user_id: int) -> str:
+    async def get_user_context(self, db: AsyncSession, user_id: int) -> str:
         """Get user's skin memory context for personalized responses"""
         try:
-            # Get user allergens from skin_memory table
-            allergens = db.query(UserAllergen).filter(
-                UserAllergen.user_id == user_id,
-                UserAllergen.is_active == True
-            ).all()
-            
-            allergen_list = []
-            for allergen in allergens:
-                status = "confirmed" if allergen.confirmed else "unconfirmed"
-                allergen_list.append(f"{allergen.ingredient_name} ({allergen.severity} severity, {status})")
-            
-            # Get user skin issues from skin_memory table
-            issues = db.query(SkinIssue).filter(
-                SkinIssue.user_id == user_id
-            ).all()
-            
-            issue_list = []
-            for issue in issues:
-                issue_list.append(f"{issue.issue_type} (severity: {issue.severity}/10, status: {issue.status})")
-            
-            # Get user basic info
-            user = db.query(User).filter(User.id == user_id).first()
-            
-            context = f"""
-User's Skin Profile:
-- Skin Type: {user.skin_type if user and user.skin_type else 'Not specified'}
-- Skin Concerns: {user.skin_concerns if user and user.skin_concerns else 'Not specified'}
-- Known Allergens: {', '.join(allergen_list) if allergen_list else 'None recorded'}
-- Current Skin Issues: {', '.join(issue_list) if issue_list else 'None recorded'}
-
-Please provide personalized skincare advice based on this information.
-"""
-            return context
+            context = await skin_context_cache.get(db, user_id)
+            return context["user_context"]
         except Exception as e:
             print(f"Error getting user context: {e}")
             return "No specific skin profile available."
     
-    def generate_chat_response(
+    def _build_chat_prompt(
+        self,
+        user_message: str,
+        skin_type: str = None,
+        skin_concerns: str = None,
+        conversation_history: List = None,
+        conversation_summary: str = None,
+        output_format: str = None
+    ) -> str:
+        """Build the chat prompt shared by the buffered and streaming paths"""
+        # Build context from the newest messages that fit the history budget
+        history_context = ""
+        if conversation_history:
+            for msg in history_tail(conversation_history):
+                role = "User" if msg.is_user else "Assistant"
+                history_context += f"{role}: {msg.message}\n"
+        
+        # Build user profile context
+        profile_context = ""
+        if skin_type:
+            profile_context += f"Skin Type: {skin_type}\n"
+        if skin_concerns:
+            profile_context += f"Skin Concerns: {skin_concerns}\n"
+        
+        # Create comprehensive prompt; history goes first, then the summary
+        # (older messages), then the profile if it runs over budget
+        sections = [
+            PromptSection(
+                "instructions",
+                "You are a helpful skincare AI assistant. You provide personalized skincare advice based on the user's profile."
+            ),
+            PromptSection("profile", profile_context, priority=2),
+            PromptSection(
+                "summary", conversation_summary, priority=1,
+                header="Summary of the earlier conversation:\n"
+            ),
+            PromptSection(
+                "history", history_context or "This is the start of the conversation.",
+                priority=0, keep="tail", header="Conversation History:\n"
+            ),
+            PromptSection("guidelines", CHAT_GUIDELINES),
+            PromptSection(
+                "user_message",
+                f"Current message from user: {user_message}\n\nPlease provide a helpful response:"
+            ),
+        ]
+        if output_format:
+            sections.append(PromptSection("output_format", output_format))
+        return prompt_budget.build("chat", sections)
+    
+    async def generate_chat_response(
         self, 
         user_message: str, 
         skin_type: str = None, 
         skin_concerns: str = None, 
-        conversation_history: List = None
+        conversation_history: List = None,
+        conversation_summary: str = None
     ) -> str:
-        """Generate AI chat response - this method is called by the router"""
-        try:
-            # Build context from conversation history
-            history_context = ""
-            if conversation_history:
-                recent_messages = conversation_history[:6]  # Last 6 messages
-                for msg in reversed(recent_messages):
-                    role = "User" if msg.is_user else "Assistant"
-                    history_context += f"{role}: {msg.message}\n"
-            
-            # Build user profile context
-            profile_context = ""
-            if skin_type:
-                profile_context += f"Skin Type: {skin_type}\n"
-            if skin_concerns:
-                profile_context += f"Skin Concerns: {skin_concerns}\n"
-            
-            # Create comprehensive prompt
-            system_prompt = f"""
-You are a helpful skincare AI assistant. You provide personalized skincare advice based on the user's profile.
-
-{profile_context}
-
-Conversation History:
-{history_context if history_context else 'This is the start of the conversation.'}
-
-Guidelines:
-1. Be helpful and informative about skincare
-2. Consider the user's skin type and concerns
-3. Provide specific product recommendations when appropriate
-4. Always prioritize safety and suggest consulting dermatologists for serious issues
-5. Keep responses concise but informative
-6. If you detect new skin issues or concerns, acknowledge them appropriately
-
-Current message from user: {user_message}
+        """Generate AI chat response"""
+        reply, _, _ = await self._generate_reply(
+            user_message, skin_type, skin_concerns, conversation_history, conversation_summary
+        )
+        return reply
+    
+    async def _generate_reply(
+        self,
+        user_message: str,
+        skin_type: str = None,
+        skin_concerns: str = None,
+        conversation_history: List = None,
+        conversation_summary: str = None
+    ) -> Tuple[str, Any, bool]:
+        """Generate the plain chat reply; returns ``(reply, usage_metadata, fallback)``.
 
-Please provide a helpful response:
-"""
+        ``fallback`` is True when the call failed and ``reply`` is the canned
+        ``CHAT_FALLBACK_RESPONSE``.
+        """
+        try:
+            system_prompt = self._build_chat_prompt(
+                user_message, skin_type, skin_concerns, conversation_history, conversation_summary
+            )
             
             # Generate AI response
-            response = self.model.generate_content(system_prompt)
-            return response.text
+            response = await llm_gateway.generate(
+                self.model, system_prompt, endpoint="chat",
+                hedge_after=settings.GEMINI_CHAT_HEDGE_AFTER_SECONDS
+            )
+            return response.text, getattr(response, "usage_metadata", None), False
             
+        except (LLMRateLimited, LLMTimeoutError, LLMUnavailableError):
+            # Refused, out of time or Gemini is down: the router answers 429/503
+            # rather than storing a canned reply as part of the conversation
+            raise
         except Exception as e:
+            if is_transient(e):
+                raise self._unavailable(e) from e
             print(f"Error generating chat response: {e}")
-            return "I apologize, but I'm having trouble processing your message right now. Please try again or consult with a skincare professional for personalized advice."
+            return CHAT_FALLBACK_RESPONSE, None, True
+    
+    @staticmethod
+    def _unavailable(error: Exception) -> LLMUnavailableError:
+        """A transient upstream error the gateway's retries didn't get past."""
+        return LLMUnavailableError(
+            settings.GEMINI_BREAKER_RESET_SECONDS, f"Gemini still failing after retries: {error}"
+        )
+    
+    @property
+    def turn_mode(self) -> str:
+        """The ``CHAT_TURN_MODE`` in effect: "single_call" or "two_call"."""
+        return "single_call" if settings.CHAT_TURN_MODE == "single_call" else "two_call"
+    
+    async def generate_chat_turn(
+        self,
+        user_message: str,
+        skin_type: str = None,
+        skin_concerns: str = None,
+        conversation_history: List = None,
+        conversation_summary: str = None
+    ) -> Tuple[str, Optional[Dict[str, Any]]]:
+        """Generate the reply for a chat turn according to ``CHAT_TURN_MODE``.
+
+        Returns ``(reply, extraction)``. In single-call mode ``extraction``
+        holds the new_allergens/new_issues/insights from the same structured
+        call; otherwise (or if the structured call fails) it is None and the
+        caller runs ``_extract_and_update_memory`` as a second call.
+        """
+        started = time.perf_counter()
+        if self.turn_mode == "two_call":
+            reply, usage, fallback = await self._generate_reply(
+                user_message, skin_type, skin_concerns, conversation_history, conversation_summary
+            )
+            # The extraction call is counted by _extract_and_update_memory if it runs
+            if fallback:
+                chat_turn_metrics.record_fallback("two_call")
+            else:
+                chat_turn_metrics.record("two_call", 1, time.perf_counter() - started, usage)
+            return reply, None
+        
+        try:
+            prompt = self._build_chat_prompt(
+                user_message, skin_type, skin_concerns, conversation_history, conversation_summary,
+                output_format=STRUCTURED_TURN_INSTRUCTIONS
+            )
+            response = await llm_gateway.generate(
+                self.model, prompt, endpoint="chat", generation_config=STRUCTURED_TURN_CONFIG,
+                hedge_after=settings.GEMINI_CHAT_HEDGE_AFTER_SECONDS
+            )
+            data = json.loads(response.text)
+            extraction = {key: data.get(key) or [] for key in ("new_allergens", "new_issues", "insights")}
+            chat_turn_metrics.record(
+                "single_call", 1, time.perf_counter() - started, getattr(response, "usage_metadata", None)
+            )
+            return data["reply"], extraction
+        except (LLMRateLimited, LLMTimeoutError, LLMUnavailableError):
+            # The deadline is spent or Gemini is down; a second call would only wait again
+            raise
+        except (json.JSONDecodeError, KeyError, TypeError, AttributeError) as e:
+            # Only a reply that doesn't fit the schema is worth a plain second call
+            print(f"Structured chat turn failed, falling back to two calls: {e}")
+            reply, usage, fallback = await self._generate_reply(
+                user_message, skin_type, skin_concerns, conversation_history, conversation_summary
+            )
+            if fallback:
+                chat_turn_metrics.record_fallback("single_call")
+            else:
+                chat_turn_metrics.record("single_call", 2, time.perf_counter() - started, usage)
+            return reply, None
+        except Exception as e:
+            # A degraded upstream already had its retries; don't start a second call
+            if is_transient(e):
+                raise self._unavailable(e) from e
+            print(f"Structured chat turn failed: {e}")
+            chat_turn_metrics.record_fallback("single_call")
+            return CHAT_FALLBACK_RESPONSE, None
+    
+    async def stream_chat_response(
+        self, 
+        user_message: str, 
+        skin_type: str = None, 
+        skin_concerns: str = None, 
+        conversation_history: List = None,
+        conversation_summary: str = None
+    ) -> AsyncIterator[str]:
+        """Stream AI chat response chunks as Gemini generates them"""
+        system_prompt = self._build_chat_prompt(
+            user_message, skin_type, skin_concerns, conversation_history, conversation_summary
+        )
+        
+        received_any = False
+        try:
+            async for chunk in llm_gateway.stream(self.model, system_prompt, endpoint="chat"):
+                received_any = True
+                yield chunk
+        except LLMRateLimited:
+            raise
+        except (LLMTimeoutError, LLMUnavailableError):
+            if not received_any:
+                raise
+            print("Chat stream cut short by the deadline or an open circuit")
+        except Exception as e:
+            if is_transient(e) and not received_any:
+                raise self._unavailable(e) from e
+            print(f"Error streaming chat response: {e}")
+            # Only fall back when nothing was sent; a partial answer is kept as-is
+            if not received_any:
+                yield CHAT_FALLBACK_RESPONSE
     
     async def send_message(
         self, 
-        db: Session, 
+        db: AsyncSession, 
         session_id: int, 
         user_id: int, 
         message: str
@@ -137,45 +434,51 @@ Please provide a helpful response:
             user_context = await self.get_user_context(db, user_id)
             
             # Get conversation history
-            session = db.query(ChatSession).filter(ChatSession.id == session_id).first()
+            session = await db.get(ChatSession, session_id)
             if not session:
                 raise Exception("Chat session not found")
             
-            # Get recent messages for context
-            recent_messages = db.query(ChatMessage).filter(
-                ChatMessage.session_id == session_id
-            ).order_by(ChatMessage.created_at.desc()).limit(10).all()
-            
-            # Build conversation context
-            conversation_history = []
-            for msg in reversed(recent_messages):
-                conversation_history.append(f"{'User' if msg.is_user else 'Assistant'}: {msg.message}")
+            # Get the rolling summary plus the newest messages that fit the budget
+            recent_messages = await get_conversation_context(db, session)
+            history_context = "\n".join(
+                f"{'User' if msg.is_user else 'Assistant'}: {msg.message}"
+                for msg in history_tail(recent_messages)
+            )
             
             # Create comprehensive system prompt with skin memory context
-            system_prompt = f"""
-You are a helpful skincare AI assistant. You provide personalized skincare advice based on the user's detailed skin profile.
-
-{user_context}
-
-Conversation History:
-{chr(10).join(conversation_history[-6:]) if conversation_history else 'This is the start of the conversation.'}
-
-Guidelines:
+            system_prompt = prompt_budget.build("chat", [
+                PromptSection(
+                    "instructions",
+                    "You are a helpful skincare AI assistant. You provide personalized skincare advice based on the user's detailed skin profile."
+                ),
+                PromptSection("profile", user_context, priority=2),
+                PromptSection(
+                    "summary", session.summary, priority=1,
+                    header="Summary of the earlier conversation:\n"
+                ),
+                PromptSection(
+                    "history", history_context or "This is the start of the conversation.",
+                    priority=0, keep="tail", header="Conversation History:\n"
+                ),
+                PromptSection("guidelines", """Guidelines:
 1. Be helpful and informative about skincare
 2. Consider the user's allergens and skin issues from their profile
 3. Provide specific product recommendations while avoiding known allergens
 4. Always prioritize safety and suggest consulting dermatologists for serious issues
 5. Keep responses concise but informative
 6. If you detect new allergens or skin issues mentioned by the user, acknowledge them and suggest adding to their profile
-7. Reference their existing skin concerns and provide targeted advice
-
-Current message from user: {message}
-
-Please provide a personalized response based on their skin profile:
-"""
+7. Reference their existing skin concerns and provide targeted advice"""),
+                PromptSection(
+                    "user_message",
+                    f"Current message from user: {message}\n\nPlease provide a personalized response based on their skin profile:"
+                ),
+            ])
             
             # Generate AI response
-            response = self.model.generate_content(system_prompt)
+            response = await llm_gateway.generate(
+                self.model, system_prompt, endpoint="chat",
+                hedge_after=settings.GEMINI_CHAT_HEDGE_AFTER_SECONDS
+            )
             ai_response = response.text
             
             # Save user message
@@ -194,13 +497,23 @@ Please provide a personalized response based on their skin profile:
             )
             db.add(ai_message)
             
-            # Update session
-            session.updated_at = datetime.utcnow()
+            # Update session timestamp and counters
+            record_session_messages(session, ai_response, added=2)
             
-            db.commit()
+            await db.commit()
+            await db.refresh(user_message)
+            await db.refresh(ai_message)
             
-            # Extract potential new allergens/issues for memory system
-            await self._extract_and_update_memory(db, user_id, message, ai_response)
+            # Extract potential new allergens/issues for memory system off the response path
+            background_jobs.submit(
+                "chat_memory_extraction",
+                self._extract_and_update_memory,
+                user_id,
+                message,
+                ai_response
+            )
+            if chat_summarizer.needs_update([ai_message, user_message, *recent_messages]):
+                background_jobs.submit("chat_summary", chat_summarizer.update, session_id)
             
             return {
                 "user_message": {
@@ -215,56 +528,44 @@ Please provide a personalized response based on their skin profile:
                 }
             }
             
+        except LLMRateLimited:
+            await db.rollback()
+            raise
         except Exception as e:
-            db.rollback()
+            await db.rollback()
             raise Exception(f"Failed to process message: {str(e)}")
     
     async def _extract_and_update_memory(
         self, 
-        db: Session, 
+        db: AsyncSession, 
         user_id: int, 
         user_message: str, 
-        ai_response: str
+        ai_response: str,
+        turn_mode: Optional[str] = None
     ):
-        """Extract skin issues or allergens from conversation and update memory"""
-        try:
-            # Use AI to extract structured information
-            extraction_prompt = f"""
-Analyze this skincare conversation and extract any NEW skin issues or allergic reactions mentioned by the user.
-Only extract information that seems to be new concerns or reactions, not general questions.
-
-User message: {user_message}
-AI response: {ai_response}
-
-Return a JSON response with this structure:
-{{
-    "new_allergens": [
-        {{
-            "ingredient": "ingredient name",
-            "reaction": "description of reaction",
-            "severity": "mild|moderate|severe"
-        }}
-    ],
-    "new_issues": [
-        {{
-            "issue_type": "issue name",
-            "description": "detailed description",
-            "severity": 1-10,
-            "triggers": ["trigger1", "trigger2"]
-        }}
-    ],
-    "insights": [
-        {{
-            "type": "improvement|concern|observation",
-            "content": "description of insight"
-        }}
-    ]
-}}
+        """Extract skin issues or allergens from conversation and update memory
 
-Only include items if they are clearly new issues or reactions. Return empty arrays if nothing new is mentioned.
-"""
+        With ``turn_mode`` the call's latency and tokens are added to that
+        mode's chat turn metrics.
+        """
+        try:
+            # Use AI to extract structured information; the reply is only
+            # context, so it is trimmed before the user's own message
+            extraction_prompt = prompt_budget.build("chat_extraction", [
+                PromptSection("instructions", """Analyze this skincare conversation and extract any NEW skin issues or allergic reactions mentioned by the user.
+Only extract information that seems to be new concerns or reactions, not general questions."""),
+                PromptSection("user_message", user_message, priority=1, header="User message: "),
+                PromptSection("ai_response", ai_response, priority=0, header="AI response: "),
+                PromptSection("output_format", EXTRACTION_OUTPUT_FORMAT),
+            ])
             
-            response = self.model.generate_content(extraction_prompt)
+            started = time.perf_counter()
+            response = await llm_gateway.generate(self.extraction_model, extraction_prompt, endpoint="chat_extraction")
+            # Extractions after a canned fallback reply belong to no counted turn
+            if turn_mode and ai_response != CHAT_FALLBACK_RESPONSE:
+                chat_turn_metrics.record_extraction(
+                    turn_mode, time.perf_counter() - started, getattr(response, "usage_metadata", None)
+                )
             try:
                 response_text = response.text.strip()
                 if response_text.startswith("```json"):
@@ -274,50 +575,7 @@ Only include items if they are clearly new issues or reactions. Return empty arr
                 
                 # Parse the JSON response
                 extracted_data = json.loads(response_text)
-                
-                # Add new allergens to skin_memory
-                for allergen in extracted_data.get("new_allergens", []):
-                    new_allergen = UserAllergen(
-                        user_id=user_id,
-                        ingredient_name=allergen["ingredient"],
-                        severity=allergen["severity"],
-                        notes=f"Detected from chat: {allergen['reaction']}",
-                        confirmed=False,
-                        is_active=True
-                    )
-                    db.add(new_allergen)
-                
-                # Add new skin issues to skin_memory
-                for issue in extracted_data.get("new_issues", []):
-                    new_issue = SkinIssue(
-                        user_id=user_id,
-                        issue_type=issue["issue_type"],
-                        description=issue["description"],
-                        severity=issue["severity"],
-                        triggers=issue.get("triggers", []),
-                        status="active"
-                    )
-                    db.add(new_issue)
-                
-                # Add insights to memory entries
-                for insight in extracted_data.get("insights", []):
-                    memory_entry = SkinMemoryEntry(
-                        user_id=user_id,
-                        entry_type="chat_insight",
-                        content=insight["content"],
-                        entry_metadata={
-                            "insight_type": insight["type"],
-                            "source_message": user_message[:100],
-                            "extracted_from": "chat_conversation"
-                        },
-                        source=f"chat_analysis",
-                        importance=2,
-                        is_active=True
-                    )
-                    db.add(memory_entry)
-                
-                # Commit the new memory entries
-                db.commit()
+                await self._apply_extraction(db, user_id, user_message, extracted_data)
                     
             except json.JSONDecodeError:
                 # If AI doesn't return valid JSON, skip memory extraction
@@ -326,13 +584,75 @@ Only include items if they are clearly new issues or reactions. Return empty arr
                 
         except Exception as e:
             print(f"Error extracting memory from conversation: {e}")
-            db.rollback()
+            await db.rollback()
     
-    async def get_chat_sessions(self, db: Session, user_id: int) -> List[Dict]:
+    async def _apply_extraction(
+        self,
+        db: AsyncSession,
+        user_id: int,
+        user_message: str,
+        extracted_data: Dict[str, Any]
+    ):
+        """Store extracted allergens, issues and insights in skin memory"""
+        try:
+            # Add new allergens to skin_memory
+            for allergen in extracted_data.get("new_allergens", []):
+                new_allergen = UserAllergen(
+                    user_id=user_id,
+                    ingredient_name=allergen["ingredient"],
+                    severity=allergen["severity"],
+                    notes=f"Detected from chat: {allergen['reaction']}",
+                    confirmed=False,
+                    is_active=True
+                )
+                db.add(new_allergen)
+            
+            # Add new skin issues to skin_memory
+            for issue in extracted_data.get("new_issues", []):
+                new_issue = SkinIssue(
+                    user_id=user_id,
+                    issue_type=issue["issue_type"],
+                    description=issue["description"],
+                    severity=issue["severity"],
+                    triggers=issue.get("triggers", []),
+                    status="active"
+                )
+                db.add(new_issue)
+            
+            # Add insights to memory entries
+            for insight in extracted_data.get("insights", []):
+                memory_entry = SkinMemoryEntry(
+                    user_id=user_id,
+                    entry_type="chat_insight",
+                    content=insight["content"],
+                    entry_metadata={
+                        "insight_type": insight["type"],
+                        "source_message": user_message[:100],
+                        "extracted_from": "chat_conversation"
+                    },
+                    source=f"chat_analysis",
+                    importance=2,
+                    is_active=True
+                )
+                db.add(memory_entry)
+            
+            # Commit the new memory entries
+            await db.commit()
+            if extracted_data.get("new_allergens") or extracted_data.get("new_issues"):
+                skin_context_cache.invalidate(user_id)
+            if extracted_data.get("insights"):
+                total_counts.invalidate(user_id)
+            
+        except Exception as e:
+            print(f"Error storing extracted memory: {e}")
+            await db.rollback()
+    
+    async def get_chat_sessions(self, db: AsyncSession, user_id: int) -> List[Dict]:
         """Get all chat sessions for a user"""
-        sessions = db.query(ChatSession).filter(
+        result = await db.execute(select(ChatSession).where(
             ChatSession.user_id == user_id
-        ).order_by(ChatSession.updated_at.desc()).all()
+        ).order_by(ChatSession.updated_at.desc()))
+        sessions = result.scalars().all()
         
         return [
             {
@@ -345,20 +665,22 @@ Only include items if they are clearly new issues or reactions. Return empty arr
             for session in sessions
         ]
     
-    async def get_chat_messages(self, db: Session, session_id: int, user_id: int) -> List[Dict]:
+    async def get_chat_messages(self, db: AsyncSession, session_id: int, user_id: int) -> List[Dict]:
         """Get all messages in a chat session"""
         # Verify session belongs to user
-        session = db.query(ChatSession).filter(
+        result = await db.execute(select(ChatSession).where(
             ChatSession.id == session_id,
             ChatSession.user_id == user_id
-        ).first()
+        ))
+        session = result.scalars().first()
         
         if not session:
             raise Exception("Chat session not found")
         
-        messages = db.query(ChatMessage).filter(
+        result = await db.execute(select(ChatMessage).where(
             ChatMessage.session_id == session_id
-        ).order_by(ChatMessage.created_at.asc()).all()
+        ).order_by(ChatMessage.created_at.asc()))
+        messages = result.scalars().all()
         
         return [
             {
@@ -370,25 +692,31 @@ Only include items if they are clearly new issues or reactions. Return empty arr
             for message in messages
         ]
     
-    async def delete_chat_session(self, db: Session, session_id: int, user_id: int):
+    async def delete_chat_session(self, db: AsyncSession, session_id: int, user_id: int):
         """Delete a chat session and all its messages"""
         try:
             # Verify session belongs to user
-            session = db.query(ChatSession).filter(
+            result = await db.execute(select(ChatSession).where(
                 ChatSession.id == session_id,
                 ChatSession.user_id == user_id
-            ).first()
+            ))
+            session = result.scalars().first()
             
             if not session:
                 raise Exception("Chat session not found")
             
             # Delete all messages in the session
-            db.query(ChatMessage).filter(ChatMessage.session_id == session_id).delete()
+            await db.execute(delete(ChatMessage).where(ChatMessage.session_id == session_id))
             
             # Delete the session
-            db.delete(session)
-            db.commit()
+            await db.delete(session)
+            await db.commit()
+            total_counts.invalidate(user_id)
             
         except Exception as e:
-            db.rollback()
+            await db.rollback()
             raise Exception(f"Failed to delete chat session: {str(e)}")
+
+
+# Create global chat service instance
+gemini_chat_service = GeminiChatService()
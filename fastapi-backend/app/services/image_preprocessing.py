@@ -0,0 +1,125 @@
+import asyncio
+import io
+import logging
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Optional, Tuple
+
+from PIL import Image, ImageOps
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def preprocess_image(data: bytes, max_edge: int, quality: int) -> Tuple[bytes, Dict[str, Any]]:
+    """Shrink an uploaded photo to what Gemini actually needs.
+
+    Runs in a worker process, so it must stay a picklable module-level function.
+    JPEGs are decoded in draft mode, which lets libjpeg downscale by a power of
+    two while decoding instead of materialising the full-resolution bitmap.
+    """
+    started = time.perf_counter()
+
+    image = Image.open(io.BytesIO(data))
+    original_size = image.size
+    original_mime = Image.MIME.get(image.format, "image/jpeg")
+    if image.format == "JPEG":
+        image.draft("RGB", (max_edge, max_edge))
+
+    # Apply the EXIF orientation before resizing so the model sees it upright
+    image = ImageOps.exif_transpose(image)
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    image.thumbnail((max_edge, max_edge), Image.LANCZOS)
+
+    output = io.BytesIO()
+    image.save(output, format="JPEG", quality=quality, optimize=True)
+    processed = output.getvalue()
+
+    stats = {
+        "original_bytes": len(data),
+        "processed_bytes": len(processed),
+        "original_size": list(original_size),
+        "processed_size": list(image.size),
+        "mime_type": "image/jpeg",
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+    }
+
+    # Never make an already-small upload larger
+    if len(processed) >= len(data) and max(original_size) <= max_edge:
+        stats["processed_bytes"] = len(data)
+        stats["mime_type"] = original_mime
+        return data, stats
+    return processed, stats
+
+
+class ImagePreprocessor:
+    """Runs image preprocessing in a process pool and tracks the savings."""
+
+    def __init__(self, max_edge: int, quality: int, workers: int):
+        self.max_edge = max_edge
+        self.quality = quality
+        self.workers = workers
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._images = 0
+        self._bytes_in = 0
+        self._bytes_out = 0
+        self._elapsed_ms = 0.0
+
+    @property
+    def pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # Spawn rather than fork: the parent holds gRPC and executor threads
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._pool
+
+    async def process(self, data: bytes) -> Tuple[bytes, Dict[str, Any]]:
+        """Preprocess an upload without blocking the event loop."""
+        loop = asyncio.get_running_loop()
+        processed, stats = await loop.run_in_executor(
+            self.pool, preprocess_image, data, self.max_edge, self.quality
+        )
+
+        saved = stats["original_bytes"] - stats["processed_bytes"]
+        stats["bytes_saved"] = saved
+
+        self._images += 1
+        self._bytes_in += stats["original_bytes"]
+        self._bytes_out += stats["processed_bytes"]
+        self._elapsed_ms += stats["elapsed_ms"]
+
+        logger.info(
+            f"Preprocessed image {stats['original_size']} -> {stats['processed_size']}: "
+            f"{stats['original_bytes']} -> {stats['processed_bytes']} bytes "
+            f"(saved {saved}) in {stats['elapsed_ms']}ms"
+        )
+        return processed, stats
+
+    def stats(self) -> Dict[str, Any]:
+        """Get cumulative preprocessing counters."""
+        return {
+            "images": self._images,
+            "bytes_in": self._bytes_in,
+            "bytes_out": self._bytes_out,
+            "bytes_saved": self._bytes_in - self._bytes_out,
+            "avg_elapsed_ms": round(self._elapsed_ms / self._images, 1) if self._images else 0.0,
+        }
+
+    def shutdown(self):
+        """Stop the worker processes."""
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+# Create global preprocessor instance
+image_preprocessor = ImagePreprocessor(
+    max_edge=settings.IMAGE_MAX_EDGE,
+    quality=settings.IMAGE_JPEG_QUALITY,
+    workers=settings.IMAGE_PROCESS_WORKERS,
+)
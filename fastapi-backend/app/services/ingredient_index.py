@@ -0,0 +1,193 @@
+import hashlib
+import json
+import logging
+import mmap
+import os
+import re
+import struct
+import tempfile
+from typing import Any, Dict, List, Optional
+
+from app.services.allergen_matcher import normalize_inci
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+SOURCE_PATH = os.path.join(DATA_DIR, "inci_ingredients.json")
+INDEX_PATH = os.path.join(DATA_DIR, "inci_ingredients.idx")
+
+# Layout: magic, SHA-256 of the JSON source, entry count and key blob size,
+# then a table of fixed-width entries sorted by key bytes (key offset, key
+# length, record offset, record length), then the key blob and the JSON
+# record blob. Lookups binary-search the table in place.
+MAGIC = b"INCIIDX2"
+# Records are stored as bare JSON arrays in this field order; aliases live
+# only in the key table
+RECORD_FIELDS = ("name", "functions", "comedogenic", "irritant", "allergen_groups", "benefits")
+_HEADER = struct.Struct("<8s32sII")
+_ENTRY = struct.Struct("<IIII")
+
+# Splits an ingredient list into items; parentheses hold alternate names
+_ITEM_SEPARATORS = re.compile(r"[,;\n•|]+")
+_PARENTHESES = re.compile(r"\(([^)]*)\)")
+
+
+def source_digest(source_path: str = SOURCE_PATH) -> bytes:
+    """SHA-256 of the JSON source, stored in the index to detect staleness."""
+    with open(source_path, "rb") as fh:
+        return hashlib.sha256(fh.read()).digest()
+
+
+def build_index(source_path: str = SOURCE_PATH) -> bytes:
+    """Compile the JSON ingredient list into the binary index format."""
+    with open(source_path, "rb") as fh:
+        source = fh.read()
+    records = json.loads(source)
+
+    record_blob = bytearray()
+    keys: Dict[bytes, tuple] = {}
+    for record in records:
+        encoded = json.dumps(
+            [record.get(field) for field in RECORD_FIELDS], separators=(",", ":")
+        ).encode()
+        location = (len(record_blob), len(encoded))
+        record_blob += encoded
+        for name in [record["name"], *record.get("aliases", [])]:
+            key = normalize_inci(name).encode()
+            if key and key not in keys:
+                keys[key] = location
+
+    key_blob = bytearray()
+    table = bytearray()
+    for key in sorted(keys):
+        record_offset, record_length = keys[key]
+        table += _ENTRY.pack(len(key_blob), len(key), record_offset, record_length)
+        key_blob += key
+
+    header = _HEADER.pack(MAGIC, hashlib.sha256(source).digest(), len(keys), len(key_blob))
+    return header + bytes(table) + bytes(key_blob) + bytes(record_blob)
+
+
+def write_index(data: bytes, index_path: str = INDEX_PATH):
+    """Write the index atomically, so concurrent readers never map a partial file."""
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(index_path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            fh.write(data)
+        # mkstemp creates owner-only files; the index is meant to be shared
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, index_path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+def _indexed_digest(index_path: str) -> bytes:
+    """Source digest recorded in an existing index, or b"" if it is missing or unreadable."""
+    try:
+        with open(index_path, "rb") as fh:
+            header = fh.read(_HEADER.size)
+    except OSError:
+        return b""
+    if len(header) < _HEADER.size:
+        return b""
+    magic, digest, _, _ = _HEADER.unpack(header)
+    return digest if magic == MAGIC else b""
+
+
+class IngredientIndex:
+    """Read-only ingredient knowledge base keyed by normalized INCI name.
+
+    The compiled index is memory-mapped, so opening it costs no parsing and
+    pages are shared between worker processes; only the records that are
+    looked up get decoded.
+    """
+
+    def __init__(self, index_path: str = INDEX_PATH, source_path: str = SOURCE_PATH):
+        self.index_path = index_path
+        self.source_path = source_path
+        self._buffer = None
+        self._count = 0
+        self._keys_start = 0
+        self._records_start = 0
+
+    def open(self):
+        """Map the index, rebuilding it first if it doesn't match the JSON source.
+
+        Staleness is decided by the source digest stored in the index, not
+        file times, which are arbitrary after a checkout. Rebuilds replace
+        the file atomically, so workers starting together never see it
+        half written.
+        """
+        if self._buffer is not None:
+            return
+
+        if _indexed_digest(self.index_path) != source_digest(self.source_path):
+            data = build_index(self.source_path)
+            try:
+                write_index(data, self.index_path)
+            except OSError as e:
+                # Read-only deploys still work, just without sharing pages
+                logger.warning(f"Could not write ingredient index, using it in memory: {e}")
+                self._attach(data)
+                return
+
+        with open(self.index_path, "rb") as fh:
+            self._attach(mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ))
+
+    def _attach(self, buffer):
+        magic, _, count, keys_size = _HEADER.unpack_from(buffer, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{self.index_path} is not an ingredient index")
+        self._buffer = buffer
+        self._count = count
+        self._keys_start = _HEADER.size + count * _ENTRY.size
+        self._records_start = self._keys_start + keys_size
+
+    def _entry(self, position: int):
+        return _ENTRY.unpack_from(self._buffer, _HEADER.size + position * _ENTRY.size)
+
+    def lookup(self, name: str) -> Optional[Dict[str, Any]]:
+        """Return the record for an INCI name or alias, or None."""
+        self.open()
+        key = normalize_inci(name).encode()
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            key_offset, key_length, record_offset, record_length = self._entry(middle)
+            start = self._keys_start + key_offset
+            candidate = self._buffer[start:start + key_length]
+            if candidate == key:
+                start = self._records_start + record_offset
+                return dict(zip(RECORD_FIELDS, json.loads(self._buffer[start:start + record_length])))
+            if candidate < key:
+                low = middle + 1
+            else:
+                high = middle
+        return None
+
+    def analyze(self, ingredients: str) -> List[Dict[str, Any]]:
+        """Look up every item of an ingredient list, skipping unknown ones.
+
+        Items are comma separated; names in parentheses ("Parfum (Fragrance)")
+        and slash-separated names ("Aqua/Water") are tried as alternates.
+        Each known ingredient appears once.
+        """
+        found: Dict[str, Dict[str, Any]] = {}
+        for item in _ITEM_SEPARATORS.split(ingredients or ""):
+            base = _PARENTHESES.sub(" ", item)
+            alternates = [*_PARENTHESES.findall(item), *base.split("/")]
+            for name in [base, *alternates]:
+                record = self.lookup(name) if name.strip() else None
+                if record:
+                    found.setdefault(record["name"], record)
+                    break
+        return list(found.values())
+
+    def __len__(self) -> int:
+        self.open()
+        return self._count
+
+
+# Create global ingredient index instance
+ingredient_index = IngredientIndex()
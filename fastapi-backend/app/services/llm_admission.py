@@ -0,0 +1,248 @@
+import asyncio
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# User the current request acts for, set by the auth dependency. Calls made
+# without one (background jobs) wait for capacity instead of being refused.
+llm_user: ContextVar[Optional[int]] = ContextVar("llm_user", default=None)
+
+# Retry hint for calls refused by a concurrency limit; slots free up as calls finish
+CONCURRENCY_RETRY_SECONDS = 1.0
+# Leases outlive the call's deadline by this much before they count as leaked
+LEASE_GRACE_SECONDS = 5.0
+
+
+class LLMRateLimited(Exception):
+    """Raised when admission control refuses a Gemini call."""
+
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(f"Gemini call refused by {reason} limit, retry in {retry_after:.1f}s")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class LLMAdmission:
+    """Token-bucket and concurrency limits in front of every Gemini call.
+
+    Each call is admitted against a global, a per-user and a per-endpoint
+    request rate (token buckets holding ``burst_seconds`` worth of requests)
+    and against global and per-user concurrency limits, all or nothing.
+    The state lives in a small SQLite file so every uvicorn worker on the
+    host draws from the same budget; each decision is one short
+    ``BEGIN IMMEDIATE`` transaction. Concurrency slots are leases that
+    expire shortly after the call's deadline, so a crashed worker cannot
+    leak them. A rate of 0 or a concurrency of 0 disables that limit.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        global_rate: float,
+        global_concurrency: int,
+        user_rate: float,
+        user_concurrency: int,
+        endpoint_rates: Dict[str, float],
+        burst_seconds: float,
+    ):
+        self.path = path
+        self.global_rate = global_rate
+        self.global_concurrency = global_concurrency
+        self.user_rate = user_rate
+        self.user_concurrency = user_concurrency
+        self.endpoint_rates = endpoint_rates
+        self.burst_seconds = burst_seconds
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._admitted = 0
+        self._waited = 0
+        self._rejected: Dict[str, int] = {}
+        self._errors = 0
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(
+                self.path, timeout=5.0, isolation_level=None, check_same_thread=False
+            )
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS buckets "
+                "(key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS leases "
+                "(id TEXT PRIMARY KEY, user_key TEXT, expires REAL NOT NULL)"
+            )
+            self._conn = conn
+        return self._conn
+
+    def _buckets(self, endpoint: str, user_key: Optional[str]) -> List[Tuple[str, float]]:
+        buckets = [
+            ("global", self.global_rate),
+            (f"endpoint:{endpoint}", self.endpoint_rates.get(endpoint, 0)),
+        ]
+        if user_key:
+            buckets.append((user_key, self.user_rate))
+        return [(key, rate) for key, rate in buckets if rate > 0]
+
+    def _decide(
+        self, endpoint: str, user_key: Optional[str], lease_seconds: float, reserve: bool
+    ) -> Tuple[Optional[str], str, float]:
+        """Make one admission decision; returns ``(lease_id, refused_by, retry_after)``.
+
+        With ``reserve`` an admitted call takes a token from every bucket
+        and a lease; otherwise the state is only inspected.
+        """
+        now = time.time()
+        refused_by, retry_after = "", 0.0
+        lease_id = None
+        with self._lock:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute("DELETE FROM leases WHERE expires < ?", (now,))
+                limits = [("global_concurrency", self.global_concurrency, "SELECT COUNT(*) FROM leases", ())]
+                if user_key:
+                    limits.append((
+                        "user_concurrency", self.user_concurrency,
+                        "SELECT COUNT(*) FROM leases WHERE user_key = ?", (user_key,)
+                    ))
+                for name, limit, query, params in limits:
+                    if limit and conn.execute(query, params).fetchone()[0] >= limit:
+                        refused_by, retry_after = name, CONCURRENCY_RETRY_SECONDS
+
+                refilled = []
+                for key, rate in self._buckets(endpoint, user_key):
+                    capacity = max(rate * self.burst_seconds / 60, 1.0)
+                    row = conn.execute(
+                        "SELECT tokens, updated FROM buckets WHERE key = ?", (key,)
+                    ).fetchone()
+                    tokens = capacity if row is None else min(capacity, row[0] + (now - row[1]) * rate / 60)
+                    if tokens < 1 and (1 - tokens) * 60 / rate > retry_after:
+                        refused_by = f"{key.split(':')[0]}_rate"
+                        retry_after = (1 - tokens) * 60 / rate
+                    refilled.append((key, tokens))
+
+                if reserve and not refused_by:
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO buckets (key, tokens, updated) VALUES (?, ?, ?)",
+                        [(key, tokens - 1, now) for key, tokens in refilled]
+                    )
+                    lease_id = uuid.uuid4().hex
+                    conn.execute(
+                        "INSERT INTO leases (id, user_key, expires) VALUES (?, ?, ?)",
+                        (lease_id, user_key, now + lease_seconds)
+                    )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return lease_id, refused_by, retry_after
+
+    def _release(self, lease_id: str):
+        with self._lock:
+            self._connection().execute("DELETE FROM leases WHERE id = ?", (lease_id,))
+
+    async def _try(
+        self, endpoint: str, user_key: Optional[str], lease_seconds: float, reserve: bool
+    ) -> Tuple[Optional[str], str, float]:
+        try:
+            return await asyncio.to_thread(self._decide, endpoint, user_key, lease_seconds, reserve)
+        except sqlite3.Error as e:
+            # A broken limiter must not take Gemini down with it
+            self._errors += 1
+            logger.warning(f"LLM admission state unavailable, admitting call: {e}")
+            return None, "", 0.0
+
+    def _refuse(self, refused_by: str, retry_after: float) -> LLMRateLimited:
+        self._rejected[refused_by] = self._rejected.get(refused_by, 0) + 1
+        return LLMRateLimited(refused_by, retry_after)
+
+    @staticmethod
+    def _user_key() -> Optional[str]:
+        user_id = llm_user.get()
+        return f"user:{user_id}" if user_id is not None else None
+
+    async def check(self, endpoint: str):
+        """Raise ``LLMRateLimited`` now if a call for the current user would be refused.
+
+        Lets endpoints turn a request away before doing any work for it; the
+        call itself is still admitted by ``admit``.
+        """
+        _, refused_by, retry_after = await self._try(endpoint, self._user_key(), 0, False)
+        if refused_by:
+            raise self._refuse(refused_by, retry_after)
+
+    @asynccontextmanager
+    async def admit(self, endpoint: str, timeout: float) -> AsyncIterator[None]:
+        """Hold an admission slot for one Gemini call with deadline ``timeout``.
+
+        Calls on behalf of a user are refused immediately with
+        ``LLMRateLimited``; background calls wait for capacity for up to
+        ``timeout`` before giving up.
+        """
+        user_key = self._user_key()
+        deadline = time.monotonic() + timeout
+        while True:
+            lease_id, refused_by, retry_after = await self._try(
+                endpoint, user_key, timeout + LEASE_GRACE_SECONDS, True
+            )
+            if not refused_by:
+                break
+            if user_key or time.monotonic() + retry_after > deadline:
+                raise self._refuse(refused_by, retry_after)
+            self._waited += 1
+            await asyncio.sleep(retry_after)
+
+        self._admitted += 1
+        try:
+            yield
+        finally:
+            if lease_id is not None:
+                try:
+                    await asyncio.to_thread(self._release, lease_id)
+                except sqlite3.Error as e:
+                    # The lease expires on its own
+                    logger.warning(f"Could not release LLM admission lease: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Get limits and admission counters for this worker."""
+        return {
+            "limits": {
+                "global_rate_per_minute": self.global_rate,
+                "global_max_concurrency": self.global_concurrency,
+                "user_rate_per_minute": self.user_rate,
+                "user_max_concurrency": self.user_concurrency,
+                "endpoint_rate_per_minute": dict(self.endpoint_rates),
+                "burst_seconds": self.burst_seconds,
+            },
+            "admitted": self._admitted,
+            "waited": self._waited,
+            "rejected": dict(self._rejected),
+            "state_errors": self._errors,
+        }
+
+
+# Create global admission control instance
+llm_admission = LLMAdmission(
+    path=settings.LLM_ADMISSION_STATE_PATH
+    or os.path.join(tempfile.gettempdir(), "skinsense_llm_admission.db"),
+    global_rate=settings.LLM_GLOBAL_RATE_PER_MINUTE,
+    global_concurrency=settings.LLM_GLOBAL_MAX_CONCURRENCY,
+    user_rate=settings.LLM_USER_RATE_PER_MINUTE,
+    user_concurrency=settings.LLM_USER_MAX_CONCURRENCY,
+    endpoint_rates=settings.LLM_ENDPOINT_RATE_PER_MINUTE,
+    burst_seconds=settings.LLM_BURST_SECONDS,
+)
@@ -0,0 +1,337 @@
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, AsyncIterator, Dict, Optional
+
+from google.api_core import exceptions as google_exceptions
+
+from app.core.config import settings
+from app.services.llm_admission import llm_admission
+from app.services.llm_resilience import (
+    CircuitBreaker,
+    LLMTimeoutError,
+    LLMUnavailableError,
+    RetryPolicy,
+    is_transient,
+)
+from app.services.prompt_budget import prompt_budget
+
+logger = logging.getLogger(__name__)
+
+
+class LLMGateway:
+    """Shared async entry point for every Gemini call.
+
+    The google-generativeai SDK is blocking, so calls are run on a dedicated,
+    bounded thread pool instead of the event loop. Each call gets a deadline
+    for its use case (endpoint) that covers every attempt and is enforced
+    both on the awaiting side and inside the SDK request. Transient failures
+    are retried with jittered backoff while the deadline allows, a circuit
+    breaker per model fails calls fast while Gemini is degraded, and every
+    attempt must first be admitted by ``llm_admission``.
+    """
+
+    def __init__(
+        self,
+        max_workers: int,
+        default_timeout: float,
+        timeouts: Dict[str, float],
+        retry: RetryPolicy,
+        breaker_threshold: int,
+        breaker_reset_seconds: float,
+    ):
+        self.max_workers = max_workers
+        self.default_timeout = default_timeout
+        self.timeouts = timeouts
+        self.retry = retry
+        self.breaker_threshold = breaker_threshold
+        self.breaker_reset_seconds = breaker_reset_seconds
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._in_flight = 0
+        self._completed = 0
+        self._timeouts = 0
+        self._retries = 0
+        self._hedges = 0
+        self._hedge_wins = 0
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        """Lazily create the worker pool so importing the module stays cheap."""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix="gemini"
+            )
+        return self._executor
+
+    def timeout_for(self, endpoint: str) -> float:
+        """Deadline in seconds for one call (all attempts) on ``endpoint``."""
+        return self.timeouts.get(endpoint, self.default_timeout)
+
+    def breaker(self, model) -> CircuitBreaker:
+        name = getattr(model, "model_name", "gemini")
+        breaker = self._breakers.get(name)
+        if breaker is None:
+            breaker = self._breakers[name] = CircuitBreaker(
+                self.breaker_threshold, self.breaker_reset_seconds
+            )
+        return breaker
+
+    async def _backoff(self, error: Exception, attempt: int, deadline: float):
+        """Sleep before the next attempt, or re-raise ``error`` when out of retries or time."""
+        delay = self.retry.backoff(attempt)
+        if attempt >= self.retry.max_retries or time.monotonic() + delay >= deadline:
+            raise error
+        self._retries += 1
+        logger.warning(f"Gemini call failed, retry {attempt + 1} in {delay:.2f}s: {error}")
+        await asyncio.sleep(delay)
+
+    async def generate(
+        self,
+        model,
+        contents: Any,
+        *,
+        timeout: Optional[float] = None,
+        endpoint: str = "other",
+        hedge_after: Optional[float] = None,
+        **kwargs,
+    ):
+        """Run ``model.generate_content`` off the event loop with a deadline.
+
+        ``timeout`` overrides the endpoint's deadline. With ``hedge_after``,
+        an attempt still running after that many seconds gets a duplicate
+        request and the first answer wins. Token usage reported by Gemini is
+        recorded under ``endpoint``. Raises ``LLMRateLimited`` when admission
+        control refuses the call and ``LLMUnavailableError`` while the
+        circuit is open.
+        """
+        timeout = timeout or self.timeout_for(endpoint)
+        deadline = time.monotonic() + timeout
+        breaker = self.breaker(model)
+
+        attempt = 0
+        while True:
+            breaker.allow()
+            try:
+                if hedge_after and deadline - time.monotonic() > hedge_after:
+                    response = await self._hedged(model, contents, endpoint, deadline, hedge_after, kwargs)
+                else:
+                    response = await self._attempt(model, contents, endpoint, deadline, kwargs)
+            except Exception as e:
+                if not is_transient(e):
+                    breaker.record_ignored()
+                    raise
+                breaker.record_failure()
+                await self._backoff(e, attempt, deadline)
+                attempt += 1
+                continue
+            except BaseException:
+                breaker.record_ignored()
+                raise
+            breaker.record_success()
+            return response
+
+    async def _attempt(self, model, contents: Any, endpoint: str, deadline: float, kwargs: Dict[str, Any]):
+        """One admitted ``generate_content`` call with what's left of the deadline."""
+        remaining = deadline - time.monotonic()
+        async with llm_admission.admit(endpoint, remaining):
+            remaining = deadline - time.monotonic()
+            loop = asyncio.get_running_loop()
+            request_options = {**kwargs.get("request_options", {}), "timeout": remaining}
+            call = partial(model.generate_content, contents, **{**kwargs, "request_options": request_options})
+
+            self._in_flight += 1
+            try:
+                response = await asyncio.wait_for(
+                    loop.run_in_executor(self.executor, call), timeout=remaining
+                )
+                prompt_budget.record_usage(endpoint, getattr(response, "usage_metadata", None))
+                return response
+            except (asyncio.TimeoutError, google_exceptions.DeadlineExceeded):
+                # The SDK's own request timeout is the same deadline and often fires first
+                self._timeouts += 1
+                raise LLMTimeoutError(f"Gemini call exceeded its deadline on {endpoint}")
+            finally:
+                self._in_flight -= 1
+                self._completed += 1
+
+    async def _hedged(
+        self, model, contents: Any, endpoint: str, deadline: float, hedge_after: float, kwargs: Dict[str, Any]
+    ):
+        """Race a second attempt against a slow first one; the first success wins.
+
+        The loser is cancelled (its SDK request runs out on its own timeout).
+        If both fail, the first attempt's error is raised.
+        """
+        primary = asyncio.ensure_future(self._attempt(model, contents, endpoint, deadline, kwargs))
+        attempts = {primary}
+        try:
+            done, _ = await asyncio.wait(attempts, timeout=hedge_after)
+            if not done:
+                self._hedges += 1
+                attempts.add(asyncio.ensure_future(
+                    self._attempt(model, contents, endpoint, deadline, kwargs)
+                ))
+            pending = attempts
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        self._hedge_wins += task is not primary
+                        return task.result()
+            return primary.result()
+        finally:
+            for task in attempts:
+                if not task.done():
+                    task.cancel()
+                else:
+                    # Mark a losing attempt's error as seen
+                    task.exception()
+
+    async def stream(
+        self,
+        model,
+        contents: Any,
+        *,
+        timeout: Optional[float] = None,
+        endpoint: str = "other",
+        **kwargs,
+    ) -> AsyncIterator[str]:
+        """Stream text chunks from ``model.generate_content(stream=True)``.
+
+        The SDK iterator is consumed on a worker thread and chunks are handed
+        back to the event loop as they arrive. The deadline covers the whole
+        stream, not each chunk. Transient failures are retried only until
+        the first chunk has been yielded. Token usage is recorded under
+        ``endpoint``. Admission is decided before each attempt starts, so
+        ``LLMRateLimited`` is raised before the first chunk.
+        """
+        timeout = timeout or self.timeout_for(endpoint)
+        deadline = time.monotonic() + timeout
+        breaker = self.breaker(model)
+
+        attempt = 0
+        while True:
+            breaker.allow()
+            received_any = False
+            try:
+                async for text in self._stream_attempt(model, contents, endpoint, deadline, kwargs):
+                    received_any = True
+                    yield text
+            except Exception as e:
+                if not is_transient(e):
+                    breaker.record_ignored()
+                    raise
+                breaker.record_failure()
+                if received_any:
+                    raise
+                await self._backoff(e, attempt, deadline)
+                attempt += 1
+                continue
+            except BaseException:
+                breaker.record_ignored()
+                raise
+            breaker.record_success()
+            return
+
+    async def _stream_attempt(
+        self, model, contents: Any, endpoint: str, deadline: float, kwargs: Dict[str, Any]
+    ) -> AsyncIterator[str]:
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        done = object()
+        cancelled = threading.Event()
+        usage = []
+
+        async with llm_admission.admit(endpoint, deadline - time.monotonic()):
+            request_options = {
+                **kwargs.get("request_options", {}), "timeout": deadline - time.monotonic()
+            }
+            call_kwargs = {**kwargs, "request_options": request_options}
+
+            def produce():
+                try:
+                    response = model.generate_content(contents, stream=True, **call_kwargs)
+                    for chunk in response:
+                        if cancelled.is_set():
+                            break
+                        # The final chunk carries the totals for the whole response
+                        if getattr(chunk, "usage_metadata", None) is not None:
+                            usage[:] = [chunk.usage_metadata]
+                        try:
+                            text = chunk.text
+                        except ValueError:
+                            # Chunks without text parts (e.g. safety blocks) are skipped
+                            continue
+                        if text:
+                            loop.call_soon_threadsafe(queue.put_nowait, text)
+                except Exception as e:
+                    loop.call_soon_threadsafe(queue.put_nowait, e)
+                finally:
+                    loop.call_soon_threadsafe(queue.put_nowait, done)
+
+            self._in_flight += 1
+            producer = loop.run_in_executor(self.executor, produce)
+            try:
+                while True:
+                    remaining = deadline - time.monotonic()
+                    try:
+                        item = await asyncio.wait_for(queue.get(), timeout=max(remaining, 0))
+                    except asyncio.TimeoutError:
+                        self._timeouts += 1
+                        raise LLMTimeoutError(f"Gemini stream exceeded its deadline on {endpoint}")
+                    if item is done:
+                        if usage:
+                            prompt_budget.record_usage(endpoint, usage[0])
+                        break
+                    if isinstance(item, google_exceptions.DeadlineExceeded):
+                        self._timeouts += 1
+                        raise LLMTimeoutError(f"Gemini stream exceeded its deadline on {endpoint}")
+                    if isinstance(item, Exception):
+                        raise item
+                    yield item
+            finally:
+                cancelled.set()
+                self._in_flight -= 1
+                self._completed += 1
+                producer.add_done_callback(lambda f: f.exception())
+
+    def stats(self) -> Dict[str, Any]:
+        """Get gateway usage counters."""
+        return {
+            "max_workers": self.max_workers,
+            "default_timeout": self.default_timeout,
+            "timeouts_by_endpoint": dict(self.timeouts),
+            "in_flight": self._in_flight,
+            "completed": self._completed,
+            "timeouts": self._timeouts,
+            "retries": self._retries,
+            "hedges": self._hedges,
+            "hedge_wins": self._hedge_wins,
+            "breakers": {name: breaker.stats() for name, breaker in self._breakers.items()},
+        }
+
+    def shutdown(self):
+        """Stop accepting work and release the worker threads."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+            logger.info("LLM gateway executor shut down")
+
+
+# Create global gateway instance
+llm_gateway = LLMGateway(
+    max_workers=settings.GEMINI_MAX_WORKERS,
+    default_timeout=settings.GEMINI_TIMEOUT_SECONDS,
+    timeouts=settings.GEMINI_ENDPOINT_TIMEOUT_SECONDS,
+    retry=RetryPolicy(
+        max_retries=settings.GEMINI_MAX_RETRIES,
+        base_delay=settings.GEMINI_RETRY_BASE_SECONDS,
+        max_delay=settings.GEMINI_RETRY_MAX_SECONDS,
+    ),
+    breaker_threshold=settings.GEMINI_BREAKER_FAILURE_THRESHOLD,
+    breaker_reset_seconds=settings.GEMINI_BREAKER_RESET_SECONDS,
+)
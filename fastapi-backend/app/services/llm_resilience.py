@@ -0,0 +1,116 @@
+import random
+import time
+from typing import Any, Dict, Optional
+
+from google.api_core import exceptions as google_exceptions
+
+
+class LLMTimeoutError(Exception):
+    """Raised when a Gemini call does not finish within its deadline."""
+
+
+class LLMUnavailableError(Exception):
+    """Raised without calling Gemini while its circuit breaker is open.
+
+    Callers also raise it for transient upstream errors that outlasted the retries.
+    """
+
+    def __init__(self, retry_after: float, reason: Optional[str] = None):
+        super().__init__(reason or f"Gemini is unavailable, circuit open for another {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+
+# Failures worth another attempt: deadlines, upstream 5xx and 429s, dropped connections.
+# Bad requests, safety blocks and our own admission refusals are not retried.
+TRANSIENT_ERRORS = (
+    LLMTimeoutError,
+    google_exceptions.InternalServerError,
+    google_exceptions.BadGateway,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.GatewayTimeout,
+    google_exceptions.DeadlineExceeded,
+    google_exceptions.TooManyRequests,
+    ConnectionError,
+)
+
+
+def is_transient(error: BaseException) -> bool:
+    """Whether ``error`` says the upstream is struggling rather than the request is bad."""
+    return isinstance(error, TRANSIENT_ERRORS)
+
+
+class RetryPolicy:
+    """Bounded retries with capped exponential backoff and full jitter.
+
+    Attempt ``n`` (0-based) waits a random time between 0 and
+    ``min(max_delay, base_delay * 2 ** n)``, so clients that failed together
+    don't come back together.
+    """
+
+    def __init__(self, max_retries: int, base_delay: float, max_delay: float):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+
+class CircuitBreaker:
+    """Fails Gemini calls fast once the upstream looks degraded.
+
+    After ``failure_threshold`` transient failures in a row the breaker
+    opens and calls raise ``LLMUnavailableError`` immediately. After
+    ``reset_seconds`` one probe call is let through (half-open): success
+    closes the breaker, failure opens it again. State is per worker and
+    only touched from the event loop, so it needs no lock.
+    """
+
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._opened = 0
+        self._short_circuited = 0
+
+    def allow(self):
+        """Raise ``LLMUnavailableError`` unless a call may go upstream now."""
+        if self.state == "open":
+            remaining = self._opened_at + self.reset_seconds - time.monotonic()
+            if remaining > 0:
+                self._short_circuited += 1
+                raise LLMUnavailableError(remaining)
+            self.state = "half_open"
+        if self.state == "half_open":
+            if self._probing:
+                self._short_circuited += 1
+                raise LLMUnavailableError(self.reset_seconds)
+            self._probing = True
+
+    def record_success(self):
+        self.state = "closed"
+        self._failures = 0
+        self._probing = False
+
+    def record_failure(self):
+        self._probing = False
+        self._failures += 1
+        if self.state == "half_open" or self._failures >= self.failure_threshold:
+            self.state = "open"
+            self._opened_at = time.monotonic()
+            self._opened += 1
+
+    def record_ignored(self):
+        """The call ended without telling anything about the upstream (e.g. a bad request)."""
+        self._probing = False
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self._failures,
+            "opened": self._opened,
+            "short_circuited": self._short_circuited,
+        }
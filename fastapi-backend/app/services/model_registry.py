@@ -0,0 +1,174 @@
+import logging
+import random
+import threading
+from typing import Any, Dict, Optional, Protocol
+
+import google.generativeai as genai
+from google.generativeai import client as genai_client
+
+from app.core.config import settings
+from app.services.fake_llm import FakeGenerativeModel, LatencyModel
+
+logger = logging.getLogger(__name__)
+
+
+class LLMModel(Protocol):
+    """What the LLM gateway needs from a model backend.
+
+    ``generate_content`` blocks and returns an object with ``text`` and
+    ``usage_metadata``; with ``stream=True`` iterating it yields chunks
+    shaped the same way. ``genai.GenerativeModel`` and
+    ``FakeGenerativeModel`` both qualify.
+    """
+
+    model_name: str
+
+    def generate_content(
+        self,
+        contents: Any,
+        *,
+        stream: bool = False,
+        generation_config: Any = None,
+        request_options: Optional[Dict[str, Any]] = None,
+    ) -> Any:
+        ...
+
+
+class FakeModelSettings:
+    """Latency, error and streaming knobs for the offline fake backend."""
+
+    def __init__(
+        self,
+        latency_distribution: str,
+        latency_ms: Dict[str, float],
+        latency_jitter: float,
+        error_rate: float,
+        stream_chunk_chars: int,
+        stream_chunk_delay_ms: float,
+        seed: int,
+    ):
+        self.latency_distribution = latency_distribution
+        self.latency_ms = latency_ms
+        self.latency_jitter = latency_jitter
+        self.error_rate = error_rate
+        self.stream_chunk_chars = stream_chunk_chars
+        self.stream_chunk_delay_ms = stream_chunk_delay_ms
+        self.rng = random.Random(seed)
+        self.rng_lock = threading.Lock()
+
+    def create(self, use_case: str) -> FakeGenerativeModel:
+        return FakeGenerativeModel(
+            model_name=f"fake-{use_case}",
+            latency=LatencyModel(
+                self.latency_distribution,
+                self.latency_ms.get(use_case, 0.0),
+                self.latency_jitter,
+                self.rng,
+            ),
+            error_rate=self.error_rate,
+            stream_chunk_chars=self.stream_chunk_chars,
+            stream_chunk_delay_ms=self.stream_chunk_delay_ms,
+            rng=self.rng,
+            rng_lock=self.rng_lock,
+        )
+
+
+class GeminiModelRegistry:
+    """Process-wide Gemini configuration and model instances.
+
+    ``genai.configure`` drops the SDK's cached API clients, so configuring
+    per request or per service instance throws away the connection to the
+    API every time. The registry configures the SDK once and hands out one
+    ``GenerativeModel`` per model name; they all share the SDK's default
+    generative client and with it one transport. Each use case (chat,
+    vision, extraction) picks its model name from settings.
+
+    With the "fake" backend every use case gets its own
+    ``FakeGenerativeModel`` instead and the SDK is never configured, so the
+    whole app runs offline (e.g. for load tests).
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        transport: str,
+        model_names: Dict[str, str],
+        backend: str = "gemini",
+        fake: Optional[FakeModelSettings] = None,
+    ):
+        self.api_key = api_key
+        self.transport = transport
+        self.model_names = model_names
+        self.backend = backend
+        self.fake = fake
+        self._models: Dict[str, LLMModel] = {}
+        self._configured = False
+        self._lock = threading.Lock()
+
+    def configure(self):
+        """Configure the SDK once for the whole process."""
+        with self._lock:
+            if self._configured:
+                return
+            genai.configure(api_key=self.api_key, transport=self.transport or None)
+            self._configured = True
+
+    def get(self, use_case: str) -> LLMModel:
+        """Return the shared model for ``use_case`` ("chat", "vision", "extraction")."""
+        # Fakes differ per use case (latency), real models only per name
+        key = use_case if self.backend == "fake" else self.model_names[use_case]
+        model = self._models.get(key)
+        if model is None:
+            if self.backend != "fake":
+                self.configure()
+            with self._lock:
+                model = self._models.get(key)
+                if model is None:
+                    if self.backend == "fake":
+                        model = self.fake.create(use_case)
+                    else:
+                        model = genai.GenerativeModel(key)
+                    self._models[key] = model
+        return model
+
+    def warm(self):
+        """Create every model and the API client up front, at startup."""
+        for use_case in self.model_names:
+            self.get(use_case)
+        if self.backend == "fake":
+            logger.warning("Using the fake LLM backend; no Gemini calls will be made")
+            return
+        genai_client.get_default_generative_client()
+        logger.info(f"Gemini models ready: {self.model_names}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Get the configured models per use case."""
+        return {
+            "backend": self.backend,
+            "configured": self._configured,
+            "transport": self.transport or "default",
+            "models": dict(self.model_names),
+            "instances": len(self._models),
+        }
+
+
+# Create global model registry instance
+gemini_models = GeminiModelRegistry(
+    api_key=settings.GEMINI_API_KEY,
+    transport=settings.GEMINI_TRANSPORT,
+    model_names={
+        "chat": settings.GEMINI_CHAT_MODEL,
+        "vision": settings.GEMINI_VISION_MODEL,
+        "extraction": settings.GEMINI_EXTRACTION_MODEL,
+    },
+    backend=settings.LLM_BACKEND,
+    fake=FakeModelSettings(
+        latency_distribution=settings.FAKE_LLM_LATENCY_DISTRIBUTION,
+        latency_ms=settings.FAKE_LLM_LATENCY_MS,
+        latency_jitter=settings.FAKE_LLM_LATENCY_JITTER,
+        error_rate=settings.FAKE_LLM_ERROR_RATE,
+        stream_chunk_chars=settings.FAKE_LLM_STREAM_CHUNK_CHARS,
+        stream_chunk_delay_ms=settings.FAKE_LLM_STREAM_CHUNK_DELAY_MS,
+        seed=settings.FAKE_LLM_SEED,
+    ),
+)
@@ -0,0 +1,150 @@
+import logging
+from typing import Any, Dict, List, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Gemini averages about 4 characters per token for English prose
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough Gemini token count for budgeting."""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+class PromptSection:
+    """One named part of a prompt (profile, history, instructions, ...).
+
+    ``priority`` orders trimming: lower priorities are trimmed first and
+    ``None`` marks a section that is never trimmed, like the instructions
+    or the user's message. ``keep`` says which end of an over-long section
+    survives: "head" for profiles, "tail" for chronological history.
+    ``header`` is rendered above the text and dropped with it.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        text: str,
+        priority: Optional[int] = None,
+        keep: str = "head",
+        header: str = ""
+    ):
+        self.name = name
+        self.text = (text or "").strip()
+        self.priority = priority
+        self.keep = keep
+        self.header = header
+
+    @property
+    def tokens(self) -> int:
+        return estimate_tokens(self.header + self.text) if self.text else 0
+
+    def trim(self, excess: int) -> int:
+        """Shrink the text by about ``excess`` tokens; returns the tokens freed."""
+        before = self.tokens
+        chars = max(len(self.text) - excess * CHARS_PER_TOKEN, 0)
+        if self.keep == "tail":
+            text = self.text[len(self.text) - chars:]
+            # Start on a whole line (message) when there is one
+            if "\n" in text[:-1]:
+                text = text[text.index("\n") + 1:]
+        else:
+            text = self.text[:chars]
+        self.text = text.strip()
+        return before - self.tokens
+
+    def render(self) -> str:
+        return f"{self.header}{self.text}"
+
+
+class PromptBudget:
+    """Assembles prompts from sections within a per-endpoint token budget.
+
+    When the estimated size exceeds the endpoint's budget, the
+    lowest-priority sections are trimmed first. Estimated section sizes
+    and the real input/output token counts from Gemini's usage metadata
+    are tracked per endpoint.
+    """
+
+    def __init__(self, budgets: Dict[str, int]):
+        self.budgets = budgets
+        self._endpoints: Dict[str, Dict[str, Any]] = {}
+
+    def _counters(self, endpoint: str) -> Dict[str, Any]:
+        return self._endpoints.setdefault(endpoint, {
+            "prompts": 0,
+            "trimmed": 0,
+            "estimated_tokens": 0,
+            "sections": {},
+            "calls": 0,
+            "input_tokens": 0,
+            "output_tokens": 0,
+        })
+
+    def build(self, endpoint: str, sections: List[PromptSection]) -> str:
+        """Render ``sections`` in order, trimmed to fit ``endpoint``'s budget."""
+        budget = self.budgets.get(endpoint)
+        excess = sum(section.tokens for section in sections) - budget if budget else 0
+        trimmed = excess > 0
+        for section in sorted(
+            (section for section in sections if section.priority is not None),
+            key=lambda section: section.priority
+        ):
+            if excess <= 0:
+                break
+            excess -= section.trim(excess)
+        if excess > 0:
+            logger.warning(f"{endpoint} prompt is {excess} tokens over budget after trimming")
+
+        counters = self._counters(endpoint)
+        counters["prompts"] += 1
+        counters["trimmed"] += trimmed
+        for section in sections:
+            counters["sections"][section.name] = counters["sections"].get(section.name, 0) + section.tokens
+            counters["estimated_tokens"] += section.tokens
+
+        return "\n\n".join(section.render() for section in sections if section.text)
+
+    def record_usage(self, endpoint: str, usage_metadata) -> None:
+        """Add the token counts Gemini reported for one call."""
+        if usage_metadata is None:
+            return
+        counters = self._counters(endpoint)
+        counters["calls"] += 1
+        counters["input_tokens"] += getattr(usage_metadata, "prompt_token_count", 0) or 0
+        counters["output_tokens"] += getattr(usage_metadata, "candidates_token_count", 0) or 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Get per-endpoint prompt sizes and token usage."""
+        stats = {}
+        for endpoint, counters in self._endpoints.items():
+            prompts = counters["prompts"] or 1
+            calls = counters["calls"] or 1
+            stats[endpoint] = {
+                "budget": self.budgets.get(endpoint),
+                "prompts": counters["prompts"],
+                "trimmed": counters["trimmed"],
+                "avg_estimated_tokens": round(counters["estimated_tokens"] / prompts),
+                "avg_section_tokens": {
+                    name: round(tokens / prompts) for name, tokens in counters["sections"].items()
+                },
+                "calls": counters["calls"],
+                "input_tokens": counters["input_tokens"],
+                "output_tokens": counters["output_tokens"],
+                "avg_input_tokens": round(counters["input_tokens"] / calls),
+                "avg_output_tokens": round(counters["output_tokens"] / calls),
+            }
+        return stats
+
+
+# Create global prompt budget instance
+prompt_budget = PromptBudget({
+    "chat": settings.PROMPT_BUDGET_CHAT,
+    "chat_extraction": settings.PROMPT_BUDGET_EXTRACTION,
+    "chat_insights": settings.PROMPT_BUDGET_EXTRACTION,
+    "chat_summary": settings.PROMPT_BUDGET_SUMMARY,
+    "product_analysis": settings.PROMPT_BUDGET_ANALYSIS,
+})
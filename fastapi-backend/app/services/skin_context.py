@@ -0,0 +1,137 @@
+import logging
+from typing import Any, Dict
+
+from sqlalchemy import and_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.cache import LRUCache
+from app.core.config import settings
+from app.models.skin_memory import UserAllergen, SkinIssue
+from app.models.user import User
+from app.services.allergen_matcher import AllergenMatcher
+
+logger = logging.getLogger(__name__)
+
+
+class SkinContextCache:
+    """Per-user cache of the skin profile data that goes into every prompt.
+
+    Holds the allergen/issue dicts and the compiled allergen matcher used by
+    product analysis together with the rendered context strings used by chat,
+    so a hot user costs no queries and no matcher rebuilds.
+    Every write to allergens, issues or the user's skin fields must call
+    ``invalidate``; the TTL only bounds staleness across worker processes.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self._cache = LRUCache(maxsize=maxsize, ttl=ttl)
+        self.invalidations = 0
+
+    async def get(self, db: AsyncSession, user_id: int) -> Dict[str, Any]:
+        """Return the user's skin context, loading it on a miss."""
+        context = self._cache.get(user_id)
+        if context is None:
+            context = await self._load(db, user_id)
+            self._cache.set(user_id, context)
+        return context
+
+    def invalidate(self, user_id: int):
+        """Drop the cached context after any write that changes it."""
+        self._cache.delete(user_id)
+        self.invalidations += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Get hit/miss counters."""
+        return {**self._cache.stats(), "invalidations": self.invalidations}
+
+    async def _load(self, db: AsyncSession, user_id: int) -> Dict[str, Any]:
+        user = await db.get(User, user_id)
+
+        result = await db.execute(select(UserAllergen).where(
+            and_(
+                UserAllergen.user_id == user_id,
+                UserAllergen.is_active == True
+            )
+        ).order_by(UserAllergen.first_detected.desc()))
+        allergens = result.scalars().all()
+
+        result = await db.execute(select(SkinIssue).where(
+            SkinIssue.user_id == user_id
+        ).order_by(SkinIssue.last_updated.desc()))
+        issues = result.scalars().all()
+
+        allergen_data = [{
+            "ingredient_name": a.ingredient_name,
+            "severity": a.severity,
+            "confirmed": a.confirmed,
+            "notes": a.notes
+        } for a in allergens]
+
+        issue_data = [{
+            "issue_type": i.issue_type,
+            "description": i.description,
+            "severity": i.severity,
+            "status": i.status,
+            "triggers": i.triggers or []
+        } for i in issues]
+
+        skin_type = user.skin_type if user else None
+        skin_concerns = user.skin_concerns if user else None
+
+        return {
+            "skin_type": skin_type,
+            "skin_concerns": skin_concerns,
+            "allergens": allergen_data,
+            "allergen_matcher": AllergenMatcher(allergen_data),
+            "issues": issue_data,
+            "enhanced_skin_concerns": self._render_enhanced_concerns(
+                skin_concerns, allergen_data, issue_data
+            ),
+            "user_context": self._render_user_context(
+                skin_type, skin_concerns, allergen_data, issue_data
+            ),
+        }
+
+    @staticmethod
+    def _render_enhanced_concerns(skin_concerns, allergens, issues) -> str:
+        """Concerns plus allergens and issues, as sent with each chat turn."""
+        allergen_context = ""
+        if allergens:
+            allergen_list = [f"{a['ingredient_name']} ({a['severity']})" for a in allergens]
+            allergen_context = f"Known Allergens: {', '.join(allergen_list)}"
+
+        issue_context = ""
+        if issues:
+            issue_list = [f"{i['issue_type']} (severity: {i['severity']}/10)" for i in issues]
+            issue_context = f"Current Issues: {', '.join(issue_list)}"
+
+        return f"{skin_concerns or ''}\n{allergen_context}\n{issue_context}".strip()
+
+    @staticmethod
+    def _render_user_context(skin_type, skin_concerns, allergens, issues) -> str:
+        """Full skin profile block used by the chat service prompt."""
+        allergen_list = []
+        for allergen in allergens:
+            status = "confirmed" if allergen["confirmed"] else "unconfirmed"
+            allergen_list.append(f"{allergen['ingredient_name']} ({allergen['severity']} severity, {status})")
+
+        issue_list = []
+        for issue in issues:
+            issue_list.append(f"{issue['issue_type']} (severity: {issue['severity']}/10, status: {issue['status']})")
+
+        return f"""
+User's Skin Profile:
+- Skin Type: {skin_type or 'Not specified'}
+- Skin Concerns: {skin_concerns or 'Not specified'}
+- Known Allergens: {', '.join(allergen_list) if allergen_list else 'None recorded'}
+- Current Skin Issues: {', '.join(issue_list) if issue_list else 'None recorded'}
+
+Please provide personalized skincare advice based on this information.
+"""
+
+
+# Create global skin context cache instance
+skin_context_cache = SkinContextCache(
+    maxsize=settings.SKIN_CONTEXT_CACHE_SIZE,
+    ttl=settings.SKIN_CONTEXT_TTL_SECONDS,
+)
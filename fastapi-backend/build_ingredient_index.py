@@ -0,0 +1,21 @@
+"""Rebuild the memory-mapped ingredient index from app/data/inci_ingredients.json.
+
+The app rebuilds an index that doesn't match the JSON on startup when it
+can write to app/data; run this after editing the JSON so the committed
+index stays in sync.
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.services.ingredient_index import INDEX_PATH, SOURCE_PATH, build_index, write_index, IngredientIndex
+
+def rebuild_index():
+    """Compile the JSON source and write the binary index"""
+    data = build_index(SOURCE_PATH)
+    write_index(data, INDEX_PATH)
+    
+    print(f"Wrote {len(IngredientIndex())} keys ({len(data)} bytes) to {INDEX_PATH}")
+
+if __name__ == "__main__":
+    rebuild_index()
@@ -1,14 +1,35 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import Depends, FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from contextlib import asynccontextmanager
 import logging
+import math
 import os
 import json
-from app.core.database import Base, engine
+from app.core.database import Base, engine, async_engine, AsyncSessionLocal
 from app.core.dbconnection import init_database, check_db_health, db_manager
 from app.core.config import settings
+from app.core.security import password_executor
+from app.core.pagination import total_counts
+from app.services.ingredient_index import ingredient_index
+from app.core.auth_cache import auth_cache
+from app.core.background import background_jobs
+from app.crud.account import pending_account_purges, purge_user_account
 from app.models import *
 from app.routers import auth, skin, chat, skin_memory
+from app.api.deps import get_current_active_user
+from app.models.user import User
+from app.services.llm_admission import LLMRateLimited, llm_admission
+from app.services.llm_gateway import llm_gateway
+from app.services.llm_resilience import LLMTimeoutError, LLMUnavailableError
+from app.services.model_registry import gemini_models
+from app.services.prompt_budget import prompt_budget
+from app.services.analysis_cache import analysis_cache
+from app.services.image_preprocessing import image_preprocessor
+from app.services.gemini import gemini_analyzer
+from app.services.chat_summary import chat_summarizer
+from app.services.gemini_chat import chat_flights, chat_turn_metrics
+from app.services.skin_context import skin_context_cache
 
 # Firebase Admin SDK imports
 import firebase_admin
@@ -56,6 +77,25 @@ async def lifespan(app: FastAPI):
         db_health = await check_db_health()
         logger.info(f"Database health: {db_health}")
 
+        # Map the bundled ingredient dictionary
+        ingredient_index.open()
+        logger.info(f"Ingredient index loaded with {len(ingredient_index)} names")
+
+        # Configure Gemini once and open its API client before the first request
+        gemini_models.warm()
+
+        # Start background workers for off-request-path jobs
+        background_jobs.start()
+
+        # Resume account purges a restart interrupted; any the queue can't
+        # take now stay marked for the next startup
+        async with AsyncSessionLocal() as db:
+            pending_purges = await pending_account_purges(db)
+        for user_id in pending_purges:
+            background_jobs.submit("account_purge", purge_user_account, user_id)
+        if pending_purges:
+            logger.info(f"Resumed {len(pending_purges)} pending account purges")
+
         yield
 
     except Exception as e:
@@ -63,6 +103,11 @@ async def lifespan(app: FastAPI):
         raise e
     finally:
         logger.info("Shutting down SkinSenseAI Backend...")
+        await background_jobs.drain()
+        llm_gateway.shutdown()
+        image_preprocessor.shutdown()
+        password_executor.shutdown(wait=False)
+        await async_engine.dispose()
 
 
 # Create FastAPI app with lifespan events
@@ -93,8 +138,30 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Total-Count", "Retry-After"],
 )
 
+@app.exception_handler(LLMRateLimited)
+async def llm_rate_limited_handler(request: Request, exc: LLMRateLimited):
+    """Answer refused Gemini calls with 429 and when to retry."""
+    return JSONResponse(
+        status_code=429,
+        content={"detail": "Too many AI requests, please try again shortly"},
+        headers={"Retry-After": str(max(math.ceil(exc.retry_after), 1))},
+    )
+
+@app.exception_handler(LLMUnavailableError)
+@app.exception_handler(LLMTimeoutError)
+async def llm_unavailable_handler(request: Request, exc: Exception):
+    """Answer Gemini calls that timed out or hit an open circuit with 503."""
+    # Timeouts carry no hint of their own; by then the breaker may be about to open
+    retry_after = getattr(exc, "retry_after", settings.GEMINI_BREAKER_RESET_SECONDS)
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "AI service is temporarily unavailable, please try again shortly"},
+        headers={"Retry-After": str(max(math.ceil(retry_after), 1))},
+    )
+
 # Include routers
 app.include_router(auth.router, prefix="/api/v1")
 app.include_router(skin.router, prefix="/api/v1")
@@ -126,3 +193,25 @@ async def database_info():
         return db_manager.get_connection_info()
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database info error: {str(e)}")
+
+
+@app.get("/cache-stats")
+async def cache_stats(current_user: User = Depends(get_current_active_user)):
+    """Cache hit/miss and preprocessing counters (for debugging)."""
+    return {
+        "auth": auth_cache.stats(),
+        "analysis_cache": analysis_cache.stats(),
+        "skin_context": skin_context_cache.stats(),
+        "total_counts": total_counts.stats(),
+        "image_preprocessing": image_preprocessor.stats(),
+        "chat_turns": chat_turn_metrics.stats(),
+        "chat_summaries": chat_summarizer.stats(),
+        "prompt_budget": prompt_budget.stats(),
+        "gemini_models": gemini_models.stats(),
+        "llm_admission": llm_admission.stats(),
+        "llm_gateway": llm_gateway.stats(),
+        "singleflight": {
+            "product_analysis": gemini_analyzer.flights.stats(),
+            "chat": chat_flights.stats(),
+        },
+    }
@@ -7,6 +7,7 @@ from app.core.database import engine, Base
 from app.models.user import User, ProductAnalysis, SkinProfile
 from app.models.skin_memory import UserAllergen, SkinIssue, SkinMemoryEntry, AllergenReaction
 from app.models.chat import ChatSession, ChatMessage
+from app.models.analysis_cache import AnalysisCacheEntry
 
 def reset_database():
     """Drop all tables and recreate them"""